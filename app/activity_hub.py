@@ -0,0 +1,151 @@
+# activity_hub.py
+import asyncio, logging
+from keyword_matcher import compile_keyword, MATCH_ALL
+from env_config import Configs
+from sync_worker import poll_space_activities
+from backlog import get_project_id
+import metrics
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """
+    新しい更新情報の購読(クライアント1接続分)
+    """
+
+    def __init__(self, space_key: str, keyword=None, max_queue: int = 100, match: str = MATCH_ALL, project_ids=None):
+        """
+        :param space_key: スペース
+        :param keyword: 検索キーワード(1つまたはリスト) Noneの場合は全件
+        :param max_queue: 未送信の更新情報の上限(超えた場合は古いものから破棄する)
+        :param match: 複数キーワードの一致条件
+        :param project_ids: 購読者が参照できるプロジェクトID Noneの場合は絞り込まない
+        """
+        self.space_key = space_key
+        self.keyword = keyword
+        self.project_ids = project_ids
+        self.matcher = compile_keyword(keyword, normalize=Configs.ACTIVITY_SEARCH_NORMALIZE, fields=Configs.ACTIVITY_SEARCH_FIELDS, match=match)
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    def offer(self, activity: dict):
+        """参照できるプロジェクトの、キーワードに一致する更新情報のみ送信待ちに追加する"""
+        # ポーリング・同期処理は他のユーザのトークンで取得するため、参照できないプロジェクトの更新情報は配信しない
+        if self.project_ids is not None and get_project_id(activity) not in self.project_ids:
+            return
+        if not self.matcher.match(activity):
+            return
+        if self.queue.full():
+            # 受信が遅いクライアントのために他の購読を待たせないよう、古いものを破棄する
+            self.queue.get_nowait()
+            metrics.increment("hub.dropped")
+        self.queue.put_nowait(activity)
+
+class ActivityHub:
+    """
+    新しい更新情報を購読者に配信する
+
+    同じスペースの購読者は、1つのポーリング処理(Backlog API呼び出し)を共有する。
+    同期処理(sync_worker)が有効な場合は、同期処理が取得した更新情報を配信し、ポーリングは行わない。
+    """
+
+    def __init__(self, poller=None, interval: float = 30):
+        """
+        :param poller: (スペース, 取得済みの最新の更新情報ID) を受け取り、
+                       より新しい更新情報のリスト(古い順)を返すコルーチン関数
+        :param interval: ポーリングの間隔(秒)
+        """
+        self._poller = poller
+        self.interval = interval
+        self._subscriptions = {}
+        self._pollers = {}
+        self._last_ids = {}
+
+    def subscribe(self, space_key: str, keyword=None, match: str = MATCH_ALL, project_ids=None):
+        """
+        購読を開始する(スペースの最初の購読者の場合はポーリングを開始する)
+
+        :param space_key: スペース
+        :param keyword: 検索キーワード(1つまたはリスト)
+        :param match: 複数キーワードの一致条件
+        :param project_ids: 購読者が参照できるプロジェクトID Noneの場合は絞り込まない
+        :return: Subscription
+        """
+        subscription = Subscription(space_key, keyword, match=match, project_ids=project_ids)
+        self._subscriptions.setdefault(space_key, set()).add(subscription)
+        metrics.set_gauge("hub.subscribers", sum(len(s) for s in self._subscriptions.values()))
+        if self._poller is not None and space_key not in self._pollers:
+            self._pollers[space_key] = asyncio.ensure_future(self._poll(space_key))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """
+        購読を終了する(スペースの購読者がいなくなった場合はポーリングを停止し、取得済みの位置を破棄する)
+
+        :param subscription: Subscription
+        """
+        subscriptions = self._subscriptions.get(subscription.space_key)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscriptions[subscription.space_key]
+            poller = self._pollers.pop(subscription.space_key, None)
+            if poller is not None:
+                poller.cancel()
+            # 次の購読開始時に、購読者がいない間の更新情報をまとめて配信しないよう、取得済みの位置を破棄する
+            self._last_ids.pop(subscription.space_key, None)
+        metrics.set_gauge("hub.subscribers", sum(len(s) for s in self._subscriptions.values()))
+
+    def publish(self, space_key: str, activities: list):
+        """
+        新しい更新情報を購読者に配信する
+
+        :param space_key: スペース
+        :param activities: Backlog APIの更新情報リスト(古い順)
+        """
+        if activities:
+            self._last_ids[space_key] = max(self._last_ids.get(space_key) or 0, activities[-1]["id"])
+        for subscription in list(self._subscriptions.get(space_key, ())):
+            for activity in activities:
+                subscription.offer(activity)
+
+    def use_external_source(self):
+        """
+        ポーリングを行わず、publishで受け取った更新情報のみ配信する(同期処理が有効な場合)
+        """
+        self._poller = None
+        for poller in self._pollers.values():
+            poller.cancel()
+        self._pollers.clear()
+
+    async def _poll(self, space_key: str):
+        failures = 0
+        while True:
+            try:
+                last_id = self._last_ids.get(space_key)
+                activities = await self._poller(space_key, last_id)
+                metrics.increment("hub.polls")
+                if last_id is None:
+                    # 初回は取得済みの位置のみ記録する(購読開始前の更新情報は配信しない)
+                    if activities:
+                        self._last_ids[space_key] = max(activity["id"] for activity in activities)
+                else:
+                    self.publish(space_key, activities)
+                failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                logger.warning("新しい更新情報の取得に失敗しました space=%s: %r", space_key, e)
+            await asyncio.sleep(self.interval * min(2 ** failures, 16))
+
+    async def close(self):
+        """
+        全てのポーリングを停止する(FastAPIのlifespan終了時に呼び出す)
+        """
+        for poller in self._pollers.values():
+            poller.cancel()
+        self._pollers.clear()
+
+# 新しい更新情報の配信
+activity_hub = ActivityHub(poller=poll_space_activities, interval=Configs.ACTIVITY_PUSH_INTERVAL)
@@ -0,0 +1,80 @@
+# activity_types.py
+import json, logging, os, threading, time
+
+logger = logging.getLogger(__name__)
+
+# 更新種別の表示名の定義ファイル(カレントディレクトリではなく、このモジュールの場所を基準にする)
+ACTIVITY_TYPES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "activity_types.json")
+
+class ActivityTypeTable:
+    """
+    更新種別の表示名(activity_types.json)
+
+    ファイルは初回(またはload呼び出し時)に1回だけ読み込み、以降はメモリ上の表を使用する。
+    ファイルが更新された場合は、次に参照した時点で読み込み直す(ファイルの確認はcheck_interval秒に1回まで)。
+    """
+
+    def __init__(self, path: str = ACTIVITY_TYPES_PATH, check_interval: float = 1.0):
+        """
+        :param path: 定義ファイルのパス
+        :param check_interval: ファイルの更新を確認する間隔(秒)
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._table = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        定義ファイルを読み込む(アプリケーションの起動時に呼び出す)
+
+        読み込みに失敗した場合は、読み込み済みの表がなければ例外を送出し、あればそのまま使用する。
+
+        :return: 更新種別 → (更新種別(文字列), 表示名) の表
+        """
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                with open(self.path, "r", encoding="utf-8") as file:
+                    names = json.load(file)
+            except (OSError, ValueError):
+                if self._table is None:
+                    raise
+                logger.warning("更新種別の定義ファイルの読み込みに失敗したため、読み込み済みの定義を使用します path=%s", self.path, exc_info=True)
+                return self._table
+
+            # Backlog APIの更新種別(数値)と文字列のどちらでも引けるようにする
+            table = {}
+            for key, name in names.items():
+                entry = (str(key), name)
+                table[str(key)] = entry
+                if str(key).isdigit():
+                    table[int(key)] = entry
+            self._table = table
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+            return table
+
+    def get(self):
+        """
+        更新種別の表を返す(ファイルが更新されていれば読み込み直す)
+
+        :return: 更新種別 → (更新種別(文字列), 表示名) の表
+        """
+        if self._table is None:
+            return self.load()
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                return self._table
+            if mtime != self._mtime:
+                return self.load()
+        return self._table
+
+# アプリケーション全体で共有する更新種別の表
+activity_types = ActivityTypeTable()
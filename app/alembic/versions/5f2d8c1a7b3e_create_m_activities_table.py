@@ -0,0 +1,37 @@
+"""Create m_activities table
+
+Revision ID: 5f2d8c1a7b3e
+Revises: 36b34982d323
+Create Date: 2026-10-18 10:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f2d8c1a7b3e'
+down_revision: Union[str, None] = '36b34982d323'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('m_activities',
+    sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('project_name', sa.String(length=255), nullable=False),
+    sa.Column('type', sa.String(length=10), nullable=False),
+    sa.Column('type_name', sa.String(length=100), nullable=False),
+    sa.Column('content_summary', sa.Text(), nullable=False),
+    sa.Column('created_user_name', sa.String(length=255), nullable=False),
+    sa.Column('created', sa.String(length=19), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('m_activities')
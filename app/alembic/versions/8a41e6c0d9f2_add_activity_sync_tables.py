@@ -0,0 +1,39 @@
+"""Add activity sync columns and m_sync_state table
+
+Revision ID: 8a41e6c0d9f2
+Revises: 5f2d8c1a7b3e
+Create Date: 2026-10-18 13:47:05.118924
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8a41e6c0d9f2'
+down_revision: Union[str, None] = '5f2d8c1a7b3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('m_activities', sa.Column('space_key', sa.String(length=255), nullable=True))
+    op.add_column('m_activities', sa.Column('raw', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+    op.create_index(op.f('ix_m_activities_space_key'), 'm_activities', ['space_key'], unique=False)
+    op.create_table('m_sync_state',
+    sa.Column('space_key', sa.String(length=255), nullable=False),
+    sa.Column('last_activity_id', sa.BigInteger(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('space_key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('m_sync_state')
+    op.drop_index(op.f('ix_m_activities_space_key'), table_name='m_activities')
+    op.drop_column('m_activities', 'raw')
+    op.drop_column('m_activities', 'space_key')
@@ -0,0 +1,46 @@
+"""Add search_text column and pg_trgm indexes to m_activities
+
+Revision ID: b7c3f9e21a64
+Revises: 8a41e6c0d9f2
+Create Date: 2026-10-18 15:21:37.640182
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c3f9e21a64'
+down_revision: Union[str, None] = '8a41e6c0d9f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column('m_activities', sa.Column('search_text', sa.Text(), nullable=True))
+
+    # 同期済みの更新情報の検索用テキストを作成(rawに含まれる全てのテキスト項目を改行区切りで連結)
+    op.execute(
+        """
+        UPDATE m_activities SET search_text = (
+            SELECT coalesce(string_agg(value #>> '{}', E'\\n'), '')
+            FROM jsonb_path_query(raw, 'strict $.** ? (@.type() == "string")') AS value
+        )
+        WHERE raw IS NOT NULL
+        """
+    )
+
+    op.create_index('ix_m_activities_space_key_id', 'm_activities', ['space_key', 'id'], unique=False)
+    op.create_index(
+        'ix_m_activities_search_text_trgm', 'm_activities', ['search_text'], unique=False,
+        postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_m_activities_search_text_trgm', table_name='m_activities')
+    op.drop_index('ix_m_activities_space_key_id', table_name='m_activities')
+    op.drop_column('m_activities', 'search_text')
@@ -0,0 +1,26 @@
+"""Add timezone column to m_user
+
+Revision ID: d4e8a2c61f57
+Revises: b7c3f9e21a64
+Create Date: 2026-10-18 18:02:11.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e8a2c61f57'
+down_revision: Union[str, None] = 'b7c3f9e21a64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('m_user', sa.Column('timezone', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('m_user', 'timezone')
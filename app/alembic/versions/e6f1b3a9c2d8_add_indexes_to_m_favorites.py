@@ -0,0 +1,37 @@
+"""Add user_id indexes and activity uniqueness to m_favorites
+
+Revision ID: e6f1b3a9c2d8
+Revises: d4e8a2c61f57
+Create Date: 2026-10-18 21:37:52.104816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6f1b3a9c2d8'
+down_revision: Union[str, None] = 'd4e8a2c61f57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 同じユーザが同じ更新情報を重複して登録している場合は、最初に登録したもののみ残す
+    op.execute(
+        """
+        DELETE FROM m_favorites a
+        USING m_favorites b
+        WHERE a.user_id = b.user_id
+          AND a.activity_id = b.activity_id
+          AND a.id > b.id
+        """
+    )
+    op.create_index('ix_m_favorites_user_id_activity_id', 'm_favorites', ['user_id', 'activity_id'], unique=True)
+    op.create_index('ix_m_favorites_user_id_id', 'm_favorites', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_m_favorites_user_id_id', table_name='m_favorites')
+    op.drop_index('ix_m_favorites_user_id_activity_id', table_name='m_favorites')
@@ -1,24 +1,59 @@
 # auth.py
+import secrets
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from database import SessionLocal
-from utils import verify_password
+from database import get_db
+from password_hasher import password_hasher, PasswordHasherBusy
 from env_config import Configs
-from crud import get_user_by_username
+from crud import get_user, get_user_by_username, update_user_password_hash
+from user_cache import user_cache, TTLCache
 
 # OAuth2のトークン取得設定
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+# Authorizationヘッダを指定できないクライアント(EventSourceなど)向けに、未指定でもエラーにしない設定
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-# データベースセッションの依存関係
-def get_db():
-    db = SessionLocal()
+# 新しい更新情報の配信(SSE)に接続するためのチケット(チケット → ユーザーID)
+_sse_tickets = TTLCache(Configs.SSE_TICKET_TTL, Configs.USER_CACHE_MAX_ENTRIES)
+
+async def verify_password(password: str, hashed_password: str):
+    """
+    パスワードを検証
+
+    :param password: パスワード
+    :param hashed_password: ハッシュ化されたパスワード
+    :return: (検証結果, 新しいハッシュ 再ハッシュが不要な場合はNone)
+    :raises HTTPException: パスワードハッシュの処理待ちが上限に達した場合(503とRetry-After)
+    """
+    try:
+        return await password_hasher.verify_and_update(password, hashed_password)
+    except PasswordHasherBusy as e:
+        raise _busy_exception(e)
+
+async def hash_password(password: str):
+    """
+    パスワードをハッシュ化
+
+    :param password: パスワード
+    :return: ハッシュ化されたパスワード
+    :raises HTTPException: パスワードハッシュの処理待ちが上限に達した場合(503とRetry-After)
+    """
     try:
-        yield db
-    finally:
-        db.close()
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy as e:
+        raise _busy_exception(e)
+
+def _busy_exception(e: PasswordHasherBusy):
+    """パスワードハッシュの処理待ちが上限に達した場合のエラー(503とRetry-After)"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Password hashing is busy",
+        headers={"Retry-After": str(e.retry_after)},
+    )
 
 def create_access_token(data: dict):
     """
@@ -36,10 +71,12 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 # トークンからユーザを取得
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     """
     トークンからユーザーを取得
 
+    デコード済みのトークン・取得済みのユーザーはキャッシュ(USER_CACHE_TTL秒)を使用し、JWTのデコード・データベースの検索を省略する
+
     :param token: トークン
     :param db: データベースセッション
     :return: ユーザー
@@ -50,40 +87,108 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         detail="トークンの検証に失敗しました",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        # JWTトークンをデコード
-        payload = jwt.decode(token, Configs.SECRET_KEY, algorithms=[Configs.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    # デコード済みのトークンの場合は、JWTのデコードを省略する
+    user_id = user_cache.get_token(token)
+    if user_id is None:
+        try:
+            # JWTトークンをデコード
+            payload = jwt.decode(token, Configs.SECRET_KEY, algorithms=[Configs.ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+        except JWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
 
-    # デコードしたusernameでデータベースからユーザーを取得
-    user = get_user_by_username(db, username=username)
+        # ユーザーID(uid)を含むトークンは主キーで、含まない(以前に発行した)トークンはusernameでユーザーを取得
+        user_id = payload.get("uid")
+        user = await _get_user(db, user_id) if user_id is not None else await get_user_by_username(db, username=username)
+        if user is None or user.user_nm != username:
+            raise credentials_exception
+        user_cache.set_token(token, user.id, payload.get("exp"))
+        user_cache.set_user(user)
+        return user
+
+    user = await _get_user(db, user_id)
     if user is None:
         raise credentials_exception
     return user
 
-def user_login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def _get_user(db: AsyncSession, user_id: int):
+    """ユーザーIDでユーザーを取得(キャッシュしていない場合はデータベースから取得してキャッシュする)"""
+    user = user_cache.get_user(user_id)
+    if user is None:
+        user = await get_user(db, user_id)
+        if user is not None:
+            user_cache.set_user(user)
+    return user
+
+def create_sse_ticket(user_id: int):
+    """
+    新しい更新情報の配信(SSE)に接続するためのチケットを作成
+
+    EventSourceはAuthorizationヘッダを指定できないため、トークンの代わりにクエリパラメータで指定する。
+    アクセスログなどにトークンが残らないよう、有効期限(SSE_TICKET_TTL秒)が短く1回のみ使用できるチケットを使用する。
+
+    :param user_id: ユーザーID
+    :return: チケット
+    """
+    ticket = secrets.token_urlsafe(32)
+    _sse_tickets.set(ticket, user_id)
+    return ticket
+
+async def get_current_user_from_header_or_ticket(token: Optional[str] = Depends(oauth2_scheme_optional), ticket: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """
+    Authorizationヘッダのトークン、またはクエリパラメータのチケット(create_sse_ticket)からユーザーを取得
+
+    EventSourceなどAuthorizationヘッダを指定できないクライアント向け。チケットは使用時に削除する。
+    ストリーミング中に接続を保持しないよう、認証後にデータベースセッションを閉じる(接続をプールへ返却する)。
+
+    :param token: Authorizationヘッダのトークン
+    :param ticket: クエリパラメータのチケット
+    :param db: データベースセッション
+    :return: ユーザー
+    :raises HTTPException: トークン・チケットの検証に失敗した場合
+    """
+    if token:
+        user = await get_current_user(token=token, db=db)
+    else:
+        user_id = _sse_tickets.pop(ticket) if ticket else None
+        user = await _get_user(db, user_id) if user_id is not None else None
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="チケットの検証に失敗しました",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    await db.close()
+    return user
+
+async def user_login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     ユーザーログイン
 
+    パスワードの検証はパスワードハッシュ用のプロセスプールで行い、ハッシュのコストが現在の設定と異なる場合はハッシュし直して保存する
+
     :param form_data: フォームデータ
     :param db: データベースセッション
     :return: トークン
-    :raises HTTPException: トークンの検証に失敗した場合
+    :raises HTTPException: トークンの検証に失敗した場合(パスワードハッシュの処理待ちが上限に達した場合は503とRetry-After)
     """
-    user = get_user_by_username(db, username=form_data.username)
-    if not user or not verify_password(form_data.password, user.pw_hash):
+    user = await get_user_by_username(db, username=form_data.username)
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await verify_password(form_data.password, user.pw_hash)
+    if not verified:
         # ユーザー名またはパスワードが間違っている場合はエラーを返す
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="username、またはpasswordが間違っています",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        await update_user_password_hash(db, user.id, new_hash)
     # トークンを作成
-    access_token = create_access_token(data={"sub": user.user_nm})
+    access_token = create_access_token(data={"sub": user.user_nm, "uid": user.id})
     
     return {
         "access_token": access_token,
@@ -1,21 +1,93 @@
 # backlog.py
-import httpx, json
+import asyncio, httpx, logging, weakref
+from urllib.parse import urlparse
+from typing import List, Union
 from fastapi import Depends, HTTPException, status, Response, Query
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import SessionLocal
-from crud import update_user_tokens
-from utils import convert_to_tz
+from crud import update_user_tokens, get_activity_snapshots, save_activity_snapshots
+from utils import convert_many_to_tz
+from activity_types import activity_types
+from keyword_matcher import compile_keyword, normalize_keywords, MATCH_ALL
+from search_query import SearchQuery, plan_query
 from models import User
 from env_config import Configs
+from user_cache import TTLCache
+from singleflight import SingleFlight
+from token_manager import TokenManager
+from scheduler import BacklogScheduler, QuotaExhausted, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from circuit_breaker import CircuitBreaker, CircuitOpenError
 
-# データベースセッション
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Backlog API呼び出し用の共有HTTPクライアント(アプリケーション単位で1つ)
+_http_client: httpx.AsyncClient = None
+
+# 更新情報取得の同時実行数を制限するセマフォ(全体・ユーザ単位)
+_global_fetch_semaphore: asyncio.Semaphore = None
+_user_fetch_semaphores = weakref.WeakValueDictionary()
+
+# 同一のBacklog API呼び出しが同時に実行された場合に、1回の呼び出し結果を共有する
+_backlog_singleflight = SingleFlight("backlog.singleflight")
+
+logger = logging.getLogger(__name__)
+
+def create_http_client(transport: httpx.AsyncBaseTransport = None):
+    """
+    Backlog API呼び出し用のHTTPクライアントを作成
+
+    コネクションプールとKeep-Aliveを有効にし、リクエストごとのTCP/TLSハンドシェイクを避ける。
+    HTTP/2はh2パッケージがインストールされている場合のみ有効にする。
+
+    :param transport: 差し替えるトランスポート(負荷試験で代替サーバに接続する場合など)
+    :return: httpx.AsyncClient
+    """
+    limits = httpx.Limits(
+        max_connections=Configs.BACKLOG_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=Configs.BACKLOG_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=Configs.BACKLOG_HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        Configs.BACKLOG_HTTP_READ_TIMEOUT,
+        connect=Configs.BACKLOG_HTTP_CONNECT_TIMEOUT,
+        pool=Configs.BACKLOG_HTTP_POOL_TIMEOUT,
+    )
+    http2 = Configs.BACKLOG_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            http2 = False
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=http2, transport=transport)
+
+async def startup_http_client():
+    """
+    共有HTTPクライアントを作成する(FastAPIのlifespan開始時に呼び出す)
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+
+async def shutdown_http_client():
+    """
+    共有HTTPクライアントをクローズする(FastAPIのlifespan終了時に呼び出す)
+    """
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+def get_http_client():
+    """
+    共有HTTPクライアントを取得
+
+    lifespan外(テストやスクリプト)から呼ばれた場合は、その場でクライアントを作成する。
+
+    :return: httpx.AsyncClient
+    """
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
 
 def redirect_to_backlog_oauth():
     """
@@ -46,8 +118,8 @@ async def get_backlog_tokens(code: str):
         "client_id": Configs.BACKLOG_CLIENT_ID,
         "client_secret": Configs.BACKLOG_CLIENT_SECRET,
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(Configs.BACKLOG_TOKEN_URL, data=data)
+    client = get_http_client()
+    response = await client.post(Configs.BACKLOG_TOKEN_URL, data=data)
 
     if response.status_code != 200:
         raise HTTPException(
@@ -57,7 +129,7 @@ async def get_backlog_tokens(code: str):
 
     return response
 
-async def refresh_access_token(user: User, db: Session):
+async def refresh_access_token(user: User, db: AsyncSession):
     """
     Backlogのアクセストークンを更新
 
@@ -70,18 +142,18 @@ async def refresh_access_token(user: User, db: Session):
     data = {
         "grant_type": "refresh_token",
         "refresh_token": user.backlog_refresh_token,
-        "client_id": "your_client_id",
-        "client_secret": "your_client_secret",
+        "client_id": Configs.BACKLOG_CLIENT_ID,
+        "client_secret": Configs.BACKLOG_CLIENT_SECRET,
     }
-    async with httpx.AsyncClient() as client:
-        response = await client.post(Configs.BACKLOG_TOKEN_URL , data=data)
+    client = get_http_client()
+    response = await client.post(Configs.BACKLOG_TOKEN_URL, data=data)
     
     if response.status_code == 200:
         # DB上のアクセストークンの更新
         tokens = response.json()
         new_access_token = tokens.get("access_token")
         new_refresh_token = tokens.get("refresh_token")
-        update_user_tokens(
+        await update_user_tokens(
             db=db, 
             user_id=user.id, 
             access_token=new_access_token, 
@@ -94,37 +166,151 @@ async def refresh_access_token(user: User, db: Session):
             detail="Backlogのアクセストークン更新に失敗しました"
         )
 
-async def call_backlog_api(url:str, params:dict, current_user:User, db: Session = Depends(get_db)):
+async def _refresh_user_tokens(user_id: int, stale_access_token: str):
+    """
+    DB上のトークンを確認し、必要な場合のみBacklogのアクセストークンを更新(TokenManagerから呼び出す)
+
+    別プロセスで既に更新済みの場合は、DB上のトークンをそのまま使用する。
+
+    :param user_id: ユーザID
+    :param stale_access_token: 無効(または期限切れ間近)のアクセストークン
+    :return: access_token・refresh_token・expires_inを含む辞書
+    :raises HTTPException: トークンの更新に失敗した場合
+    """
+    async with SessionLocal() as db:
+        user = await db.get(User, user_id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, 
+                detail="Backlogのアクセストークン更新に失敗しました"
+            )
+        if user.backlog_access_token != stale_access_token:
+            return {
+                "access_token": user.backlog_access_token,
+                "refresh_token": user.backlog_refresh_token,
+            }
+        response = await refresh_access_token(user, db)
+        return response.json()
+
+# ユーザごとのBacklogトークン管理
+token_manager = TokenManager(
+    _refresh_user_tokens,
+    renew_margin=Configs.BACKLOG_TOKEN_RENEW_MARGIN,
+    active_window=Configs.BACKLOG_TOKEN_RENEW_ACTIVE_WINDOW,
+)
+
+# Backlog API呼び出しのスケジューラ(レート制限・同時実行数の管理)
+scheduler = BacklogScheduler(
+    max_concurrency=Configs.BACKLOG_SCHEDULER_MAX_CONCURRENCY,
+    user_concurrency=Configs.BACKLOG_SCHEDULER_USER_CONCURRENCY,
+    background_reserve=Configs.BACKLOG_SCHEDULER_BACKGROUND_RESERVE,
+    max_wait=Configs.BACKLOG_SCHEDULER_MAX_WAIT,
+)
+
+# 接続先ホストごとのサーキットブレーカー
+_circuit_breakers = {}
+
+def get_circuit_breaker(host: str = None):
+    """
+    接続先ホストのサーキットブレーカーを取得
+
+    :param host: ホスト名 省略時はBacklog APIのホスト
+    :return: CircuitBreaker
+    """
+    host = host or urlparse(Configs.BACKLOG_API_URL).hostname or ""
+    breaker = _circuit_breakers.get(host)
+    if breaker is None:
+        breaker = _circuit_breakers[host] = CircuitBreaker(
+            host,
+            failure_threshold=Configs.BACKLOG_CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=Configs.BACKLOG_CIRCUIT_RECOVERY_TIMEOUT,
+        )
+    return breaker
+
+async def call_backlog_api(url:str, params:dict, current_user:User, priority: int = PRIORITY_INTERACTIVE):
     """
     Backlog APIを呼び出す
 
+    呼び出しはスケジューラ経由で行い、レート制限の残数が少ない場合や429を受けた場合は待機・拒否する。
+    タイムアウト・接続エラー・5xxが続いた場合はサーキットブレーカーが開き、回復するまで即時に503を返す。
+
     :param url: Backlog APIのエンドポイント
     :param params: Backlog APIのパラメータ
     :param current_user: ログインユーザ
-    :param db: データベースセッション
+    :param priority: 優先度(PRIORITY_INTERACTIVE / PRIORITY_BACKGROUND)
     :return: Backlog APIのレスポンス
-    :raises HTTPException: Backlog API呼び出しに失敗した場合
+    :raises HTTPException: Backlog API呼び出しに失敗した場合(レート制限の場合は429、障害中の場合は503とRetry-After)
     """
     
-    # データベースからアクセストークンを取得
-    access_token = current_user.backlog_access_token
+    # アクセストークンを取得(有効期限が近い場合は事前に更新される)
+    access_token = await token_manager.get_access_token(current_user)
     headers = {"Authorization": f"Bearer {access_token}"}
 
     # Backlog APIを呼び出す
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{Configs.BACKLOG_API_URL}{url}", 
-            headers=headers, 
-            params=params
+    client = get_http_client()
+    api_url = f"{Configs.BACKLOG_API_URL}{url}"
+    scope = f"user:{current_user.id}"
+    breaker = get_circuit_breaker()
+
+    async def request():
+        breaker.before_call()
+        try:
+            response = await client.get(
+                api_url, 
+                headers=headers, 
+                params=params
+            )
+        except httpx.TransportError:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    try:
+        response = await scheduler.run(request, user_key=current_user.id, scope=scope, priority=priority)
+
+        # アクセストークンが無効または期限切れの場合、リフレッシュトークンを使用して更新
+        # (同じユーザの更新が同時に発生した場合も、更新は1回のみ行われる)
+        if response.status_code == 401:  # Unauthorized
+            refreshed_access_token = await token_manager.refresh(current_user.id, access_token)
+            headers["Authorization"] = f"Bearer {refreshed_access_token}"
+            response = await scheduler.run(request, user_key=current_user.id, scope=scope, priority=priority)
+    except QuotaExhausted as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS, 
+            detail="Backlog APIのレート制限に達しました",
+            headers={"Retry-After": str(int(e.retry_after) + 1)},
+        )
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE, 
+            detail="Backlog APIが利用できません",
+            headers={"Retry-After": str(int(e.retry_after) + 1)},
+        )
+    except httpx.TimeoutException:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT, 
+            detail="Backlog API呼び出しがタイムアウトしました"
+        )
+    except httpx.TransportError:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY, 
+            detail="Backlog APIに接続できませんでした"
         )
 
-    # アクセストークンが無効または期限切れの場合、リフレッシュトークンを使用して更新
-    if response.status_code == 401:  # Unauthorized
-        token_response = await refresh_access_token(current_user, db)
-        refreshed_access_token = token_response.json().get("access_token")
-        headers["Authorization"] = f"Bearer {refreshed_access_token}"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, params=params)
+    # レート制限を超えた場合は、再試行までの秒数を返す
+    if response.status_code == 429:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS, 
+            detail="Backlog APIのレート制限に達しました",
+            headers={"Retry-After": str(int(scheduler.retry_after(response)) + 1)},
+        )
 
     # レスポンスのステータスコードが200以外の場合はエラーを返す
     if response.status_code != 200:
@@ -135,27 +321,296 @@ async def call_backlog_api(url:str, params:dict, current_user:User, db: Session
 
     return response
 
-def get_disp_activity(activity:dict):
+def _singleflight_key(url: str, params: dict, current_user: User):
+    """
+    同一のBacklog API呼び出しを判定するキーを作成
+
+    トークンのスコープは、BACKLOG_SINGLEFLIGHT_SCOPEが"space"の場合はスペース全体で共有し、
+    それ以外の場合はユーザ(トークンの持ち主)単位とする(ユーザごとに参照できる範囲が異なるため)。
+
+    :param url: Backlog APIのエンドポイント
+    :param params: Backlog APIのパラメータ
+    :param current_user: ログインユーザ
+    :return: キー
+    """
+    if Configs.BACKLOG_SINGLEFLIGHT_SCOPE == "space":
+        scope = Configs.BACKLOG_BASE_URL
+    else:
+        scope = f"user:{current_user.id}"
+    frozen_params = tuple(sorted(
+        (key, tuple(value) if isinstance(value, (list, tuple)) else value)
+        for key, value in params.items()
+    ))
+    return (url, frozen_params, scope)
+
+async def get_backlog_json(url: str, params: dict, current_user: User, priority: int = PRIORITY_INTERACTIVE):
+    """
+    Backlog APIを呼び出し、レスポンスのJSONを取得
+
+    同じキー(エンドポイント・パラメータ・トークンのスコープ)の呼び出しが実行中の場合は、
+    新たに呼び出さずに実行中の呼び出し結果(パース済みのJSON)を共有する。
+    共有した結果は呼び出し側で変更しないこと。
+
+    :param url: Backlog APIのエンドポイント
+    :param params: Backlog APIのパラメータ
+    :param current_user: ログインユーザ
+    :param priority: 優先度(PRIORITY_INTERACTIVE / PRIORITY_BACKGROUND)
+    :return: レスポンスのJSON
+    :raises HTTPException: Backlog API呼び出しに失敗した場合
+    """
+    async def request():
+        response = await call_backlog_api(url, params, current_user, priority)
+        return response.json()
+
+    return await _backlog_singleflight.do(_singleflight_key(url, params, current_user), request)
+
+# ユーザが参照できるプロジェクトIDのキャッシュ(ユーザ単位)
+_visible_projects = TTLCache(Configs.BACKLOG_PROJECTS_CACHE_TTL, Configs.USER_CACHE_MAX_ENTRIES)
+
+async def get_visible_project_ids(current_user: User, priority: int = PRIORITY_INTERACTIVE):
+    """
+    ユーザが参照できる(参加している)プロジェクトのIDを取得
+
+    他のユーザのトークンで取得した更新情報(同期処理・配信)から、参照できないプロジェクトの更新情報を除外するために使用する。
+    取得結果はBACKLOG_PROJECTS_CACHE_TTLの秒数だけキャッシュする。
+
+    :param current_user: ログインユーザ
+    :param priority: 優先度(PRIORITY_INTERACTIVE / PRIORITY_BACKGROUND)
+    :return: プロジェクトIDのfrozenset
+    :raises HTTPException: Backlog API呼び出しに失敗した場合
+    """
+    project_ids = _visible_projects.get(current_user.id)
+    if project_ids is None:
+        projects = await get_backlog_json("/projects", {}, current_user, priority)
+        project_ids = frozenset(project["id"] for project in projects)
+        _visible_projects.set(current_user.id, project_ids)
+    return project_ids
+
+def get_project_id(activity: dict):
+    """更新情報(Backlog APIの形式)のプロジェクトIDを取得(プロジェクトがない場合はNone)"""
+    return (activity.get("project") or {}).get("id")
+
+class ActivitySearch:
+    """
+    スペース(検索構文でプロジェクトを1つ指定した場合はプロジェクト)の最近の更新をページングしながら取得し、
+    条件・キーワードに一致する更新情報を順次返す
+
+    一致した件数がlimitに達するか、Backlog APIの更新情報がなくなるか、
+    呼び出したページ数がACTIVITY_SEARCH_MAX_PAGESに達するまでページングする。
+    全て取得した後、next_max_idに次ページのmax_id(続きがない場合はNone)を設定する。
+    """
+
+    def __init__(self, current_user: User, keyword: Union[str, List[str], None], limit: int, min_id: int = None, max_id: int = None, match: str = MATCH_ALL, query: SearchQuery = None):
+        """
+        :param current_user: ログインユーザ
+        :param keyword: 検索キーワード(1つまたはリスト) Noneの場合は全件一致
+        :param limit: 取得する更新情報の件数
+        :param min_id: この更新情報IDより新しいもののみ取得する
+        :param max_id: この更新情報IDより古いもののみ取得する
+        :param match: 複数キーワードの一致条件(MATCH_ALL: すべて含む, MATCH_ANY: いずれかを含む)
+        :param query: 検索構文の解析結果(search_query.parse_query) キーワードはkeywordに追加する
+        """
+        self.current_user = current_user
+        self.keyword = normalize_keywords((normalize_keywords(keyword) or []) + (query.keywords if query else []))
+        # Backlog APIで絞り込める条件はAPIのパラメータに、それ以外はページごとに判定する
+        self.plan = plan_query(query, current_user.timezone)
+        self.limit = limit
+        self.min_id = min_id
+        self.max_id = max_id
+        self.next_max_id = None
+        # キーワードの判定はリクエストごとに1回作成し、全ページで使い回す
+        self.matcher = compile_keyword(self.keyword, normalize=Configs.ACTIVITY_SEARCH_NORMALIZE, fields=Configs.ACTIVITY_SEARCH_FIELDS, match=match)
+
+    async def __aiter__(self):
+        # Pythonで絞り込む条件がない場合は必要な件数のみ取得する
+        page_size = self.limit if self.keyword is None and not self.plan.has_residual else Configs.ACTIVITY_SEARCH_PAGE_SIZE
+        max_id = self.max_id
+
+        matched = 0
+        for _ in range(Configs.ACTIVITY_SEARCH_MAX_PAGES):
+            params = {"count": page_size, **self.plan.params}
+            if self.min_id is not None:
+                params["minId"] = self.min_id
+            if max_id is not None:
+                params["maxId"] = max_id
+            page = await get_backlog_json(self.plan.path, params, self.current_user)
+
+            # maxIdと同じ更新情報が含まれる場合は除外し、ページ単位で条件・キーワードを判定する
+            candidates = page if max_id is None else [activity for activity in page if activity["id"] < max_id]
+            exhausted = False
+            if self.plan.has_residual:
+                filtered = []
+                for activity in candidates:
+                    if self.plan.is_exhausted(activity):
+                        exhausted = True
+                        break
+                    if self.plan.matches(activity):
+                        filtered.append(activity)
+                candidates = filtered
+            for activity in self.matcher.filter(candidates):
+                matched += 1
+                if matched >= self.limit:
+                    self.next_max_id = activity["id"]
+                    yield activity
+                    return
+                yield activity
+
+            # 取得件数がページサイズ未満の場合、以降の更新情報が条件に一致しない場合は続きがない
+            if len(page) < page_size or exhausted:
+                self.next_max_id = None
+                return
+            max_id = min(activity["id"] for activity in page)
+
+        # ページ数の上限に達した場合は、最後に取得した位置から続きを取得できるようにする
+        self.next_max_id = max_id
+
+async def search_space_activities(current_user: User, keyword: Union[str, List[str], None], limit: int, min_id: int = None, max_id: int = None, match: str = MATCH_ALL, query: SearchQuery = None):
+    """
+    スペースの最近の更新をページングしながら取得し、キーワードに一致する更新情報を集める(ActivitySearchを参照)
+
+    :param current_user: ログインユーザ
+    :param keyword: 検索キーワード(1つまたはリスト) Noneの場合は全件一致
+    :param limit: 取得する更新情報の件数
+    :param min_id: この更新情報IDより新しいもののみ取得する
+    :param max_id: この更新情報IDより古いもののみ取得する
+    :param match: 複数キーワードの一致条件
+    :param query: 検索構文の解析結果
+    :return: (一致した更新情報(Backlog APIの形式)のリスト, 次ページのmax_id 続きがない場合はNone)
+    """
+    search = ActivitySearch(current_user, keyword, limit, min_id=min_id, max_id=max_id, match=match, query=query)
+    matched = [activity async for activity in search]
+    return matched, search.next_max_id
+
+def _get_fetch_semaphores(user_id: int):
+    """
+    更新情報取得用のセマフォ(ユーザ単位, 全体)を取得
+
+    セマフォはイベントループ上で作成する必要があるため、初回呼び出し時に作成する。
+
+    :param user_id: ユーザID
+    :return: (ユーザ単位のセマフォ, 全体のセマフォ)
+    """
+    global _global_fetch_semaphore
+    if _global_fetch_semaphore is None:
+        _global_fetch_semaphore = asyncio.Semaphore(Configs.BACKLOG_FETCH_GLOBAL_CONCURRENCY)
+
+    user_semaphore = _user_fetch_semaphores.get(user_id)
+    if user_semaphore is None:
+        user_semaphore = asyncio.Semaphore(Configs.BACKLOG_FETCH_USER_CONCURRENCY)
+        _user_fetch_semaphores[user_id] = user_semaphore
+    return user_semaphore, _global_fetch_semaphore
+
+async def fetch_activities(activity_ids: list, current_user: User, priority: int = PRIORITY_INTERACTIVE):
+    """
+    複数の更新情報をBacklog APIから並行して取得
+
+    同時実行数はユーザ単位・全体の両方で制限する。
+    取得に失敗した(またはタイムアウトした)更新情報はNoneとし、他の取得は継続する。
+
+    :param activity_ids: 更新情報IDのリスト
+    :param current_user: ログインユーザ
+    :param priority: 優先度(PRIORITY_INTERACTIVE / PRIORITY_BACKGROUND)
+    :return: activity_idsと同じ順序の更新情報(dict)のリスト 取得に失敗したものはNone
+    """
+    user_semaphore, global_semaphore = _get_fetch_semaphores(current_user.id)
+
+    async def fetch(activity_id):
+        async with user_semaphore, global_semaphore:
+            try:
+                return await asyncio.wait_for(
+                    get_backlog_json(f"/activities/{activity_id}", {}, current_user, priority),
+                    timeout=Configs.BACKLOG_FETCH_TIMEOUT,
+                )
+            except Exception as e:
+                logger.warning("更新情報の取得に失敗しました activity_id=%s: %r", activity_id, e)
+                return None
+
+    return await asyncio.gather(*(fetch(activity_id) for activity_id in activity_ids))
+
+async def cache_activity_snapshots(activity_ids: list, current_user: User):
+    """
+    更新情報をBacklog APIから取得し、更新情報テーブルへ保存(お気に入り登録時・障害回復後のバックグラウンド処理)
+
+    既に更新情報テーブルに存在するものはBacklog APIを呼び出さない。
+
+    :param activity_ids: 更新情報IDのリスト
+    :param current_user: ログインユーザ
+    :return: 取得に失敗した件数
+    """
+    async with SessionLocal() as db:
+        snapshots = await get_activity_snapshots(db, activity_ids)
+        missing_ids = [
+            activity_id for activity_id in dict.fromkeys(activity_ids)
+            if not (str(activity_id).isdigit() and int(activity_id) in snapshots)
+        ]
+        if not missing_ids:
+            return 0
+        activities = await fetch_activities(missing_ids, current_user, PRIORITY_BACKGROUND)
+        fetched = get_fetched_disp_activities(activities)
+        await save_activity_snapshots(db, fetched)
+        return len(activities) - len(fetched)
+
+def get_fetched_disp_activities(activities: list):
+    """
+    fetch_activities で取得した更新情報を、1件ずつUIに表示する形式に整形する
+
+    取得に失敗した更新情報(None)と、形式が想定と異なり整形できない更新情報は除外する(取得失敗として扱う)。
+    1件の不正な更新情報で、他の更新情報の整形が失敗しないようにする。
+
+    :param activities: fetch_activities の戻り値(取得に失敗した更新情報はNone)
+    :return: UIに表示する形式に整形された更新情報のリスト
+    """
+    disp_activities = []
+    for activity in activities:
+        if activity is None:
+            continue
+        try:
+            disp_activities.append(get_disp_activity(activity))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            logger.warning("更新情報を整形できませんでした(id=%s): %r", activity.get("id") if isinstance(activity, dict) else None, e)
+    return disp_activities
+
+def get_disp_activity(activity:dict, tz_name: str = None):
     """
     Backlog API から取得した更新情報を、UIに表示する形式に整形する
 
     Args:
         activity (dict): Backlog API から取得した更新情報
+        tz_name (str): 日時を表示するタイムゾーン(ユーザの設定) 未指定の場合は環境変数のタイムゾーン
 
     Returns:
         dict: UIに表示する形式に整形された更新情報
     """
-    
-    # 更新種別の表示名をjsonファイルから取得する
-    with open('./activity_types.json', 'r', encoding='utf-8') as file:
-        activity_types = json.load(file)
-        
-    return {
-        "id":activity["id"],
-        "project_name":activity["project"]["name"],
-        "type":str(activity["type"]),   # typeは数値ではなく文字列で設定
-        "type_name":activity_types[str(activity["type"])],
-        "content_summary":activity["content"].get("summary", " - "),
-        "created_user_name":activity["createdUser"]["name"],
-        "created":convert_to_tz(activity["created"]),
-    }
+    return get_disp_activities([activity], tz_name)[0]
+
+def get_disp_activities(activities: list, tz_name: str = None):
+    """
+    Backlog API から取得した更新情報のリストを、まとめてUIに表示する形式に整形する
+
+    更新種別の表示名は読み込み済みの表(activity_types)を1回だけ参照し、日時はまとめて変換する。
+
+    Args:
+        activities (list): Backlog API から取得した更新情報のリスト
+        tz_name (str): 日時を表示するタイムゾーン(ユーザの設定) 未指定の場合は環境変数のタイムゾーン
+
+    Returns:
+        list: UIに表示する形式に整形された更新情報のリスト
+    """
+    types = activity_types.get()
+    created = convert_many_to_tz([activity["created"] for activity in activities], tz_name)
+
+    disp_activities = []
+    append = disp_activities.append
+    for activity, created_at in zip(activities, created):
+        # 定義にない更新種別は、更新種別をそのまま表示名とする
+        activity_type, type_name = types.get(activity["type"]) or (str(activity["type"]), str(activity["type"]))
+        append({
+            "id":activity["id"],
+            "project_name":activity["project"]["name"],
+            "type":activity_type,   # typeは数値ではなく文字列で設定
+            "type_name":type_name,
+            "content_summary":activity["content"].get("summary", " - "),
+            "created_user_name":activity["createdUser"]["name"],
+            "created":created_at,
+        })
+    return disp_activities
@@ -0,0 +1,60 @@
+# activity_projection_benchmark.py
+# 更新情報のUI表示形式への整形(get_disp_activity)のマイクロベンチマーク
+#
+# 従来の実装(1件ごとにactivity_types.jsonを読み込み、strptime/strftimeで日時を変換)と、
+# 読み込み済みの更新種別の表を使い、日時をまとめて変換するget_disp_activitiesの1件あたりの処理時間を比較する。
+#
+# 実行例(appディレクトリで実行):
+#   python bench/activity_projection_benchmark.py --activities 100 --repeat 50
+import argparse, json, os, sys, timeit
+from datetime import datetime
+import pytz
+
+# /appディレクトリをパスに追加
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, APP_DIR)
+
+os.environ.setdefault("TZ", "Asia/Tokyo")
+from activity_types import ACTIVITY_TYPES_PATH
+from tests.fake_backlog import generate_activities
+
+def get_disp_activity_per_item(activity: dict):
+    """比較用: 従来のget_disp_activity(1件ごとにファイル読み込み・日時変換)"""
+    with open(ACTIVITY_TYPES_PATH, 'r', encoding='utf-8') as file:
+        activity_types = json.load(file)
+    tz = pytz.timezone(os.environ.get('TZ', 'Asia/Tokyo'))
+    utc_time = pytz.utc.localize(datetime.strptime(activity["created"], "%Y-%m-%dT%H:%M:%SZ"))
+    return {
+        "id":activity["id"],
+        "project_name":activity["project"]["name"],
+        "type":str(activity["type"]),
+        "type_name":activity_types[str(activity["type"])],
+        "content_summary":activity["content"].get("summary", " - "),
+        "created_user_name":activity["createdUser"]["name"],
+        "created":utc_time.astimezone(tz).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="更新情報の整形のマイクロベンチマーク")
+    parser.add_argument("--activities", type=int, default=100, help="1回に整形する更新情報の件数(1ページ分)")
+    parser.add_argument("--repeat", type=int, default=50, help="繰り返し回数")
+    args = parser.parse_args(argv)
+
+    from backlog import get_disp_activities
+    activities = generate_activities(args.activities)
+    assert get_disp_activities(activities) == [get_disp_activity_per_item(activity) for activity in activities]
+
+    cases = {
+        "per-item": lambda: [get_disp_activity_per_item(activity) for activity in activities],
+        "batch": lambda: get_disp_activities(activities),
+    }
+    baseline = None
+    print(f"{'case':<12}{'us/activity':>14}{'speedup':>10}")
+    for name, case in cases.items():
+        elapsed = min(timeit.repeat(case, number=args.repeat, repeat=3)) / args.repeat / len(activities) * 1_000_000
+        baseline = baseline or elapsed
+        print(f"{name:<12}{elapsed:>14.2f}{baseline / elapsed:>9.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
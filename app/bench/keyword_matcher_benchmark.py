@@ -0,0 +1,79 @@
+# keyword_matcher_benchmark.py
+# キーワード判定のマイクロベンチマーク
+#
+# 従来の再帰的なcontains_keywordと、compile_keywordで作成した判定(全項目・項目指定)の処理時間を比較する。
+# また、複数キーワード(OR・いずれにも一致しない最も遅い場合)について、キーワードごとに判定する場合と
+# Aho–Corasick法で1回で判定する場合を、キーワード数を変えて比較する。
+#
+# 実行例(appディレクトリで実行):
+#   python bench/keyword_matcher_benchmark.py --activities 100 --repeat 200
+import argparse, os, sys, timeit
+
+# /appディレクトリをパスに追加
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, APP_DIR)
+
+from keyword_matcher import compile_keyword, MATCH_ANY
+from tests.fake_backlog import generate_activities
+
+SEARCH_FIELDS = ["project.name", "content.summary", "content.description", "content.comment.content", "createdUser.name"]
+
+def contains_keyword_recursive(data, keyword):
+    """比較用: 従来のcontains_keyword(再帰)"""
+    if keyword is None:
+        return True
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if contains_keyword_recursive(value, keyword):
+                return True
+    elif isinstance(data, list):
+        for item in data:
+            if contains_keyword_recursive(item, keyword):
+                return True
+    elif isinstance(data, str):
+        if keyword in data:
+            return True
+    return False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="キーワード判定のマイクロベンチマーク")
+    parser.add_argument("--activities", type=int, default=100, help="1回の判定対象の更新情報の件数(1ページ分)")
+    parser.add_argument("--repeat", type=int, default=200, help="繰り返し回数")
+    parser.add_argument("--keyword", default="存在しないキーワード", help="キーワード(一致しない場合が最も遅い)")
+    parser.add_argument("--terms", type=int, nargs="+", default=[2, 4, 8, 16, 32], help="複数キーワードの比較で使用するキーワード数")
+    args = parser.parse_args(argv)
+
+    activities = generate_activities(args.activities)
+    keyword = args.keyword
+
+    cases = {
+        "recursive": lambda: [a for a in activities if contains_keyword_recursive(a, keyword)],
+        "compiled": lambda: compile_keyword(keyword).filter(activities),
+        "compiled+fields": lambda: compile_keyword(keyword, fields=SEARCH_FIELDS).filter(activities),
+        "compiled+nfkc": lambda: compile_keyword(keyword, normalize="nfkc").filter(activities),
+    }
+    expected = cases["recursive"]()
+    assert cases["compiled"]() == expected
+
+    baseline = None
+    print(f"{'case':<20}{'ms/page':>10}{'speedup':>10}")
+    for name, case in cases.items():
+        elapsed = min(timeit.repeat(case, number=args.repeat, repeat=3)) / args.repeat * 1000
+        baseline = baseline or elapsed
+        print(f"{name:<20}{elapsed:>10.3f}{baseline / elapsed:>9.2f}x")
+
+    # 複数キーワード: キーワード数が増えても、1ページあたりの処理時間がほぼ一定であることを確認する
+    print()
+    print(f"{'terms':<8}{'per-term(ms)':>14}{'aho-corasick(ms)':>18}")
+    for terms in args.terms:
+        keywords = [f"存在しない{i}" for i in range(terms)]
+        per_term = lambda: [a for a in activities if any(contains_keyword_recursive(a, k) for k in keywords)]
+        automaton = lambda: compile_keyword(keywords, match=MATCH_ANY).filter(activities)
+        assert per_term() == automaton()
+        per_term_elapsed = min(timeit.repeat(per_term, number=args.repeat, repeat=3)) / args.repeat * 1000
+        automaton_elapsed = min(timeit.repeat(automaton, number=args.repeat, repeat=3)) / args.repeat * 1000
+        print(f"{terms:<8}{per_term_elapsed:>14.3f}{automaton_elapsed:>18.3f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
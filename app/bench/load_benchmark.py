@@ -0,0 +1,260 @@
+# load_benchmark.py
+# 主要エンドポイントの負荷試験
+#
+# Backlog APIの代替サーバ(tests/fake_backlog.py)に接続したアプリに対して、
+#   /activities/search・/favorites-search・/token・/favorites
+# へ指定した同時実行数でリクエストを送り、p50/p95/p99のレイテンシ(ミリ秒)とRPSを出力する。
+# 保存済みのベースライン(bench/baseline.json)と比較し、悪化している場合は終了コード1を返す。
+#
+# 実行例(appディレクトリで実行):
+#   python bench/load_benchmark.py --concurrency 8 --requests 400 --latency 0.05
+#   python bench/load_benchmark.py --update-baseline
+import argparse, asyncio, httpx, json, math, os, sys, tempfile, time
+
+# /appディレクトリをパスに追加
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, APP_DIR)
+
+FAKE_BACKLOG_URL = "http://fake-backlog.local"
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+SCENARIOS = ["activities_search", "favorites_search", "token", "favorites"]
+BENCH_USER = "bench_user"
+BENCH_PASSWORD = "bench_password"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="主要エンドポイントの負荷試験")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=4, help="同時実行数")
+    parser.add_argument("--requests", type=int, default=200, help="シナリオごとのリクエスト数")
+    parser.add_argument("--latency", type=float, default=0.02, help="代替サーバの平均レイテンシ(秒)")
+    parser.add_argument("--latency-jitter", type=float, default=0.005, help="代替サーバのレイテンシのばらつき(秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="代替サーバが500を返す割合")
+    parser.add_argument("--token-ttl", type=float, default=3600, help="代替サーバのアクセストークンの有効期限(秒)")
+    parser.add_argument("--rate-limit", type=int, default=0, help="代替サーバのレート制限(0の場合は無制限)")
+    parser.add_argument("--mode", default="synthetic", choices=["synthetic", "record", "replay"])
+    parser.add_argument("--fixture", help="record/replayモードのfixtureファイル")
+    parser.add_argument("--upstream", help="recordモードの中継先のBacklogのURL")
+    parser.add_argument("--database-url", help="使用するデータベース(未指定の場合は一時的なSQLite)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="ベースラインのファイル")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="ベースラインから許容する悪化の割合")
+    parser.add_argument("--update-baseline", action="store_true", help="結果をベースラインとして保存する")
+    parser.add_argument("--output", help="結果をJSONで保存するファイル")
+    return parser.parse_args(argv)
+
+def setup_environment(database_url: str = None):
+    """
+    アプリの設定を負荷試験用に変更する(アプリのモジュールをインポートする前に呼び出す)
+
+    :param database_url: 使用するデータベース(未指定の場合は一時的なSQLite)
+    :return: 一時ディレクトリ(SQLiteの場合)
+    """
+    tmpdir = None
+    if database_url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        database_url = f"sqlite:///{os.path.join(tmpdir.name, 'bench.db')}"
+    os.environ["APP_DATABASE_URL"] = database_url
+    os.environ["BACKLOG_BASE_URL"] = FAKE_BACKLOG_URL
+    os.environ["ACTIVITY_SYNC_ENABLED"] = "false"
+    os.environ.setdefault("SECRET_KEY", "bench_secret_key")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+    os.environ.setdefault("APP_API_URL", "http://localhost:8080")
+    os.environ.setdefault("APP_UI_URL", "http://localhost:3000")
+
+    if database_url.startswith("sqlite"):
+        # 同時に書き込む場合は、ロックの解放を待つ
+        from sqlalchemy.ext.asyncio import create_async_engine
+        import database
+        database.engine = create_async_engine(database.get_async_database_url(database_url), connect_args={"timeout": 30})
+        database.SessionLocal.configure(bind=database.engine)
+    return tmpdir
+
+def percentile(values, p):
+    """
+    パーセンタイル(最近傍順位法)
+
+    :param values: ソート済みの値リスト
+    :param p: パーセント(0〜100)
+    :return: パーセンタイル値
+    """
+    if not values:
+        return None
+    index = max(math.ceil(p / 100 * len(values)) - 1, 0)
+    return values[index]
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50": round(percentile(latencies, 50) * 1000, 2),
+        "p95": round(percentile(latencies, 95) * 1000, 2),
+        "p99": round(percentile(latencies, 99) * 1000, 2),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+    }
+
+async def run_scenario(client, request, concurrency: int, total: int):
+    """
+    シナリオを同時実行数concurrencyで合計total回実行する
+
+    :param client: アプリに接続したhttpx.AsyncClient
+    :param request: 1リクエストを送る関数(引数は通し番号)
+    :return: 集計結果
+    """
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                response = await request(client, i)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            if failed:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """
+    ベースラインと比較し、悪化したシナリオを返す
+
+    p95がベースラインの(1 + tolerance)倍を超えた場合、RPSが(1 - tolerance)倍を下回った場合を悪化とする。
+
+    :return: 悪化の内容のリスト
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if result["p95"] > base["p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95']}ms -> {result['p95']}ms")
+        if base.get("rps") and result["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {base['rps']} -> {result['rps']}")
+    return regressions
+
+async def run(args):
+    tmpdir = setup_environment(args.database_url)
+    try:
+        import backlog, crud, database, main, models
+        from schemas import UserCreate
+        from password_hasher import password_hasher
+        from tests.fake_backlog import FakeBacklogConfig, create_fake_backlog_app
+
+        fake = create_fake_backlog_app(FakeBacklogConfig(
+            latency=args.latency,
+            latency_jitter=args.latency_jitter,
+            error_rate=args.error_rate,
+            token_ttl=args.token_ttl,
+            rate_limit=args.rate_limit,
+            mode=args.mode,
+            fixture_path=args.fixture,
+            upstream_url=args.upstream,
+        ))
+        activity_count = fake.state.config.activity_count
+
+        # 負荷試験用のユーザ(Backlog連携済み)を作成
+        async with database.engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        async with database.SessionLocal() as db:
+            user = await crud.get_user_by_username(db, BENCH_USER)
+            if user is None:
+                hashed_password = await password_hasher.hash(BENCH_PASSWORD)
+                user = await crud.create_user(db, UserCreate(username=BENCH_USER, password=BENCH_PASSWORD), hashed_password=hashed_password)
+            tokens = fake.state.issue_tokens()
+            await crud.update_user_tokens(db, user.id, tokens["access_token"], tokens["refresh_token"])
+            for activity_id in range(1, 21):
+                await crud.add_favorite(db, user.id, activity_id, f"お気に入り{activity_id}")
+
+        backlog._http_client = backlog.create_http_client(transport=httpx.ASGITransport(app=fake))
+        app_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app, raise_app_exceptions=False), base_url="http://app.local", timeout=60)
+
+        response = await app_client.post("/token", data={"username": BENCH_USER, "password": BENCH_PASSWORD})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        async def activities_search(client, i):
+            return await client.get("/activities/search", params={"keyword": "不具合", "limit": 20}, headers=headers)
+
+        async def favorites_search(client, i):
+            return await client.get("/favorites-search", headers=headers)
+
+        async def token(client, i):
+            return await client.post("/token", data={"username": BENCH_USER, "password": BENCH_PASSWORD})
+
+        async def favorites(client, i):
+            activity_id = 21 + i % (activity_count - 20)
+            return await client.post("/favorites", json={"activity_id": str(activity_id), "activity_title": f"お気に入り{activity_id}"}, headers=headers)
+
+        requests = {
+            "activities_search": activities_search,
+            "favorites_search": favorites_search,
+            "token": token,
+            "favorites": favorites,
+        }
+        results = {}
+        try:
+            for name in args.scenarios:
+                results[name] = await run_scenario(app_client, requests[name], args.concurrency, args.requests)
+        finally:
+            await app_client.aclose()
+            await backlog.shutdown_http_client()
+            backlog.token_manager.close()
+            password_hasher.shutdown()
+        return results, fake.state.fake_backlog.request_count
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+def main(argv=None):
+    args = parse_args(argv)
+    results, backlog_requests = asyncio.run(run(args))
+
+    print(f"{'scenario':<20}{'requests':>10}{'errors':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'rps':>10}")
+    for name, result in results.items():
+        print(f"{name:<20}{result['requests']:>10}{result['errors']:>8}{result['p50']:>10}{result['p95']:>10}{result['p99']:>10}{result['rps']:>10}")
+    print(f"Backlog API calls: {backlog_requests}")
+
+    report = {
+        "settings": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "latency": args.latency,
+            "latency_jitter": args.latency_jitter,
+            "error_rate": args.error_rate,
+            "rate_limit": args.rate_limit,
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+            file.write("\n")
+        print(f"ベースラインを保存しました: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("ベースラインがないため、比較しません")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    if baseline.get("settings") != report["settings"]:
+        print("ベースラインと設定が異なるため、参考値として比較します")
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# circuit_breaker.py
+import time
+import metrics
+
+# 状態
+STATE_CLOSED = "closed"         # 正常(呼び出しを許可)
+STATE_OPEN = "open"             # 障害中(呼び出しを即時に失敗させる)
+STATE_HALF_OPEN = "half_open"   # 回復確認中(試行の呼び出しのみ許可)
+
+class CircuitOpenError(Exception):
+    """
+    サーキットブレーカーが開いているため、呼び出しを行わなかった場合の例外
+    """
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"circuit for {name} is open, retry after {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    接続先ごとのサーキットブレーカー
+
+    連続してfailure_threshold回失敗した場合に開き、recovery_timeout秒の間は呼び出しを即時に失敗させる。
+    その後、試行の呼び出しが成功した場合に閉じ、失敗した場合は再度開く。
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30, half_open_max_calls: int = 1):
+        """
+        :param name: 接続先(ホスト名など)
+        :param failure_threshold: 開くまでの連続失敗回数
+        :param recovery_timeout: 開いてから試行の呼び出しを許可するまでの秒数
+        :param half_open_max_calls: 回復確認中に同時に許可する呼び出し数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    def retry_after(self) -> float:
+        """
+        試行の呼び出しを許可するまでの秒数を取得
+
+        :return: 秒数(閉じている場合は0)
+        """
+        if self.state != STATE_OPEN:
+            return 0.0
+        return max(self._opened_at + self.recovery_timeout - time.monotonic(), 0.0)
+
+    def is_available(self) -> bool:
+        """
+        呼び出しが許可される状態かを取得(状態は変更しない)
+
+        :return: 許可される場合はTrue
+        """
+        if self.state == STATE_OPEN:
+            return self.retry_after() <= 0
+        if self.state == STATE_HALF_OPEN:
+            return self._half_open_calls < self.half_open_max_calls
+        return True
+
+    def before_call(self):
+        """
+        呼び出し前に確認する
+
+        :raises CircuitOpenError: 呼び出しが許可されない場合
+        """
+        if self.state == STATE_OPEN:
+            if self.retry_after() > 0:
+                metrics.increment(f"circuit.{self.name}.short_circuited")
+                raise CircuitOpenError(self.name, self.retry_after())
+            self._set_state(STATE_HALF_OPEN)
+        if self.state == STATE_HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                metrics.increment(f"circuit.{self.name}.short_circuited")
+                raise CircuitOpenError(self.name, self.recovery_timeout)
+            self._half_open_calls += 1
+
+    def record_success(self):
+        """
+        呼び出しの成功を記録する
+        """
+        self._failures = 0
+        if self.state != STATE_CLOSED:
+            self._set_state(STATE_CLOSED)
+
+    def record_failure(self):
+        """
+        呼び出しの失敗(タイムアウト・接続エラー・5xx)を記録する
+        """
+        self._failures += 1
+        if self.state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(STATE_OPEN)
+
+    def release(self):
+        """
+        結果を記録せずに呼び出しを終了した場合(キャンセルなど)に、回復確認中の試行の枠を返却する
+        """
+        if self.state == STATE_HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def _set_state(self, state: str):
+        self.state = state
+        self._half_open_calls = 0
+        metrics.set_gauge(f"circuit.{self.name}.state", state)
+        metrics.increment(f"circuit.{self.name}.{state}")
@@ -1,33 +1,52 @@
 # crud.py
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 import models
 from schemas import UserCreate
-from utils import get_password_hash
+from sqlalchemy import select, update, delete, func, and_, or_, literal, values, column, true, String
+from sqlalchemy.dialects import postgresql, sqlite
+from keyword_matcher import normalize_keywords, get_normalizer, MATCH_ALL
+from search_query import SearchQuery, start_of_day
+from user_cache import user_cache
+from utils import build_search_text, is_valid_timezone, get_timezone, get_default_timezone_name, SEARCH_TEXT_SEPARATOR, DISP_DATETIME_FORMAT
+from env_config import Configs
 
-def get_user_by_username(db: Session, username: str):
+async def get_user_by_username(db: AsyncSession, username: str):
     """usernameで指定されたユーザーを取得
 
     Args:
-        db (Session): DBセッション
+        db (AsyncSession): DBセッション
         username (str): ユーザー名
 
     Returns:
         User: ユーザーインスタンス Noneの場合は見つからない
     """
-    return db.query(models.User).filter(models.User.user_nm == username).first()
+    return await db.scalar(select(models.User).where(models.User.user_nm == username))
 
-def create_user(db: Session, user: UserCreate):
-    """新規ユーザー登録
+async def get_user(db: AsyncSession, user_id: int):
+    """ユーザーIDで指定されたユーザーを取得
 
     Args:
-        db (Session): DBセッション
-        user (UserCreate): ユーザ情報
+        db (AsyncSession): DBセッション
+        user_id (int): ユーザーID
 
     Returns:
-        User: ユーザーインスタンス
+        User: ユーザーインスタンス Noneの場合は見つからない
+    """
+    return await db.get(models.User, user_id)
+
+async def validate_new_user(db: AsyncSession, user: UserCreate):
+    """新規ユーザー登録の入力チェック(パスワードのハッシュ化の前に行う)
+
+    Args:
+        db (AsyncSession): DBセッション
+        user (UserCreate): ユーザ情報
+
+    Raises:
+        HTTPException: 既に登録されているユーザー名、または未知のタイムゾーンの場合
     """
-    existing_user = get_user_by_username(db, username=user.username)
+    existing_user = await get_user_by_username(db, username=user.username)
     if existing_user:
         # 既にユーザーが登録されている場合はエラーを返す
         raise HTTPException(
@@ -35,28 +54,95 @@ def create_user(db: Session, user: UserCreate):
             detail="Username already registered",
         )
     
-    hashed_password = get_password_hash(user.password)
-    db_user = models.User(user_nm=user.username, pw_hash=hashed_password)
+    _validate_timezone(user.timezone)
+
+async def create_user(db: AsyncSession, user: UserCreate, hashed_password: str):
+    """新規ユーザー登録
+
+    Args:
+        db (AsyncSession): DBセッション
+        user (UserCreate): ユーザ情報
+        hashed_password (str): ハッシュ化済みのパスワード(イベントループを止めないよう、password_hasherでハッシュ化する)
+
+    Returns:
+        User: ユーザーインスタンス
+
+    Raises:
+        HTTPException: 既に登録されているユーザー名の場合
+
+    入力チェック(validate_new_user)は呼び出し元でハッシュ化の前に行う。
+    チェックの後に同じユーザー名が登録された場合は、ユーザー名の一意制約の違反を同じエラーとして返す。
+    """
+    db_user = models.User(user_nm=user.username, pw_hash=hashed_password, timezone=user.timezone)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username already registered",
+        )
     return db_user
 
-def update_user_tokens(db: Session, user_id: int, access_token: str, refresh_token: str):
+async def update_user_password_hash(db: AsyncSession, user_id: int, hashed_password: str):
+    """ユーザーのパスワードハッシュを更新(ハッシュのコストを変更した場合の再ハッシュ)
+
+    Args:
+        db (AsyncSession): DBセッション
+        user_id (int): ユーザID
+        hashed_password (str): 新しいパスワードハッシュ
+    """
+    await db.execute(update(models.User).where(models.User.id == user_id).values(pw_hash=hashed_password))
+    await db.commit()
+    user_cache.invalidate(user_id)
+
+async def update_user_timezone(db: AsyncSession, user_id: int, timezone: str):
+    """ユーザーの表示タイムゾーンを更新
+
+    Args:
+        db (AsyncSession): DBセッション
+        user_id (int): ユーザーID
+        timezone (str): タイムゾーン名 Noneの場合は環境変数TZを使用する
+
+    Returns:
+        User: ユーザーインスタンス
+    """
+    _validate_timezone(timezone)
+    user = await db.get(models.User, user_id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="ユーザが存在しないため、タイムゾーンを更新できません",
+        )
+    user.timezone = timezone
+    await db.commit()
+    user_cache.invalidate(user_id)
+    return user
+
+def _validate_timezone(timezone: str):
+    """タイムゾーン名が不正な場合はエラーを返す"""
+    if timezone is not None and not is_valid_timezone(timezone):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown timezone",
+        )
+
+async def update_user_tokens(db: AsyncSession, user_id: int, access_token: str, refresh_token: str):
     """Backlogのアクセストークンをデータベースに保存
 
     Args:
-        db (Session): DBセッション
+        db (AsyncSession): DBセッション
         user_id (int): ユーザーID
         access_token (str): アクセストークン
         refresh_token (str): リフレッシュトークン
     """
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await db.get(models.User, user_id)
     if user:
         user.backlog_access_token = access_token
         user.backlog_refresh_token = refresh_token
-        db.commit()
-        db.refresh(user)
+        await db.commit()
+        user_cache.invalidate(user_id)
     else:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -64,51 +150,125 @@ def update_user_tokens(db: Session, user_id: int, access_token: str, refresh_tok
         )
 
 
-def add_favorite(db: Session, user_id: int, activity_id: int, activity_title: str):
+async def add_favorite(db: AsyncSession, user_id: int, activity_id: int, activity_title: str, activity: dict = None):
     """お気に入りテーブルへ更新情報を登録
 
+    ユーザの存在チェックと登録を1回のSQL(INSERT ... SELECT ... ON CONFLICT ... RETURNING)で行う。
+    登録済みの更新情報の場合は、タイトルを更新して既存のお気に入りIDを返す。
+
     Args:
-        db (Session): DBセッション
+        db (AsyncSession): DBセッション
         user_id (int): ユーザーID
         activity_id (int): 更新情報ID
         activity_title (str): 更新情報名
+        activity (dict): UI表示形式の更新情報 指定された場合は更新情報テーブルにも保存する
 
     Returns:
         int: お気に入りID
     """
+    favorites = models.Favorite.__table__
+    statement = _insert(db, favorites).from_select(
+        ["user_id", "activity_id", "activity_title"],
+        select(
+            models.User.id,
+            literal(str(activity_id), String),
+            literal(activity_title, String),
+        ).where(models.User.id == user_id),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[favorites.c.user_id, favorites.c.activity_id],
+        set_={"activity_title": statement.excluded.activity_title, "updated_at": func.now()},
+    ).returning(favorites.c.id)
+    favorite_id = await db.scalar(statement)
+
+    # ユーザが存在しない場合は登録されない
+    if favorite_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="ユーザーが存在しないため、お気に入り登録できません",
+        )
+    if activity is not None:
+        await _merge_activity_snapshots(db, [activity])
+    await db.commit()
+
+    return favorite_id
+
+def _insert(db: AsyncSession, table):
+    """データベースに応じたINSERT文(ON CONFLICTを指定できる)を作成"""
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+async def add_favorites(db: AsyncSession, user_id: int, favorites: list):
+    """お気に入りテーブルへ複数の更新情報を一括登録
+
+    add_favoriteと同様に、ユーザの存在チェックと登録を1回のSQL
+    (WITH ... VALUES ... INSERT ... SELECT ... ON CONFLICT ... RETURNING)で行う。
+    登録済みの更新情報はタイトルを更新し、同じ更新情報を複数指定した場合は最後のタイトルを使用する。
+
+    Args:
+        db (AsyncSession): DBセッション
+        user_id (int): ユーザーID
+        favorites (list[FavoriteCreate]): 登録する更新情報リスト
+
+    Returns:
+        list[int]: お気に入りIDリスト(指定された順序 同じ更新情報は同じID)
+
+    Raises:
+        HTTPException: ユーザーが存在しない場合
+    """
+    titles = {str(favorite.activity_id): favorite.activity_title for favorite in favorites}
+    table = models.Favorite.__table__
+    requested = values(
+        column("activity_id", String),
+        column("activity_title", String),
+        name="requested",
+    ).data(list(titles.items())).cte("requested")
+    statement = _insert(db, table).from_select(
+        ["user_id", "activity_id", "activity_title"],
+        select(models.User.id, requested.c.activity_id, requested.c.activity_title)
+        .select_from(requested)
+        .join(models.User, true())
+        .where(models.User.id == user_id),
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.activity_id],
+        set_={"activity_title": statement.excluded.activity_title, "updated_at": func.now()},
+    ).returning(table.c.activity_id, table.c.id)
+    rows = (await db.execute(statement)).all()
 
-    # ユーザの存在チェック
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not db_user:
+    # ユーザが存在しない場合は登録されない
+    if not rows:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="ユーザーが存在しないため、お気に入り登録できません",
         )
-    # お気に入りに登録
-    db_favorite = models.Favorite(user_id=user_id, activity_id=activity_id, activity_title=activity_title)
-    db.add(db_favorite)
-    db.commit()
-    db.refresh(db_favorite)
+    await db.commit()
 
-    return db_favorite.id
+    # RETURNINGの順序は保証されないため、更新情報IDで対応付ける
+    favorite_ids = dict(rows)
+    return [favorite_ids[str(favorite.activity_id)] for favorite in favorites]
 
-def get_favorites_all(db: Session, user_id: int):
+async def get_favorites_all(db: AsyncSession, user_id: int):
     """指定されたユーザーのお気に入り情報を取得
 
     Args:
-        db (Session): DBセッション
+        db (AsyncSession): DBセッション
         user_id (int): ユーザーID
 
     Returns:
-        list[Favorite]: お気に入り情報リスト
+        list[Favorite]: お気に入り情報リスト(お気に入りIDの昇順)
     """
-    return db.query(models.Favorite).filter(models.Favorite.user_id == user_id).all()
+    return (await db.scalars(
+        select(models.Favorite).where(models.Favorite.user_id == user_id).order_by(models.Favorite.id)
+    )).all()
 
-def delete_favorite(db: Session, favorite_id: int, user_id: int):
+async def delete_favorite(db: AsyncSession, favorite_id: int, user_id: int):
     """指定されたお気に入り情報を削除
 
     Args:
-        db (Session): DBセッション
+        db (AsyncSession): DBセッション
         favorite_id (int): お気に入りID
         user_id (int): ユーザーID
 
@@ -116,10 +276,10 @@ def delete_favorite(db: Session, favorite_id: int, user_id: int):
         HTTPException: お気に入りデータが見つからない場合
     """
     #　お気に入りテーブルにデータが見つからない場合はエラーを返す 
-    db_favorite = db.query(models.Favorite).filter(
+    db_favorite = await db.scalar(select(models.Favorite).where(
         models.Favorite.id == favorite_id, 
         models.Favorite.user_id == user_id
-        ).first()
+        ))
     if not db_favorite:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, 
@@ -127,5 +287,245 @@ def delete_favorite(db: Session, favorite_id: int, user_id: int):
         )
 
     # お気に入りテーブルから削除
-    db.delete(db_favorite)
-    db.commit()
\ No newline at end of file
+    await db.delete(db_favorite)
+    await db.commit()
+
+async def delete_favorites(db: AsyncSession, favorite_ids: list, user_id: int):
+    """指定されたお気に入り情報を一括削除
+
+    1回のSQL(DELETE ... RETURNING)で削除する。他のユーザーのお気に入り・存在しないお気に入りIDは無視する。
+
+    Args:
+        db (AsyncSession): DBセッション
+        favorite_ids (list[int]): お気に入りIDリスト
+        user_id (int): ユーザーID
+
+    Returns:
+        list[int]: 削除したお気に入りIDリスト(昇順)
+    """
+    table = models.Favorite.__table__
+    rows = await db.scalars(
+        delete(table)
+        .where(table.c.user_id == user_id, table.c.id.in_(set(favorite_ids)))
+        .returning(table.c.id)
+    )
+    deleted_ids = sorted(rows)
+    await db.commit()
+    return deleted_ids
+
+async def get_activity_snapshots(db: AsyncSession, activity_ids: list):
+    """更新情報テーブルから指定された更新情報を取得
+
+    Args:
+        db (AsyncSession): DBセッション
+        activity_ids (list): 更新情報IDのリスト(数値以外のIDは無視する)
+
+    Returns:
+        dict: 更新情報IDをキーとしたUI表示形式の更新情報
+    """
+    ids = {int(activity_id) for activity_id in activity_ids if str(activity_id).isdigit()}
+    if not ids:
+        return {}
+
+    rows = await db.scalars(select(models.StoredActivity).where(models.StoredActivity.id.in_(ids)))
+    return {row.id: _to_disp_activity(row) for row in rows}
+
+async def save_activity_snapshots(db: AsyncSession, activities: list):
+    """UI表示形式の更新情報を更新情報テーブルへ保存(既に存在する場合は上書き)
+
+    Args:
+        db (AsyncSession): DBセッション
+        activities (list[dict]): UI表示形式の更新情報リスト
+    """
+    if not activities:
+        return
+    await _merge_activity_snapshots(db, activities)
+    await db.commit()
+
+def _to_disp_activity(row: models.StoredActivity):
+    """更新情報テーブルの行をUI表示形式の更新情報に変換"""
+    return {
+        "id": row.id,
+        "project_name": row.project_name,
+        "type": row.type,
+        "type_name": row.type_name,
+        "content_summary": row.content_summary,
+        "created_user_name": row.created_user_name,
+        "created": row.created,
+    }
+
+SNAPSHOT_COLUMNS = ("project_name", "type", "type_name", "content_summary", "created_user_name", "created")
+
+async def _merge_activity_snapshots(db: AsyncSession, activities: list, raws: dict = None, space_key: str = None):
+    """更新情報テーブルへの登録・上書き(コミットは呼び出し元で行う)
+
+    同じ更新情報を並行して保存しても主キーが重複しないよう、INSERT ... ON CONFLICT (id) DO UPDATE で保存する。
+    取得元の更新情報(raws)がある場合のみ、raw・search_text・space_keyを上書きする。
+    """
+    rows = {}
+    for activity in activities:
+        activity_id = int(activity["id"])
+        row = {"id": activity_id, **{column: activity[column] for column in SNAPSHOT_COLUMNS}}
+        if raws is not None and activity_id in raws:
+            search_text = build_search_text(raws[activity_id], Configs.ACTIVITY_SEARCH_NORMALIZE, Configs.ACTIVITY_SEARCH_FIELDS)
+            row.update(raw=raws[activity_id], search_text=search_text, space_key=space_key)
+        rows[activity_id] = row
+
+    # 上書きする列が異なるため、取得元の更新情報の有無で分けて実行する
+    for with_raw in (False, True):
+        values = [row for row in rows.values() if ("raw" in row) == with_raw]
+        if not values:
+            continue
+        statement = _insert(db, models.StoredActivity).values(values)
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=[models.StoredActivity.id],
+            set_={
+                **{column: statement.excluded[column] for column in values[0] if column != "id"},
+                "updated_at": func.now(),
+            },
+        ))
+
+async def get_backlog_connected_user(db: AsyncSession):
+    """Backlogのトークンが保存されているユーザーを1件取得(同期処理用)
+
+    Args:
+        db (AsyncSession): DBセッション
+
+    Returns:
+        User: ユーザーインスタンス Noneの場合は見つからない
+    """
+    return await db.scalar(select(models.User).where(
+        models.User.backlog_access_token.isnot(None),
+        models.User.deleted_at.is_(None),
+        ).order_by(models.User.id).limit(1))
+
+async def get_sync_state(db: AsyncSession, space_key: str):
+    """スペースの同期済みの最新の更新情報IDを取得
+
+    Args:
+        db (AsyncSession): DBセッション
+        space_key (str): スペース
+
+    Returns:
+        int: 同期済みの最新の更新情報ID 未同期の場合はNone
+    """
+    state = await db.get(models.SyncState, space_key)
+    return state.last_activity_id if state else None
+
+async def save_synced_activities(db: AsyncSession, space_key: str, activities: list, raws: list, last_activity_id: int):
+    """同期処理で取得した更新情報と同期状態を保存
+
+    Args:
+        db (AsyncSession): DBセッション
+        space_key (str): スペース
+        activities (list[dict]): UI表示形式の更新情報リスト
+        raws (list[dict]): Backlog APIから取得した更新情報リスト(activitiesと同じ順序)
+        last_activity_id (int): 同期済みの最新の更新情報ID
+    """
+    if activities:
+        await _merge_activity_snapshots(
+            db,
+            activities,
+            raws={int(raw["id"]): raw for raw in raws},
+            space_key=space_key,
+        )
+    state = await db.get(models.SyncState, space_key)
+    if state is None:
+        state = models.SyncState(space_key=space_key)
+        db.add(state)
+    state.last_activity_id = last_activity_id
+    await db.commit()
+
+async def search_stored_activities(db: AsyncSession, space_key: str, keyword, limit: int,
+                                   min_id: int = None, max_id: int = None, match: str = MATCH_ALL, search_query: SearchQuery = None,
+                                   project_ids=None, tz_name: str = None):
+    """同期済みの更新情報から、キーワードに一致する更新情報を新しい順に取得
+
+    キーワードは検索用テキスト(search_text)への部分一致で検索する。
+    検索用テキストは同期時にACTIVITY_SEARCH_NORMALIZE・ACTIVITY_SEARCH_FIELDSに従って作成しているため、
+    キーワードも同じ方法で正規化する(Backlog APIから検索する場合と同じ結果になる)。
+    複数のキーワードは、matchに応じてAND(MATCH_ALL)またはOR(MATCH_ANY)で検索する。
+    PostgreSQLではpg_trgmのGINインデックスを使用する(3文字未満のキーワードはインデックスを使用できない)。
+
+    Args:
+        db (AsyncSession): DBセッション
+        space_key (str): スペース
+        keyword (str | list[str]): 検索キーワード(1つまたはリスト) Noneの場合は全件一致
+        limit (int): 取得件数
+        min_id (int): この更新情報IDより新しいもののみ取得する
+        max_id (int): この更新情報IDより古いもののみ取得する
+        match (str): 複数キーワードの一致条件
+        search_query (SearchQuery): 検索構文の解析結果(キーワード以外の条件もSQLで絞り込む)
+        project_ids (set[int]): 検索するユーザが参照できるプロジェクトID Noneの場合は絞り込まない
+        tz_name (str): 検索構文の登録日の日付のタイムゾーン(ユーザの設定) 未指定の場合は環境変数TZのタイムゾーン
+
+    Returns:
+        tuple[list[dict], int]: UI表示形式の更新情報リスト, 次ページのmax_id(続きがない場合はNone)
+
+    Raises:
+        ValueError: キーワードに改行(項目区切り文字)が含まれる場合
+    """
+    query = select(models.StoredActivity).where(
+        models.StoredActivity.space_key == space_key,
+        models.StoredActivity.search_text.isnot(None),
+        )
+    if project_ids is not None:
+        # 同期処理は1人のユーザのトークンで取得するため、検索するユーザが参照できるプロジェクトの更新情報のみ返す
+        if not project_ids:
+            return [], None
+        query = query.where(models.StoredActivity.raw["project"]["id"].as_integer().in_(sorted(project_ids)))
+    if min_id is not None:
+        query = query.where(models.StoredActivity.id > min_id)
+    if max_id is not None:
+        query = query.where(models.StoredActivity.id < max_id)
+    if search_query is not None:
+        query = query.where(*_stored_activity_conditions(search_query, tz_name))
+        keyword = (normalize_keywords(keyword) or []) + search_query.keywords
+    keywords = normalize_keywords(keyword)
+    if keywords is not None:
+        # 項目区切り文字を含むキーワードは、複数のテキスト項目にまたがって一致してしまうため受け付けない
+        if any(SEARCH_TEXT_SEPARATOR in keyword for keyword in keywords):
+            raise ValueError("keyword must not contain line breaks")
+        normalizer = get_normalizer(Configs.ACTIVITY_SEARCH_NORMALIZE)
+        if normalizer is not None:
+            keywords = [normalizer(keyword) for keyword in keywords]
+        if db.bind.dialect.name == "postgresql":
+            conditions = [models.StoredActivity.search_text.contains(keyword, autoescape=True) for keyword in keywords]
+        else:
+            conditions = [func.instr(models.StoredActivity.search_text, keyword) > 0 for keyword in keywords]
+        query = query.where(and_(*conditions) if match == MATCH_ALL else or_(*conditions))
+
+    # 続きがあるかを判定するため、1件多く取得する
+    rows = (await db.scalars(query.order_by(models.StoredActivity.id.desc()).limit(limit + 1))).all()
+    next_max_id = rows[limit - 1].id if len(rows) > limit else None
+    return [_to_disp_activity(row) for row in rows[:limit]], next_max_id
+
+def _stored_activity_conditions(search_query: SearchQuery, tz_name: str = None):
+    """検索構文のキーワード以外の条件を、更新情報テーブルの検索条件に変換
+
+    登録日(created)はUI表示形式(環境変数TZのタイムゾーン)の文字列で保持しているため、
+    日付(ユーザのタイムゾーンの0時)を環境変数TZのタイムゾーンの文字列に変換して比較する。
+    """
+    stored_tz = get_timezone(get_default_timezone_name())
+    raw = models.StoredActivity.raw
+    conditions = []
+    if search_query.projects:
+        projects = [project.upper() for project in search_query.projects]
+        conditions.append(or_(
+            raw["project"]["projectKey"].as_string().in_(projects),
+            models.StoredActivity.project_name.in_(search_query.projects),
+        ))
+    if search_query.types:
+        conditions.append(models.StoredActivity.type.in_([str(activity_type) for activity_type in search_query.types]))
+    if search_query.users:
+        conditions.append(or_(
+            raw["createdUser"]["userId"].as_string().in_(search_query.users),
+            models.StoredActivity.created_user_name.in_(search_query.users),
+        ))
+    if search_query.after:
+        after = start_of_day(search_query.after, tz_name).astimezone(stored_tz)
+        conditions.append(models.StoredActivity.created >= after.strftime(DISP_DATETIME_FORMAT))
+    if search_query.before:
+        before = start_of_day(search_query.before, tz_name).astimezone(stored_tz)
+        conditions.append(models.StoredActivity.created < before.strftime(DISP_DATETIME_FORMAT))
+    return conditions
@@ -1,11 +1,129 @@
 # database.py
-from sqlalchemy import create_engine
+import asyncio, logging, time
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from env_config import Configs
 import os
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# 同期ドライバのURL(alembicと共通の設定)を指定した場合は、非同期ドライバに置き換える
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(url: str):
+    """
+    データベースのURLを非同期ドライバ(asyncpg・aiosqlite)のURLに変換
+
+    :param url: データベースのURL
+    :return: 非同期ドライバのURL
+    """
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    接続の取得待ち時間(新しく接続する場合は接続時間を含む)を記録するコネクションプール
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.increment("db.pool.timeouts")
+            raise
+        finally:
+            metrics.observe("db.pool.checkout_wait", time.perf_counter() - started)
+
+def create_database_engine(url: str):
+    """
+    データベースのエンジンを作成
+
+    PostgreSQLの場合は、コネクションプールの設定(DB_POOL_*)とSQLのタイムアウト(DB_STATEMENT_TIMEOUT)を適用する。
+
+    :param url: データベースのURL
+    :return: エンジン
+    """
+    url = get_async_database_url(url)
+    if url.get_backend_name() != "postgresql":
+        return create_async_engine(url)
+
+    connect_args = {}
+    if Configs.DB_STATEMENT_TIMEOUT > 0:
+        connect_args["server_settings"] = {"statement_timeout": str(Configs.DB_STATEMENT_TIMEOUT)}
+    return create_async_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=Configs.DB_POOL_SIZE,
+        max_overflow=Configs.DB_MAX_OVERFLOW,
+        pool_timeout=Configs.DB_POOL_TIMEOUT,
+        pool_recycle=Configs.DB_POOL_RECYCLE,
+        pool_pre_ping=Configs.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+def get_pool_status():
+    """
+    コネクションプールの使用状況
+
+    :return: size(プールの接続数の上限)・checked_out(使用中)・idle(待機中)・overflow(上限を超えて接続中)の辞書
+        接続数を管理しないプール(SQLiteなど)の場合は空の辞書
+    """
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+    }
+
+async def prewarm_pool(count: int):
+    """
+    コネクションプールに接続しておく(起動直後のリクエストで接続を待たないようにする)
+
+    接続に失敗した場合はログを出力して続行する(以降のリクエストで接続する)。
+    接続数はプールの上限(pool_size + max_overflow)までとする(上限を超えるとpool_timeoutまで待ってしまうため)。
+
+    :param count: 接続数
+    """
+    pool = engine.pool
+    max_overflow = getattr(pool, "_max_overflow", None)
+    if hasattr(pool, "size") and max_overflow is not None and max_overflow >= 0:
+        count = min(count, pool.size() + max_overflow)
+    if count <= 0:
+        return
+    results = await asyncio.gather(*(engine.connect() for _ in range(count)), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        logger.warning("データベースへの事前接続に失敗しました(%s/%s件): %r", len(errors), count, errors[0])
+    for connection in results:
+        if not isinstance(connection, Exception):
+            await connection.close()
 
 SQLALCHEMY_DATABASE_URL = os.environ.get("APP_DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_database_engine(SQLALCHEMY_DATABASE_URL)
+# コミット後も取得済みの値を保持する(認証で取得したユーザーを、エンドポイントのコミット後・バックグラウンド処理でも参照するため)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
+
+# コネクションプールの使用状況(/metricsの取得時に計算する)
+for _name in ("size", "checked_out", "idle", "overflow"):
+    metrics.register_gauge(f"db.pool.{_name}", lambda name=_name: get_pool_status().get(name))
+
+# データベースセッション(リクエスト単位)
+# 認証(auth.get_current_user)とエンドポイントで同じ依存関係を使用し、1リクエストで1つのセッション(接続)を共有する
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
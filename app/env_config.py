@@ -28,4 +28,84 @@ class Configs:
 
     # 環境変数からOAuth2の設定を取得
     BACKLOG_CLIENT_ID = os.getenv("BACKLOG_CLIENT_ID")
-    BACKLOG_CLIENT_SECRET = os.getenv("BACKLOG_CLIENT_SECRET")
\ No newline at end of file
+    BACKLOG_CLIENT_SECRET = os.getenv("BACKLOG_CLIENT_SECRET")
+
+    # Backlog API呼び出し用HTTPクライアントの設定(コネクションプール・タイムアウト)
+    BACKLOG_HTTP2 = os.getenv("BACKLOG_HTTP2", "false").lower() == "true"
+    BACKLOG_HTTP_MAX_CONNECTIONS = int(os.getenv("BACKLOG_HTTP_MAX_CONNECTIONS", "100"))
+    BACKLOG_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("BACKLOG_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    BACKLOG_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("BACKLOG_HTTP_KEEPALIVE_EXPIRY", "30"))
+    BACKLOG_HTTP_CONNECT_TIMEOUT = float(os.getenv("BACKLOG_HTTP_CONNECT_TIMEOUT", "5"))
+    BACKLOG_HTTP_READ_TIMEOUT = float(os.getenv("BACKLOG_HTTP_READ_TIMEOUT", "10"))
+    BACKLOG_HTTP_POOL_TIMEOUT = float(os.getenv("BACKLOG_HTTP_POOL_TIMEOUT", "5"))
+
+    # お気に入りの更新情報取得の同時実行数(ユーザ単位・全体)と1件あたりのタイムアウト(秒)
+    BACKLOG_FETCH_USER_CONCURRENCY = int(os.getenv("BACKLOG_FETCH_USER_CONCURRENCY", "8"))
+    BACKLOG_FETCH_GLOBAL_CONCURRENCY = int(os.getenv("BACKLOG_FETCH_GLOBAL_CONCURRENCY", "32"))
+    BACKLOG_FETCH_TIMEOUT = float(os.getenv("BACKLOG_FETCH_TIMEOUT", "10"))
+
+    # 同一のBacklog API呼び出しを共有する範囲("user": ユーザ(トークンの持ち主)単位, "space": スペース全体)
+    BACKLOG_SINGLEFLIGHT_SCOPE = os.getenv("BACKLOG_SINGLEFLIGHT_SCOPE", "user")
+
+    # Backlogのアクセストークンを有効期限の何秒前に更新するか、最終利用から何秒以内のユーザをバックグラウンドで更新するか
+    BACKLOG_TOKEN_RENEW_MARGIN = float(os.getenv("BACKLOG_TOKEN_RENEW_MARGIN", "300"))
+    BACKLOG_TOKEN_RENEW_ACTIVE_WINDOW = float(os.getenv("BACKLOG_TOKEN_RENEW_ACTIVE_WINDOW", "1800"))
+
+    # Backlog API呼び出しのスケジューラ設定(同時実行数・レート制限の残数の予約・待機時間の上限(秒))
+    BACKLOG_SCHEDULER_MAX_CONCURRENCY = int(os.getenv("BACKLOG_SCHEDULER_MAX_CONCURRENCY", "16"))
+    BACKLOG_SCHEDULER_USER_CONCURRENCY = int(os.getenv("BACKLOG_SCHEDULER_USER_CONCURRENCY", "4"))
+    BACKLOG_SCHEDULER_BACKGROUND_RESERVE = int(os.getenv("BACKLOG_SCHEDULER_BACKGROUND_RESERVE", "20"))
+    BACKLOG_SCHEDULER_MAX_WAIT = float(os.getenv("BACKLOG_SCHEDULER_MAX_WAIT", "10"))
+
+    # 更新情報検索でBacklog APIを呼び出すページ数の上限(1リクエストあたり)と1ページの件数(最大100)
+    ACTIVITY_SEARCH_MAX_PAGES = int(os.getenv("ACTIVITY_SEARCH_MAX_PAGES", "5"))
+    ACTIVITY_SEARCH_PAGE_SIZE = min(int(os.getenv("ACTIVITY_SEARCH_PAGE_SIZE", "100")), 100)
+
+    # 更新情報の同期処理(有効の場合は、更新情報検索を同期済みの更新情報テーブルから行う)と同期間隔・失敗時の待機時間の上限(秒)
+    ACTIVITY_SYNC_ENABLED = os.getenv("ACTIVITY_SYNC_ENABLED", "false").lower() == "true"
+    ACTIVITY_SYNC_INTERVAL = float(os.getenv("ACTIVITY_SYNC_INTERVAL", "30"))
+    ACTIVITY_SYNC_MAX_BACKOFF = float(os.getenv("ACTIVITY_SYNC_MAX_BACKOFF", "600"))
+
+    # 新しい更新情報の配信でBacklog APIをポーリングする間隔(秒)
+    ACTIVITY_PUSH_INTERVAL = float(os.getenv("ACTIVITY_PUSH_INTERVAL", "15"))
+
+    # ユーザが参照できるプロジェクト(Backlog API /projects)をキャッシュする秒数
+    # 同期済みの更新情報の検索・新しい更新情報の配信で、参照できないプロジェクトの更新情報を除外するために使用する
+    BACKLOG_PROJECTS_CACHE_TTL = float(os.getenv("BACKLOG_PROJECTS_CACHE_TTL", "300"))
+
+    # Backlog APIのサーキットブレーカー(開くまでの連続失敗回数・回復確認までの秒数)と、障害時に古いレスポンスを返す期間(秒)
+    BACKLOG_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("BACKLOG_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    BACKLOG_CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("BACKLOG_CIRCUIT_RECOVERY_TIMEOUT", "30"))
+    STALE_RESPONSE_MAX_AGE = float(os.getenv("STALE_RESPONSE_MAX_AGE", "86400"))
+
+    # 更新情報検索のキーワードの正規化方法(空: 正規化しない, casefold: 大文字・小文字を区別しない, nfkc: NFKC正規化+casefold)と
+    # 検索対象の項目(カンマ区切りのドット区切りパス 例: content.summary,project.name 空の場合はすべてのテキスト項目)
+    # 同期処理が有効な場合は、同期時にこの設定で検索用テキストを作成する(変更した場合は、同期済みの更新情報を同期し直す)
+    ACTIVITY_SEARCH_NORMALIZE = os.getenv("ACTIVITY_SEARCH_NORMALIZE") or None
+    ACTIVITY_SEARCH_FIELDS = [field.strip() for field in os.getenv("ACTIVITY_SEARCH_FIELDS", "").split(",") if field.strip()]
+
+    # パスワードハッシュ(bcrypt)のコスト(変更した場合は、ログイン時に新しいコストでハッシュし直す)と、
+    # ハッシュ処理用のプロセス数・処理待ちの上限(超えた場合は503を返す)
+    PASSWORD_BCRYPT_ROUNDS = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "16"))
+
+    # 認証済みのトークン・ユーザーをキャッシュする秒数(0の場合はキャッシュしない)と件数の上限
+    # ユーザー情報の更新時は同じプロセスのキャッシュのみ削除するため、他のプロセスでは最大でこの秒数だけ古い情報を使用する
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "1024"))
+
+    # 新しい更新情報の配信(SSE)に接続するためのチケットの有効期限(秒) チケットは1回のみ使用できる
+    SSE_TICKET_TTL = float(os.getenv("SSE_TICKET_TTL", "30"))
+
+    # データベースのコネクションプール(PostgreSQL)
+    # プロセスあたりの最大接続数はDB_POOL_SIZE + DB_MAX_OVERFLOW(ワーカー数を掛けた値がmax_connectionsを超えないように設定する)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # 起動時に接続しておく数(0の場合は接続しない)
+    DB_POOL_PREWARM = int(os.getenv("DB_POOL_PREWARM", os.getenv("DB_POOL_SIZE", "5")))
+    # SQLのタイムアウト(ミリ秒 0の場合はタイムアウトしない)
+    DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", "0"))
@@ -0,0 +1,389 @@
+# keyword_matcher.py
+import re, unicodedata
+from collections import deque
+from typing import Iterable, List, Optional, Union
+
+# キーワードと検索対象テキストの正規化方法
+#   None:       正規化しない(完全な部分一致)
+#   "casefold": 大文字・小文字を区別しない
+#   "nfkc":     NFKC正規化(全角・半角の英数記号を同一視)したうえで、大文字・小文字を区別しない
+NORMALIZE_MODES = (None, "casefold", "nfkc")
+
+# 複数キーワードの一致条件
+MATCH_ALL = "all"   # すべてのキーワードを含む(AND)
+MATCH_ANY = "any"   # いずれかのキーワードを含む(OR)
+MATCH_MODES = (MATCH_ALL, MATCH_ANY)
+
+def _nfkc_casefold(text: str):
+    return unicodedata.normalize("NFKC", text).casefold()
+
+_NORMALIZERS = {
+    None: None,
+    "casefold": str.casefold,
+    "nfkc": _nfkc_casefold,
+}
+
+# 検索対象外の値の型(JSONの数値・真偽値・null)
+_SCALAR_TYPES = (int, float, bool, type(None))
+
+def _as_json_type(item):
+    """
+    str・dict・listのサブクラス(OrderedDictなど)を基底の型に変換する
+
+    型を直接比較する高速な判定で一致しなかった値のみ、isinstanceで判定する。
+
+    :return: 基底の型に変換した値 str・dict・list以外の場合はNone
+    """
+    if isinstance(item, str):
+        return str.__str__(item)
+    if isinstance(item, dict):
+        return dict(item)
+    if isinstance(item, list):
+        return list(item)
+    return None
+
+def _compile_fields(fields: Iterable[str]):
+    """
+    検索対象の項目(ドット区切りのパス)を木構造に変換する
+
+    例: ["content.summary", "project"] → {"content": {"summary": None}, "project": None}
+    Noneはその項目以下のすべてのテキスト項目を検索対象とすることを表す。リストは要素ごとに同じ項目を検索する。
+    """
+    tree = {}
+    for path in fields:
+        node = tree
+        *parents, leaf = path.split(".")
+        for part in parents:
+            child = node.setdefault(part, {})
+            if child is None:
+                # 親の項目がすでに全体を検索対象にしている
+                break
+            node = child
+        else:
+            node[leaf] = None
+    return tree
+
+class KeywordMatcher:
+    """
+    キーワードの部分一致判定(リクエストごとにキーワードから1回作成し、更新情報ごとに使い回す)
+
+    再帰ではなくスタックでデータをたどり、一致したテキスト項目が見つかった時点で判定を終える。
+    """
+
+    def __init__(self, keyword: Optional[str], normalize: Optional[str] = None, fields: Optional[Iterable[str]] = None):
+        """
+        :param keyword: 検索するキーワード(部分一致) Noneの場合はすべてに一致する
+        :param normalize: 正規化方法(NORMALIZE_MODESを参照)
+        :param fields: 検索対象の項目(ドット区切りのパス) 未指定の場合はすべてのテキスト項目
+        :raises ValueError: 正規化方法が不正な場合
+        """
+        self._normalizer = get_normalizer(normalize)
+        self.keyword = keyword
+        if keyword is not None and self._normalizer is not None:
+            self.keyword = self._normalizer(keyword)
+        self._fields = _compile_fields(fields) if fields else None
+
+        if keyword is None:
+            self.match = self._match_any
+        elif self._fields is None:
+            self.match = self._match_all_fields
+        else:
+            self.match = self._match_fields
+
+    def filter(self, activities: Iterable[dict]):
+        """
+        キーワードに一致する更新情報のみを返す
+
+        :param activities: 更新情報(Backlog APIの形式)のリスト
+        :return: 一致した更新情報のリスト(元の順序)
+        """
+        if self.keyword is None:
+            return list(activities)
+        match = self.match
+        return [activity for activity in activities if match(activity)]
+
+    def _match_any(self, data):
+        return True
+
+    def _match_all_fields(self, data):
+        # JSONのデータ(dict・list・str)は型を直接比較し、サブクラスのみisinstanceで判定する
+        keyword = self.keyword
+        normalizer = self._normalizer
+        stack = [data]
+        pop, append, extend = stack.pop, stack.append, stack.extend
+        while stack:
+            item = pop()
+            item_type = type(item)
+            if item_type is str:
+                if keyword in (normalizer(item) if normalizer else item):
+                    return True
+            elif item_type is dict:
+                extend(item.values())
+            elif item_type is list:
+                extend(item)
+            elif item_type not in _SCALAR_TYPES:
+                item = _as_json_type(item)
+                if item is not None:
+                    append(item)
+        return False
+
+    def _match_fields(self, data):
+        keyword = self.keyword
+        normalizer = self._normalizer
+        stack = [(data, self._fields)]
+        pop, append = stack.pop, stack.append
+        while stack:
+            item, node = pop()
+            item_type = type(item)
+            if item_type is list:
+                for value in item:
+                    append((value, node))
+            elif item_type is not str and item_type is not dict:
+                if item_type not in _SCALAR_TYPES:
+                    item = _as_json_type(item)
+                    if item is not None:
+                        append((item, node))
+            elif node is None:
+                # 項目以下のすべてのテキスト項目を検索する
+                if item_type is str:
+                    if keyword in (normalizer(item) if normalizer else item):
+                        return True
+                elif self._match_all_fields(item):
+                    return True
+            elif item_type is dict:
+                for key, child in node.items():
+                    value = item.get(key)
+                    if value is not None:
+                        append((value, child))
+        return False
+
+class AhoCorasick:
+    """
+    Aho–Corasick法による複数キーワードの同時検索
+
+    キーワードの数によらず、テキストを1回走査するだけで含まれるキーワードを判定できる。
+    """
+
+    def __init__(self, patterns: List[str]):
+        """
+        :param patterns: キーワードのリスト(空文字は不可)
+        """
+        self.patterns = patterns
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [0]  # 状態ごとに一致するキーワードのビット集合
+
+        for index, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(0)
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state] |= 1 << index
+
+        # 幅優先で失敗時の遷移先を設定し、遷移先で一致するキーワードも出力に含める
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] |= self._output[self._fail[next_state]]
+        self._complete = (1 << len(patterns)) - 1
+        # 初期状態では、キーワードの先頭文字が現れる位置まで正規表現(C実装)で読み飛ばす
+        first_chars = "".join(re.escape(char) for char in self._goto[0])
+        self._first = re.compile(f"[{first_chars}]") if first_chars else None
+
+    def contains_any(self, text: str):
+        """
+        テキストにいずれかのキーワードが含まれるかを判定する(一致した時点で走査を終える)
+        """
+        return self._scan(text, 0, stop_on_match=True) != 0
+
+    def scan(self, text: str, found: int = 0):
+        """
+        テキストに含まれるキーワードを判定する(すべてのキーワードが見つかった時点で走査を終える)
+
+        :param text: テキスト
+        :param found: 判定済みのキーワードのビット集合
+        :return: テキストに含まれるキーワード(とfound)のビット集合
+        """
+        return self._scan(text, found, stop_on_match=False)
+
+    def _scan(self, text: str, found: int, stop_on_match: bool):
+        if self._first is None:
+            return found
+        goto, fail, output = self._goto, self._fail, self._output
+        complete = self._complete
+        search = self._first.search
+        state = 0
+        position = 0
+        length = len(text)
+        while position < length:
+            if not state:
+                next_match = search(text, position)
+                if next_match is None:
+                    return found
+                position = next_match.start()
+            char = text[position]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+                if stop_on_match or found == complete:
+                    return found
+            position += 1
+        return found
+
+class MultiKeywordMatcher:
+    """
+    複数キーワードの部分一致判定(MATCH_ALL: すべて含む, MATCH_ANY: いずれかを含む)
+
+    検索クエリごとにオートマトンを1回作成し、更新情報のテキスト項目を1回ずつ走査して判定する。
+    """
+
+    def __init__(self, keywords: List[str], match: str = MATCH_ALL, normalize: Optional[str] = None, fields: Optional[Iterable[str]] = None):
+        """
+        :param keywords: 検索するキーワードのリスト(部分一致)
+        :param match: 一致条件(MATCH_MODESを参照)
+        :param normalize: 正規化方法(NORMALIZE_MODESを参照)
+        :param fields: 検索対象の項目(ドット区切りのパス) 未指定の場合はすべてのテキスト項目
+        :raises ValueError: 一致条件・正規化方法が不正な場合
+        """
+        if match not in MATCH_MODES:
+            raise ValueError(f"unknown match mode: {match}")
+        self._normalizer = get_normalizer(normalize)
+        if self._normalizer is not None:
+            keywords = [self._normalizer(keyword) for keyword in keywords]
+        # 空文字のキーワードはテキスト項目があれば一致するため、オートマトンには含めない
+        # (重複したキーワードは除外するため、空文字の有無は除外前に判定する)
+        self._requires_text = any(not keyword for keyword in keywords)
+        self.keywords = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+        self.match_mode = match
+        self._automaton = AhoCorasick(self.keywords)
+        self._all = (1 << len(self.keywords)) - 1
+        self._fields = _compile_fields(fields) if fields else None
+
+    def match(self, data):
+        normalizer = self._normalizer
+        match_any = self.match_mode == MATCH_ANY
+        automaton = self._automaton
+        found = 0
+        has_text = False
+        stack = [(data, self._fields)]
+        pop, append = stack.pop, stack.append
+        while stack:
+            item, node = pop()
+            item_type = type(item)
+            if item_type is str:
+                if node is not None:
+                    # 検索対象の項目の途中
+                    continue
+                has_text = True
+                text = normalizer(item) if normalizer else item
+                if match_any:
+                    if self._requires_text or automaton.contains_any(text):
+                        return True
+                else:
+                    found = automaton.scan(text, found)
+                    if found == self._all:
+                        return True
+            elif item_type is dict:
+                if node is None:
+                    for value in item.values():
+                        append((value, None))
+                else:
+                    for key, child in node.items():
+                        value = item.get(key)
+                        if value is not None:
+                            append((value, child))
+            elif item_type is list:
+                for value in item:
+                    append((value, node))
+            elif item_type not in _SCALAR_TYPES:
+                item = _as_json_type(item)
+                if item is not None:
+                    append((item, node))
+        # すべてのキーワードが空文字の場合は、テキスト項目がなければ一致しない
+        return not match_any and found == self._all and (has_text or not self._requires_text)
+
+    def filter(self, activities: Iterable[dict]):
+        """
+        キーワードに一致する更新情報のみを返す
+
+        :param activities: 更新情報(Backlog APIの形式)のリスト
+        :return: 一致した更新情報のリスト(元の順序)
+        """
+        match = self.match
+        return [activity for activity in activities if match(activity)]
+
+def get_normalizer(normalize: Optional[str]):
+    """
+    正規化方法に対応する正規化関数を取得する
+
+    :param normalize: 正規化方法(NORMALIZE_MODESを参照)
+    :return: 文字列を受け取り正規化した文字列を返す関数 正規化しない場合はNone
+    :raises ValueError: 正規化方法が不正な場合
+    """
+    if normalize not in _NORMALIZERS:
+        raise ValueError(f"unknown normalize mode: {normalize}")
+    return _NORMALIZERS[normalize]
+
+def collect_texts(data, fields: Optional[Iterable[str]] = None):
+    """
+    KeywordMatcherが検索するテキスト項目を、データ内の順序で取得する
+
+    :param data: 更新情報(Backlog APIの形式)
+    :param fields: 検索対象の項目(ドット区切りのパス) 未指定の場合はすべてのテキスト項目
+    :return: テキスト項目のリスト
+    """
+    texts = []
+    stack = [(data, _compile_fields(fields) if fields else None)]
+    while stack:
+        item, node = stack.pop()
+        if isinstance(item, str):
+            if node is None:
+                texts.append(str.__str__(item))
+        elif isinstance(item, dict):
+            if node is None:
+                stack.extend((value, None) for value in reversed(list(item.values())))
+            else:
+                stack.extend((item[key], child) for key, child in reversed(list(node.items())) if item.get(key) is not None)
+        elif isinstance(item, list):
+            stack.extend((value, node) for value in reversed(item))
+    return texts
+
+def normalize_keywords(keyword: Union[str, List[str], None]):
+    """
+    検索キーワード(1つまたはリスト)をリストに変換する
+
+    :return: キーワードのリスト キーワードの指定がない場合はNone
+    """
+    if keyword is None:
+        return None
+    keywords = [keyword] if isinstance(keyword, str) else list(keyword)
+    return keywords or None
+
+def compile_keyword(keyword: Union[str, List[str], None], normalize: Optional[str] = None, fields: Optional[Iterable[str]] = None, match: str = MATCH_ALL):
+    """
+    キーワードの部分一致判定を作成する
+
+    キーワードが1つの場合はKeywordMatcher、複数の場合はMultiKeywordMatcherを作成する。
+
+    :param keyword: 検索するキーワード(1つまたはリスト) Noneの場合はすべてに一致する
+    :param match: 複数キーワードの一致条件(MATCH_MODESを参照)
+    :return: KeywordMatcherまたはMultiKeywordMatcher
+    """
+    keywords = normalize_keywords(keyword)
+    if keywords is not None and len(keywords) > 1:
+        return MultiKeywordMatcher(keywords, match=match, normalize=normalize, fields=fields)
+    return KeywordMatcher(keywords[0] if keywords else None, normalize=normalize, fields=fields)
@@ -1,26 +1,62 @@
 # main.py
-import httpx, secrets
-from fastapi import FastAPI, Depends, HTTPException, status, Response, Query
-from fastapi.responses import RedirectResponse
+import asyncio, httpx, json, secrets
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Query, BackgroundTasks
+from fastapi.responses import RedirectResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from schemas import UserCreate, UserResponse, Activity, ActivityDetail, FavoriteCreate
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db
+import database
+from schemas import UserCreate, UserUpdate, UserResponse, Activity, ActivityDetail, FavoriteCreate, FavoriteBulkCreate, FavoriteBulkDelete
 from typing import List, Optional
 from env_config import Configs
-import crud, utils, auth, models, backlog
+import crud, utils, auth, models, backlog, metrics
+from sync_worker import sync_worker, get_space_key
+from activity_hub import activity_hub
+from activity_types import activity_types
+from password_hasher import password_hasher
+from response_cache import StaleResponseCache
+from keyword_matcher import MATCH_ALL, MATCH_ANY
+from search_query import parse_query
+
+# アプリケーションの起動・終了処理
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 更新種別の表示名を読み込む
+    activity_types.load()
+    # パスワードハッシュ用のプロセスプールを作成
+    password_hasher.start()
+    # データベースのコネクションプールに接続しておく
+    await database.prewarm_pool(Configs.DB_POOL_PREWARM)
+    # Backlog API呼び出し用の共有HTTPクライアントを作成
+    await backlog.startup_http_client()
+    # Backlogトークンのバックグラウンド更新に使用するイベントループを設定
+    backlog.token_manager.start()
+    # 更新情報の同期処理を開始(新しい更新情報の配信は、同期処理の取得結果を使用する)
+    if Configs.ACTIVITY_SYNC_ENABLED:
+        activity_hub.use_external_source()
+        sync_worker.add_listener(activity_hub.publish)
+        sync_worker.start()
+    yield
+    # 更新情報の同期処理・配信を停止
+    await sync_worker.stop()
+    await activity_hub.close()
+    await stale_cache.close()
+    # Backlogトークンのバックグラウンド更新を停止
+    backlog.token_manager.close()
+    # 共有HTTPクライアントをクローズ
+    await backlog.shutdown_http_client()
+    # パスワードハッシュ用のプロセスプールを終了
+    password_hasher.shutdown()
+    # データベースの接続を閉じる
+    await database.engine.dispose()
 
 # FastAPIインスタンス
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
-# データベースセッション
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Backlog APIの障害時に返す、直近の正常なレスポンス
+stale_cache = StaleResponseCache(max_age=Configs.STALE_RESPONSE_MAX_AGE)
 
 # 一時的なコードを保存するためのストレージ（メモリ内）
 temporary_codes = {}
@@ -37,23 +73,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Cache-Status", "Age"],
 )
 
 #  ユーザログイン(トークン取得)
 @app.post("/token", response_model=dict)
-def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(db: AsyncSession = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
     # トークンを作成
-    tokens = auth.user_login(form_data=form_data, db=db)
+    tokens = await auth.user_login(form_data=form_data, db=db)
     return tokens
 
 #  ユーザ登録
 @app.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    # ユーザーを新規登録
-    response = crud.create_user(db=db, user=user)
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    # ユーザーを新規登録(入力チェックの後に、パスワードハッシュ用のプロセスプールでハッシュ化する)
+    await crud.validate_new_user(db, user)
+    hashed_password = await auth.hash_password(user.password)
+    response = await crud.create_user(db=db, user=user, hashed_password=hashed_password)
     return {
         "id": response.id,
         "username": response.user_nm,
+        "timezone": response.timezone,
+    }
+
+#  ログインユーザの設定変更(日時を表示するタイムゾーン)
+@app.patch("/users/me", response_model=UserResponse)
+async def update_current_user(user: UserUpdate, current_user: models.User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
+    response = await crud.update_user_timezone(db, current_user.id, user.timezone)
+    return {
+        "id": response.id,
+        "username": response.user_nm,
+        "timezone": response.timezone,
     }
 
 # Backlog認証画面へのリダイレクト
@@ -78,7 +128,8 @@ async def backlog_oauth_callback(code: str, state: str):
     temp_code = secrets.token_urlsafe(16)
     temporary_codes[temp_code] = {
         "access_token": tokens["access_token"],
-        "refresh_token": tokens["refresh_token"]
+        "refresh_token": tokens["refresh_token"],
+        "expires_in": tokens.get("expires_in"),
     }
 
     # フロントエンドのトークン保存用ページにリダイレクト
@@ -87,7 +138,7 @@ async def backlog_oauth_callback(code: str, state: str):
 
 # アクセストークンとリフレッシュトークンを保存するエンドポイント
 @app.post("/auth/backlog/save_tokens")
-def save_backlog_tokens(temp_code: str = Query(...), current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+async def save_backlog_tokens(temp_code: str = Query(...), current_user: models.User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
     # 一時的なコードからトークンを取得
     tokens = temporary_codes.pop(temp_code, None)
     if not tokens:
@@ -97,43 +148,298 @@ def save_backlog_tokens(temp_code: str = Query(...), current_user: models.User =
         )
 
     # トークンをデータベースに保存
-    crud.update_user_tokens(
+    await crud.update_user_tokens(
             db, 
             current_user.id, 
             tokens["access_token"], 
             tokens["refresh_token"]
         )
+    # メモリ上のトークン(有効期限を含む)も更新する
+    backlog.token_manager.set_tokens(
+            current_user.id, 
+            tokens["access_token"], 
+            tokens["refresh_token"], 
+            tokens["expires_in"]
+        )
 
     return {"message": "トークンを保存しました"}
 
+# ストリーミング形式のレスポンスのメディアタイプ
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
 # 検索エンドポイント
+# keywordは複数指定でき(?keyword=A&keyword=B)、match=all(すべて含む)またはmatch=any(いずれかを含む)で検索する
+# qには検索構文(例: project:FOO type:2 user:tanaka after:2024-09-01 "login bug")を指定できる(search_query.pyを参照)
+# 続きがある場合は、次ページのカーソルをX-Next-Cursorヘッダに設定する
+# Acceptヘッダにapplication/x-ndjsonまたはtext/event-streamが指定された場合は、一致した更新情報を順次返す
 @app.get("/activities/search", response_model=List[Activity])
-async def search_activities(keyword: Optional[str] = None, current_user: models.User = Depends(auth.get_current_user)):
-
-    # Backlog API(最近の更新の取得)を呼び出す
-    params = {}
-    activity_response = await backlog.call_backlog_api(
-        f"/space/activities", 
-        params, 
-        current_user
+async def search_activities(
+        request: Request,
+        response: Response,
+        keyword: Optional[List[str]] = Query(None),
+        match: str = Query(MATCH_ALL, pattern=f"^({MATCH_ALL}|{MATCH_ANY})$"),
+        q: Optional[str] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(20, ge=1, le=100),
+        min_id: Optional[int] = None,
+        db: AsyncSession = Depends(get_db),
+        current_user: models.User = Depends(auth.get_current_user)):
+
+    # カーソルから取得位置を設定する
+    max_id = None
+    if cursor:
+        try:
+            max_id, min_id = _decode_cursor(cursor, min_id)
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, 
+                detail="Invalid cursor"
+            )
+
+    # 検索構文を解析する
+    try:
+        search_query = parse_query(q) if q else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, 
+            detail=f"Invalid query: {e}"
+        )
+
+    # 改行を含むキーワードは、同期済みの更新情報の検索(項目を改行で連結)とBacklog APIの検索で結果が異なるためエラーとする
+    keywords = (keyword or []) + (search_query.keywords if search_query else [])
+    if any(utils.SEARCH_TEXT_SEPARATOR in item for item in keywords):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, 
+            detail="Invalid keyword: line breaks are not allowed"
+        )
+
+    # ストリーミング形式で返すかを判定する
+    accept = request.headers.get("accept", "")
+    stream_media_type = next((media_type for media_type in (NDJSON_MEDIA_TYPE, SSE_MEDIA_TYPE) if media_type in accept), None)
+
+    # Backlog APIの呼び出し中に接続を保持しないよう、認証で開始したトランザクションを終了して接続を返却する
+    await db.commit()
+
+    # 同期処理が有効な場合は、同期済みの更新情報テーブルから検索する
+    if Configs.ACTIVITY_SYNC_ENABLED:
+        # 同期済みの更新情報は同期処理のユーザのトークンで取得しているため、ログインユーザが参照できるプロジェクトのみ返す
+        project_ids = await backlog.get_visible_project_ids(current_user)
+        matched_activities, next_max_id = await crud.search_stored_activities(
+            db, 
+            get_space_key(), 
+            keyword, 
+            limit, 
+            min_id=min_id, 
+            max_id=max_id,
+            match=match,
+            search_query=search_query,
+            project_ids=project_ids,
+            tz_name=current_user.timezone,
+        )
+        # レスポンスの返却中(ストリーミング中)に接続を保持しないよう、トランザクションを終了して接続を返却する
+        await db.commit()
+        matched_activities = _apply_timezone(matched_activities, current_user.timezone)
+        next_cursor = _next_cursor(next_max_id, min_id)
+        if stream_media_type:
+            async def stored_activities():
+                for activity in matched_activities:
+                    yield activity
+            return await _stream_activities(stored_activities(), stream_media_type, lambda: next_cursor)
+
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return matched_activities
+
+    # Backlog API(最近の更新の取得)をページングしながら呼び出し、キーワードに一致する更新情報を取得する
+    # 同時に同じ検索が行われた場合は、Backlog APIの呼び出し結果を共有する
+    search = backlog.ActivitySearch(
+        current_user, 
+        keyword, 
+        limit, 
+        min_id=min_id, 
+        max_id=max_id,
+        match=match,
+        query=search_query,
     )
-    # レスポンスから最近の更新を取得
-    activities = activity_response.json()
-
-    # 画面に表示する情報を設定する
-    matched_activities = []
-    for activity in activities:
-        # キーワードにテキスト項目が部分一致した場合、またはキーワード指定がなかった場合のみ更新情報を取得する
-        if utils.contains_keyword(activity, keyword):
-            # 更新情報を取得する
-            disp_activity = backlog.get_disp_activity(activity)
-            matched_activities.append(disp_activity)
+    if stream_media_type:
+        async def searched_activities():
+            async for activity in search:
+                yield backlog.get_disp_activity(activity, current_user.timezone)
+        return await _stream_activities(
+            searched_activities(), 
+            stream_media_type, 
+            lambda: _next_cursor(search.next_max_id, min_id)
+        )
+
+    # Backlog APIの障害時は、直近の正常なレスポンスを返す
+    cache_key = ("search", current_user.id, tuple(keyword or ()), match, q, limit, min_id, max_id)
+
+    try:
+        matched_activities, next_cursor = await _collect_activities(search, min_id, current_user.timezone)
+    except HTTPException as e:
+        stale = _get_stale_response(response, cache_key, e, lambda: _collect_activities(
+            backlog.ActivitySearch(current_user, keyword, limit, min_id=min_id, max_id=max_id, match=match, query=search_query), min_id, current_user.timezone
+        ))
+        if stale is None:
+            raise
+        matched_activities, next_cursor = stale
+    else:
+        stale_cache.set(cache_key, (matched_activities, next_cursor))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return matched_activities
 
-# ログインユーザに紐づくお気に入りリストを取得し、Backlog APIから更新情報を取得するエンドポイント
+async def _collect_activities(search: backlog.ActivitySearch, min_id: Optional[int], tz_name: Optional[str] = None):
+    """検索結果を全て取得し、(UI表示形式の更新情報リスト, 次ページのカーソル)を返す"""
+    # 画面に表示する情報を設定する(日時はまとめて変換する)
+    activities = [activity async for activity in search]
+    matched_activities = backlog.get_disp_activities(activities, tz_name)
+    return matched_activities, _next_cursor(search.next_max_id, min_id)
+
+def _apply_timezone(activities: List[dict], tz_name: Optional[str]):
+    """更新情報テーブルの更新情報(日時は環境変数のタイムゾーン)の日時を、ユーザのタイムゾーンに変換する"""
+    if not tz_name or tz_name == utils.get_default_timezone_name():
+        return activities
+    return [{**activity, "created": utils.change_tz(activity["created"], tz_name)} for activity in activities]
+
+def _get_stale_response(response: Response, cache_key, error: Optional[HTTPException], revalidate):
+    """
+    Backlog APIの障害時に、直近の正常なレスポンスを取得する
+
+    返す場合はX-Cache-Status: stale・Ageヘッダを設定し、Backlog APIの回復後にバックグラウンドで再取得する。
+
+    :param response: Response
+    :param cache_key: キャッシュのキー
+    :param error: Backlog API呼び出しのエラー(5xx以外の場合は古いレスポンスを返さない)
+    :param revalidate: 再取得する処理(引数なしのコルーチン関数)
+    :return: 直近の正常なレスポンス 返せない場合はNone
+    """
+    if error is not None and error.status_code < 500:
+        return None
+    cached = stale_cache.get(cache_key)
+    if cached is None:
+        return None
+
+    value, age = cached
+    response.headers["X-Cache-Status"] = "stale"
+    response.headers["Age"] = str(int(age))
+    response.headers["Warning"] = '110 - "Response is Stale"'
+    stale_cache.revalidate(cache_key, revalidate, delay=max(backlog.get_circuit_breaker().retry_after(), 1))
+    return value
+
+def _next_cursor(next_max_id: Optional[int], min_id: Optional[int]):
+    """次ページのカーソルを作成する(続きがない場合はNone)"""
+    if next_max_id is None:
+        return None
+    position = {"maxId": next_max_id}
+    if min_id is not None:
+        position["minId"] = min_id
+    return utils.encode_cursor(position)
+
+def _decode_cursor(cursor: str, min_id: Optional[int]):
+    """
+    カーソルから取得位置(maxId・minId)を取得する
+
+    maxIdは整数、minIdは整数またはNoneのみ受け付ける(カーソルにminIdがない場合は引数のmin_idを使用する)。
+
+    :raises ValueError: カーソルが不正な場合
+    """
+    position = utils.decode_cursor(cursor)
+    max_id = position["maxId"]
+    min_id = position.get("minId", min_id)
+    if not _is_int(max_id) or not (min_id is None or _is_int(min_id)):
+        raise ValueError("maxId and minId must be integers")
+    return max_id, min_id
+
+def _is_int(value):
+    """bool以外の整数かを判定する"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+async def _stream_activities(activities, media_type: str, get_next_cursor):
+    """
+    更新情報をストリーミング形式(NDJSON / SSE)で返すレスポンスを作成する
+
+    NDJSONの場合は1行に1件の更新情報を出力し、続きがある場合は最後の行に{"next_cursor": ...}を出力する。
+    SSEの場合はactivityイベントで1件ずつ出力し、最後にendイベントで{"next_cursor": ...}を出力する。
+    最初の1件の取得に失敗した場合は、通常のエラーレスポンスを返す。
+
+    :param activities: UI表示形式の更新情報を返す非同期イテレータ
+    :param media_type: NDJSON_MEDIA_TYPE / SSE_MEDIA_TYPE
+    :param get_next_cursor: 全件出力後に次ページのカーソルを返す関数
+    :return: StreamingResponse
+    """
+    iterator = activities.__aiter__()
+    try:
+        first = await iterator.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    def encode(event: str, data: dict):
+        payload = json.dumps(data, ensure_ascii=False)
+        if media_type == SSE_MEDIA_TYPE:
+            return f"event: {event}\ndata: {payload}\n\n"
+        return payload + "\n"
+
+    async def body():
+        if first is not None:
+            yield encode("activity", first)
+            try:
+                async for activity in iterator:
+                    yield encode("activity", activity)
+            except HTTPException as e:
+                yield encode("error", {"status_code": e.status_code, "detail": e.detail})
+                return
+
+        next_cursor = get_next_cursor()
+        if next_cursor or media_type == SSE_MEDIA_TYPE:
+            yield encode("end", {"next_cursor": next_cursor})
+
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+# SSE購読用の短期チケット発行
+@app.post("/activities/subscribe/ticket")
+async def create_subscribe_ticket(current_user: UserResponse = Depends(auth.get_current_user)):
+    return {"ticket": auth.create_sse_ticket(current_user.id), "expires_in": Configs.SSE_TICKET_TTL}
+
+# 新しい更新情報の配信エンドポイント(Server-Sent Events)
+# キーワードに一致する新しい更新情報のみ、activityイベントで配信する
+@app.get("/activities/subscribe")
+async def subscribe_activities(
+        request: Request,
+        keyword: Optional[List[str]] = Query(None),
+        match: str = Query(MATCH_ALL, pattern=f"^({MATCH_ALL}|{MATCH_ANY})$"),
+        current_user: models.User = Depends(auth.get_current_user_from_header_or_ticket)):
+    # 他のユーザのトークンで取得した更新情報を配信するため、参照できるプロジェクトの更新情報のみ配信する
+    project_ids = await backlog.get_visible_project_ids(current_user)
+
+    async def events():
+        subscription = activity_hub.subscribe(get_space_key(), keyword, match=match, project_ids=project_ids)
+        try:
+            while not await request.is_disconnected():
+                try:
+                    activity = await asyncio.wait_for(subscription.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # 参照できるプロジェクトの変更を反映する(取得に失敗した場合はそれまでのプロジェクトで配信を続ける)
+                    try:
+                        subscription.project_ids = await backlog.get_visible_project_ids(current_user)
+                    except HTTPException:
+                        pass
+                    # 接続維持のためのコメント行
+                    yield ": keep-alive\n\n"
+                    continue
+                payload = json.dumps(backlog.get_disp_activity(activity, current_user.timezone), ensure_ascii=False)
+                yield f"event: activity\ndata: {payload}\n\n"
+        finally:
+            activity_hub.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers={"Cache-Control": "no-cache"})
+
+# ログインユーザに紐づくお気に入りリストを取得し、更新情報テーブル(未保存の場合はBacklog API)から更新情報を取得するエンドポイント
 @app.get("/favorites-search", response_model=List[ActivityDetail])
-async def get_favorites(db: Session = Depends(get_db), current_user: UserResponse = Depends(auth.get_current_user)):
-    favorites = crud.get_favorites_all(db, current_user.id)
+async def get_favorites(response: Response, refresh: bool = False, db: AsyncSession = Depends(get_db), current_user: UserResponse = Depends(auth.get_current_user)):
+    favorites = await crud.get_favorites_all(db, current_user.id)
     # お気に入りテーブルに一致するデータが見つからない場合はエラーを返す
     if not favorites:
         raise HTTPException(
@@ -141,40 +447,107 @@ async def get_favorites(db: Session = Depends(get_db), current_user: UserRespons
             detail="No favorites found for the current user"
         )
 
-    # お気に入りテーブルの更新情報IDから更新情報を取得
+    # 更新情報テーブルから更新情報を取得(refresh指定時はすべてBacklog APIから再取得する)
+    activity_ids = [favorite.activity_id for favorite in favorites]
+    snapshots = {} if refresh else await crud.get_activity_snapshots(db, activity_ids)
+
+    # 更新情報テーブルに存在しない更新情報のみ、Backlog APIから並行して取得して保存する
+    missing_ids = [
+        activity_id for activity_id in dict.fromkeys(activity_ids)
+        if not (activity_id.isdigit() and int(activity_id) in snapshots)
+    ]
+    cache_key = ("favorites", current_user.id)
+    fetch_failed = False
+    if missing_ids:
+        # Backlog APIの呼び出し中に接続を保持しないよう、トランザクションを終了して接続を返却する
+        await db.commit()
+        activities = await backlog.fetch_activities(missing_ids, current_user)
+        # 整形できない更新情報も取得失敗として扱う
+        fetched = backlog.get_fetched_disp_activities(activities)
+        await crud.save_activity_snapshots(db, fetched)
+        snapshots.update({activity["id"]: activity for activity in fetched})
+        fetch_failed = len(fetched) < len(activities)
+
+    # Backlog APIの障害により取得できなかった場合は、直近の正常なレスポンスを返す
+    # (回復後に更新情報テーブルへ保存し、次回以降はBacklog APIを呼び出さずに返す)
+    if fetch_failed and not backlog.get_circuit_breaker().is_available():
+        async def revalidate():
+            if await backlog.cache_activity_snapshots(missing_ids, current_user):
+                raise RuntimeError("some activities could not be fetched")
+        stale = _get_stale_response(response, cache_key, None, revalidate)
+        if stale is not None:
+            return stale
+
+    # お気に入りの登録順に更新情報を設定する
     favorite_activities = []
     for favorite in favorites:
-        params = {}
-        response = await backlog.call_backlog_api(
-            f"/activities/{favorite.activity_id}",
-            params, 
-            current_user
-        )
-        activity = response.json()
+        snapshot = snapshots.get(int(favorite.activity_id)) if favorite.activity_id.isdigit() else None
+        if snapshot is None:
+            # 取得に失敗した更新情報は、お気に入り登録時のタイトルのみ設定して失敗を通知する
+            favorite_activities.append({
+                "id": int(favorite.activity_id) if favorite.activity_id.isdigit() else None,
+                "project_name": None,
+                "type": None,
+                "type_name": None,
+                "content_summary": favorite.activity_title,
+                "created_user_name": None,
+                "created": None,
+                "favorite_id": favorite.id,
+                "fetch_failed": True,
+            })
+            continue
+
+        favorite_activities.append({**snapshot, "favorite_id": favorite.id})
 
-        # 更新情報を取得する
-        disp_activity = backlog.get_disp_activity(activity)
-        disp_activity.update(favorite_id=favorite.id)
-        favorite_activities.append(disp_activity)
+    # 更新情報テーブルの日時は環境変数のタイムゾーンのため、ユーザのタイムゾーンに変換する
+    favorite_activities = _apply_timezone(favorite_activities, current_user.timezone)
+    if not fetch_failed:
+        stale_cache.set(cache_key, favorite_activities)
     return favorite_activities
 
 # お気に入り登録エンドポイント
 @app.post("/favorites", response_model=dict)
-def regist_favorite(favorite: FavoriteCreate, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+async def regist_favorite(favorite: FavoriteCreate, background_tasks: BackgroundTasks, current_user: models.User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
     # お気に入りテーブルへ登録
-    favorite_id = crud.add_favorite(
+    favorite_id = await crud.add_favorite(
         db, 
         current_user.id, 
         favorite.activity_id, 
         favorite.activity_title
     )
+    # 更新情報をBacklog APIから取得して更新情報テーブルへ保存(レスポンス返却後に実行)
+    background_tasks.add_task(backlog.cache_activity_snapshots, [favorite.activity_id], current_user)
     return {"message": "お気に入りを登録しました", "favorite_id": favorite_id}
 
+# お気に入り一括登録エンドポイント
+@app.post("/favorites/bulk", response_model=dict)
+async def regist_favorites(favorites: FavoriteBulkCreate, background_tasks: BackgroundTasks, current_user: models.User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
+    # お気に入りテーブルへ一括登録(指定された順序のお気に入りIDを返す)
+    favorite_ids = await crud.add_favorites(db, current_user.id, favorites.favorites)
+    # 更新情報をBacklog APIから取得して更新情報テーブルへ保存(レスポンス返却後に実行)
+    background_tasks.add_task(
+        backlog.cache_activity_snapshots, [favorite.activity_id for favorite in favorites.favorites], current_user
+    )
+    return {"message": "お気に入りを登録しました", "favorite_ids": favorite_ids}
+
+# お気に入り一括削除エンドポイント
+# /favorites/{favorite_id}より先に定義する(bulkがfavorite_idとして解釈されないようにする)
+@app.delete("/favorites/bulk", response_model=dict)
+async def delete_favorites(favorites: FavoriteBulkDelete, current_user: models.User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
+    # お気に入りテーブルから一括削除(削除できたお気に入りIDのみ返す)
+    favorite_ids = await crud.delete_favorites(db, favorites.favorite_ids, current_user.id)
+    return {"message": "お気に入りを削除しました", "favorite_ids": favorite_ids}
+
 # お気に入り削除エンドポイント
 @app.delete("/favorites/{favorite_id}", response_model=dict)
-def delete_favorite(favorite_id: int, current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(get_db)):
+async def delete_favorite(favorite_id: int, current_user: models.User = Depends(auth.get_current_user), db: AsyncSession = Depends(get_db)):
 
     # お気に入りテーブルから削除
-    crud.delete_favorite(db, favorite_id, current_user.id)
+    await crud.delete_favorite(db, favorite_id, current_user.id)
 
     return {"message": "お気に入りを削除しました"}
+
+# メトリクス取得エンドポイント(ログインユーザーのみ)
+@app.get("/metrics", response_model=dict)
+def get_metrics(current_user: models.User = Depends(auth.get_current_user)):
+    return metrics.snapshot()
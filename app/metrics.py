@@ -0,0 +1,87 @@
+# metrics.py
+import threading
+from collections import defaultdict
+
+# プロセス内のメトリクス(カウンタ・処理時間・ゲージ)
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_timings = {}
+_gauges = {}
+_gauge_callbacks = {}
+
+def increment(name: str, value: int = 1):
+    """
+    カウンタを加算する
+
+    :param name: メトリクス名
+    :param value: 加算する値
+    """
+    with _lock:
+        _counters[name] += value
+
+def observe(name: str, seconds: float):
+    """
+    処理時間を記録する(件数・合計・最大を保持)
+
+    :param name: メトリクス名
+    :param seconds: 処理時間(秒)
+    """
+    with _lock:
+        timing = _timings.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        timing["count"] += 1
+        timing["total"] += seconds
+        timing["max"] = max(timing["max"], seconds)
+
+def set_gauge(name: str, value):
+    """
+    ゲージ(現在値)を設定する
+
+    :param name: メトリクス名
+    :param value: 現在値
+    """
+    with _lock:
+        _gauges[name] = value
+
+def register_gauge(name: str, callback):
+    """
+    取得時に現在値を計算するゲージを登録する(コネクションプールの使用状況など)
+
+    :param name: メトリクス名
+    :param callback: 現在値を返す関数(引数なし)
+    """
+    with _lock:
+        _gauge_callbacks[name] = callback
+
+def snapshot():
+    """
+    現在のメトリクスを取得する
+
+    :return: カウンタ・処理時間・ゲージの辞書
+    """
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "timings": {
+                name: {**timing, "avg": timing["total"] / timing["count"]}
+                for name, timing in _timings.items()
+            },
+            "gauges": {**_gauges, **_evaluate_gauges()},
+        }
+
+def _evaluate_gauges():
+    """登録されたゲージの現在値を計算する(Noneを返したゲージは含めない)"""
+    values = {}
+    for name, callback in _gauge_callbacks.items():
+        value = callback()
+        if value is not None:
+            values[name] = value
+    return values
+
+def reset():
+    """
+    メトリクスを初期化する(テスト用)
+    """
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+        _gauges.clear()
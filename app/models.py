@@ -1,5 +1,6 @@
 # models.py
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, ForeignKey, JSON, Index, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from settings import Base
@@ -13,6 +14,7 @@ class User(Base):
     pw_hash = Column(String(255), nullable=False)
     backlog_access_token = Column(String(255), nullable=True)
     backlog_refresh_token = Column(String(255), nullable=True)
+    timezone = Column(String(64), nullable=True)  # 日時を表示するタイムゾーン(未設定の場合は環境変数TZ)
     deleted_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -31,4 +33,46 @@ class Favorite(Base):
 
     user = relationship('User', back_populates='favorites')
 
+    __table_args__ = (
+        # 同じ更新情報は1ユーザにつき1件のみ登録できる(登録済みの場合はadd_favoriteで既存のIDを返す)
+        Index('ix_m_favorites_user_id_activity_id', 'user_id', 'activity_id', unique=True),
+        Index('ix_m_favorites_user_id_id', 'user_id', 'id'),
+    )
+
 User.favorites = relationship('Favorite', order_by=Favorite.id, back_populates='user')
+
+# 更新情報テーブル(Backlogの更新情報をUI表示形式で保持するスナップショット)
+# Backlogの更新情報は作成後に変更されないため、一度取得したものを再利用する
+# 同期処理で取得した更新情報は、スペースとBacklog APIのレスポンス(raw)も保持する
+class StoredActivity(Base):
+    __tablename__ = 'm_activities'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=False)  # BacklogのActivity ID
+    space_key = Column(String(255), nullable=True, index=True)
+    raw = Column(JSON().with_variant(JSONB(), 'postgresql'), nullable=True)
+    search_text = Column(Text, nullable=True)   # rawのテキスト項目を連結した検索用テキスト(pg_trgmのGINインデックスで検索)
+    project_name = Column(String(255), nullable=False)
+    type = Column(String(10), nullable=False)
+    type_name = Column(String(100), nullable=False)
+    content_summary = Column(Text, nullable=False)
+    created_user_name = Column(String(255), nullable=False)
+    created = Column(String(19), nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        Index('ix_m_activities_space_key_id', 'space_key', 'id'),
+        Index(
+            'ix_m_activities_search_text_trgm', 'search_text',
+            postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'},
+        ),
+    )
+
+# 同期状態テーブル(スペースごとに同期済みの最新の更新情報IDを保持)
+class SyncState(Base):
+    __tablename__ = 'm_sync_state'
+
+    space_key = Column(String(255), primary_key=True)
+    last_activity_id = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
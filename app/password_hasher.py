@@ -0,0 +1,123 @@
+# password_hasher.py
+import asyncio, logging, math, multiprocessing, os, time
+from concurrent.futures import ProcessPoolExecutor
+from utils import get_password_hash, verify_and_update_password, pwd_context
+from env_config import Configs
+import metrics
+
+logger = logging.getLogger(__name__)
+
+class PasswordHasherBusy(Exception):
+    """
+    パスワードのハッシュ処理が混雑している(処理待ちが上限に達した)
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__("password hasher is busy")
+        self.retry_after = retry_after
+
+def _warm_up():
+    """ワーカープロセスでbcryptのバックエンドを読み込んでおく(起動直後のログインで読み込みを待たないようにする)"""
+    pwd_context.handler("bcrypt").get_backend()
+    return os.getpid()
+
+def _get_mp_context():
+    """
+    ワーカープロセスの起動方法
+
+    forkはイベントループ・接続プール・スレッドを持つプロセスを複製してしまうため、forkserver(使用できない場合はspawn)を使用する。
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+class PasswordHasher:
+    """
+    パスワードのハッシュ処理(bcrypt)を専用のプロセスプールで実行する
+
+    bcryptはCPUを占有するため、リクエスト処理のスレッドプール(他の同期エンドポイントと共有)では実行しない。
+    実行中・処理待ちの件数がmax_workers + max_queueに達した場合は、待たせずにPasswordHasherBusyを送出する。
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        """
+        :param max_workers: プロセス数
+        :param max_queue: 処理待ちの上限(実行中を除く)
+        """
+        self.max_workers = max(max_workers, 1)
+        self.max_queue = max(max_queue, 0)
+        self._executor = None
+        self._inflight = 0
+        self._avg_seconds = None    # ハッシュ処理時間の移動平均(Retry-Afterの見積もりに使用)
+
+    def start(self):
+        """
+        プロセスプールを作成する(アプリケーションの起動時に呼び出す)
+
+        ワーカープロセスは初回の処理で起動されるため、プロセス数分の準備処理を投入して起動しておく(完了は待たない)。
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=_get_mp_context())
+            for _ in range(self.max_workers):
+                self._executor.submit(_warm_up).add_done_callback(self._log_warm_up_error)
+
+    @staticmethod
+    def _log_warm_up_error(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning("パスワードハッシュ用のプロセスの起動に失敗しました: %r", future.exception())
+
+    def shutdown(self):
+        """プロセスプールを終了する(アプリケーションの終了時に呼び出す)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def retry_after(self):
+        """
+        処理待ちが解消するまでのおおよその秒数
+
+        :return: 秒数(1以上)
+        """
+        avg_seconds = self._avg_seconds or 0.25
+        return max(math.ceil(avg_seconds * self._inflight / self.max_workers), 1)
+
+    async def _run(self, name: str, func, *args):
+        if self._inflight >= self.max_workers + self.max_queue:
+            metrics.increment("password.rejected")
+            raise PasswordHasherBusy(self.retry_after())
+
+        self.start()
+        self._inflight += 1
+        metrics.set_gauge("password.inflight", self._inflight)
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._inflight -= 1
+            metrics.set_gauge("password.inflight", self._inflight)
+            metrics.observe(f"password.{name}", elapsed)
+            self._avg_seconds = elapsed if self._avg_seconds is None else self._avg_seconds * 0.8 + elapsed * 0.2
+
+    async def hash(self, password: str):
+        """
+        パスワードをハッシュ化する
+
+        :param password: パスワード
+        :return: ハッシュ化されたパスワード
+        :raises PasswordHasherBusy: 処理待ちが上限に達した場合
+        """
+        return await self._run("hash", get_password_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str):
+        """
+        パスワードを検証し、ハッシュのコストが現在の設定と異なる場合は新しいハッシュを返す
+
+        :param password: 検証するパスワード
+        :param hashed_password: ハッシュ化されたパスワード
+        :return: (検証結果, 新しいハッシュ 再ハッシュが不要な場合はNone)
+        :raises PasswordHasherBusy: 処理待ちが上限に達した場合
+        """
+        return await self._run("verify", verify_and_update_password, password, hashed_password)
+
+# アプリケーション全体で共有するインスタンス
+password_hasher = PasswordHasher(Configs.PASSWORD_HASH_WORKERS, Configs.PASSWORD_HASH_MAX_QUEUE)
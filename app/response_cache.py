@@ -0,0 +1,89 @@
+# response_cache.py
+import asyncio, logging, time
+from collections import OrderedDict
+import metrics
+
+logger = logging.getLogger(__name__)
+
+class StaleResponseCache:
+    """
+    直近の正常なレスポンスを保持し、接続先の障害時に古いレスポンスを返すためのキャッシュ(プロセス内・LRU)
+
+    古いレスポンスを返した場合は、接続先の回復後にバックグラウンドで再取得(revalidate)する。
+    """
+
+    def __init__(self, max_entries: int = 1000, max_age: float = 86400):
+        """
+        :param max_entries: 保持するレスポンスの件数の上限
+        :param max_age: 古いレスポンスとして返すことを許可する秒数
+        """
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._revalidating = {}
+
+    def set(self, key, value):
+        """
+        正常なレスポンスを保持する
+
+        :param key: キー(ユーザ・エンドポイント・パラメータ)
+        :param value: レスポンス
+        """
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """
+        保持しているレスポンスを取得
+
+        :param key: キー
+        :return: (レスポンス, 経過秒数) 保持していない場合はNone
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        age = time.monotonic() - stored_at
+        if age > self.max_age:
+            del self._entries[key]
+            return None
+        metrics.increment("stale_cache.served")
+        return value, age
+
+    def revalidate(self, key, fetch, delay: float, attempts: int = 5):
+        """
+        バックグラウンドでレスポンスを再取得する(同じキーの再取得が実行中の場合は何もしない)
+
+        :param key: キー
+        :param fetch: レスポンスを取得する処理(引数なしのコルーチン関数) Noneを返した場合は保持しているレスポンスを変更しない
+        :param delay: 最初の再取得までの秒数(接続先の回復を待つ)
+        :param attempts: 再取得の試行回数
+        """
+        if key in self._revalidating:
+            return
+        self._revalidating[key] = asyncio.ensure_future(self._revalidate(key, fetch, delay, attempts))
+
+    async def _revalidate(self, key, fetch, delay: float, attempts: int):
+        try:
+            for attempt in range(attempts):
+                await asyncio.sleep(delay * (2 ** attempt))
+                try:
+                    value = await fetch()
+                    if value is not None:
+                        self.set(key, value)
+                    metrics.increment("stale_cache.revalidated")
+                    return
+                except Exception as e:
+                    logger.info("レスポンスの再取得に失敗しました(%s回目): %r", attempt + 1, e)
+        finally:
+            self._revalidating.pop(key, None)
+
+    async def close(self):
+        """
+        実行中の再取得を全て停止する(FastAPIのlifespan終了時に呼び出す)
+        """
+        for task in self._revalidating.values():
+            task.cancel()
+        self._revalidating.clear()
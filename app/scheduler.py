@@ -0,0 +1,238 @@
+# scheduler.py
+import asyncio, heapq, itertools, time
+import metrics
+
+# 優先度(値が小さいほど優先)
+PRIORITY_INTERACTIVE = 0    # ユーザ操作によるリクエスト
+PRIORITY_BACKGROUND = 1     # バックグラウンド処理(同期・事前取得など)
+
+class QuotaExhausted(Exception):
+    """
+    レート制限の残数がなく、待機時間が上限を超える場合の例外
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limit exhausted, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class _Quota:
+    """レート制限の状態(X-RateLimit-*ヘッダから更新)"""
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None    # 残数がリセットされる時刻(time.time基準)
+        self.paused_until = 0.0 # 429を受けた場合の待機終了時刻(time.time基準)
+
+class BacklogScheduler:
+    """
+    Backlog API呼び出しのスケジューラ
+
+    - 同時実行数は全体とユーザ単位で制限し、空きが出た場合は優先度の高いリクエストから実行する
+    - X-RateLimit-*ヘッダから残数を記録し、残数が少ない場合はバックグラウンドのリクエストを待機させる
+    - 429を受けた場合はリセットまで待機し、同時実行数を半減させる(AIMD)
+    - レイテンシが基準値より大きく悪化した場合も同時実行数を減らし、安定している場合は徐々に戻す
+    """
+
+    def __init__(self, max_concurrency: int = 16, min_concurrency: int = 1, user_concurrency: int = 4,
+                 background_reserve: int = 20, max_wait: float = 30.0, latency_factor: float = 2.0):
+        """
+        :param max_concurrency: 全体の同時実行数の上限
+        :param min_concurrency: 同時実行数を減らす場合の下限
+        :param user_concurrency: ユーザ単位の同時実行数の上限
+        :param background_reserve: 残数がこの値以下の場合、バックグラウンドのリクエストは実行しない
+        :param max_wait: レート制限による待機時間の上限(秒) 超える場合はQuotaExhausted
+        :param latency_factor: レイテンシが基準値の何倍を超えた場合に同時実行数を減らすか
+        """
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.user_concurrency = user_concurrency
+        self.background_reserve = background_reserve
+        self.max_wait = max_wait
+        self.latency_factor = latency_factor
+
+        self.concurrency = float(max_concurrency)
+        self._running = 0
+        self._user_running = {}
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._quotas = {}
+        self._latency_baseline = None
+        self._latency_ewma = None
+
+    def _quota(self, scope):
+        quota = self._quotas.get(scope)
+        if quota is None:
+            quota = self._quotas[scope] = _Quota()
+        return quota
+
+    def _quota_delay(self, scope, priority: int):
+        """レート制限により実行を待機すべき秒数を取得"""
+        quota = self._quotas.get(scope)
+        if quota is None:
+            return 0.0
+        now = time.time()
+        if quota.paused_until > now:
+            return quota.paused_until - now
+        if quota.remaining is None or quota.reset_at is None or quota.reset_at <= now:
+            return 0.0
+        reserve = self.background_reserve if priority == PRIORITY_BACKGROUND else 0
+        if quota.remaining <= reserve:
+            return quota.reset_at - now
+        return 0.0
+
+    def _can_run(self, user_key) -> bool:
+        return (
+            self._running < int(self.concurrency)
+            and self._user_running.get(user_key, 0) < self.user_concurrency
+        )
+
+    async def _acquire(self, user_key, priority: int):
+        """実行枠を取得する(空きがない場合は優先度順に待機)"""
+        if not self._waiters and self._can_run(user_key):
+            self._start(user_key)
+            return
+
+        loop = asyncio.get_running_loop()
+        entry = [priority, next(self._sequence), user_key, loop.create_future()]
+        heapq.heappush(self._waiters, entry)
+        self._wake()
+        metrics.increment(f"backlog.scheduler.queued.{'interactive' if priority == PRIORITY_INTERACTIVE else 'background'}")
+        started = time.perf_counter()
+        try:
+            await entry[3]
+        except asyncio.CancelledError:
+            if entry[3].done() and not entry[3].cancelled():
+                # 実行枠を割り当て済みの場合は返却する
+                self._release(user_key)
+            else:
+                entry[3].cancel()
+            raise
+        finally:
+            metrics.observe("backlog.scheduler.queue_wait", time.perf_counter() - started)
+
+    def _start(self, user_key):
+        self._running += 1
+        self._user_running[user_key] = self._user_running.get(user_key, 0) + 1
+
+    def _release(self, user_key):
+        self._running -= 1
+        count = self._user_running.get(user_key, 1) - 1
+        if count:
+            self._user_running[user_key] = count
+        else:
+            self._user_running.pop(user_key, None)
+        self._wake()
+
+    def _wake(self):
+        """実行可能な待機中リクエストを優先度順に起こす"""
+        skipped = []
+        while self._waiters and self._running < int(self.concurrency):
+            entry = heapq.heappop(self._waiters)
+            future = entry[3]
+            if future.done():
+                continue
+            if self._user_running.get(entry[2], 0) >= self.user_concurrency:
+                skipped.append(entry)
+                continue
+            self._start(entry[2])
+            future.set_result(None)
+        for entry in skipped:
+            heapq.heappush(self._waiters, entry)
+
+    async def run(self, func, user_key=None, scope=None, priority: int = PRIORITY_INTERACTIVE):
+        """
+        スケジューラ経由で処理を実行する
+
+        :param func: Backlog APIを呼び出す処理(引数なしのコルーチン関数) httpx.Responseを返すこと
+        :param user_key: ユーザ単位の同時実行数を制限するキー
+        :param scope: レート制限を管理する単位(ユーザ・スペースなど)
+        :param priority: 優先度(PRIORITY_INTERACTIVE / PRIORITY_BACKGROUND)
+        :return: funcの戻り値
+        :raises QuotaExhausted: レート制限による待機時間が上限を超える場合
+        """
+        delay = self._quota_delay(scope, priority)
+        if delay > self.max_wait:
+            metrics.increment("backlog.scheduler.rejected")
+            raise QuotaExhausted(delay)
+        if delay > 0:
+            metrics.increment("backlog.scheduler.delayed")
+            await asyncio.sleep(delay)
+
+        await self._acquire(user_key, priority)
+        started = time.perf_counter()
+        try:
+            response = await func()
+        finally:
+            self._release(user_key)
+        self.record(scope, response, time.perf_counter() - started)
+        return response
+
+    def record(self, scope, response, elapsed: float):
+        """
+        レスポンスからレート制限の残数・レイテンシを記録し、同時実行数を調整する
+
+        :param scope: レート制限を管理する単位
+        :param response: httpx.Response
+        :param elapsed: 処理時間(秒)
+        """
+        headers = getattr(response, "headers", None) or {}
+        quota = self._quota(scope)
+        try:
+            if "X-RateLimit-Limit" in headers:
+                quota.limit = int(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Remaining" in headers:
+                quota.remaining = int(headers["X-RateLimit-Remaining"])
+                metrics.set_gauge("backlog.ratelimit.remaining", quota.remaining)
+            if "X-RateLimit-Reset" in headers:
+                quota.reset_at = float(headers["X-RateLimit-Reset"])
+        except (TypeError, ValueError):
+            pass
+
+        if getattr(response, "status_code", None) == 429:
+            metrics.increment("backlog.scheduler.throttled")
+            now = time.time()
+            retry_after = self.retry_after(response)
+            quota.paused_until = max(quota.paused_until, now + retry_after)
+            self._decrease()
+            return
+
+        metrics.observe("backlog.latency", elapsed)
+        self._latency_ewma = elapsed if self._latency_ewma is None else self._latency_ewma * 0.8 + elapsed * 0.2
+        if self._latency_baseline is None or self._latency_ewma < self._latency_baseline:
+            self._latency_baseline = self._latency_ewma
+        else:
+            # 基準値はゆっくり追従させる(恒常的なレイテンシの変化に対応する)
+            self._latency_baseline = self._latency_baseline * 0.99 + self._latency_ewma * 0.01
+
+        if self._latency_ewma > self._latency_baseline * self.latency_factor:
+            self._decrease()
+        else:
+            self._increase()
+
+    def retry_after(self, response) -> float:
+        """
+        429レスポンスから再試行までの秒数を取得
+
+        :param response: httpx.Response
+        :return: 再試行までの秒数
+        """
+        headers = getattr(response, "headers", None) or {}
+        try:
+            if "Retry-After" in headers:
+                return max(float(headers["Retry-After"]), 0.0)
+            if "X-RateLimit-Reset" in headers:
+                return max(float(headers["X-RateLimit-Reset"]) - time.time(), 0.0)
+        except (TypeError, ValueError):
+            pass
+        return 1.0
+
+    def _decrease(self):
+        self.concurrency = max(self.concurrency / 2, float(self.min_concurrency))
+        metrics.set_gauge("backlog.scheduler.concurrency", int(self.concurrency))
+
+    def _increase(self):
+        if self.concurrency < self.max_concurrency:
+            self.concurrency = min(self.concurrency + 1 / max(self.concurrency, 1), float(self.max_concurrency))
+            metrics.set_gauge("backlog.scheduler.concurrency", int(self.concurrency))
+            self._wake()
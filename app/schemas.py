@@ -1,10 +1,19 @@
 # schemas.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+# お気に入りの一括登録・削除で1回に指定できる件数の上限
+FAVORITES_BULK_MAX_ITEMS = 500
 
 # ユーザー登録モデル
 class UserCreate(BaseModel):
     username: str
     password: str
+    timezone: Optional[str] = None  # 日時を表示するタイムゾーン(例: "Asia/Tokyo")
+
+# ユーザー更新モデル
+class UserUpdate(BaseModel):
+    timezone: Optional[str] = None
 
 # ユーザーモデル
 class UserInDB(BaseModel):
@@ -21,6 +30,7 @@ class Token(BaseModel):
 class UserResponse(BaseModel):
     id: int
     username: str
+    timezone: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -36,15 +46,17 @@ class Activity(BaseModel):
     created: str
 
 #  お気に入り更新情報モデル
+#  Backlogからの取得に失敗した場合はfetch_failed=Trueとし、取得できなかった項目はNoneとする
 class ActivityDetail(BaseModel):
-    id: int
-    project_name: str
-    type: str   # typeは数値ではなく文字列で設定
-    type_name: str
-    content_summary: str
-    created_user_name: str
-    created: str
+    id: Optional[int]
+    project_name: Optional[str]
+    type: Optional[str]   # typeは数値ではなく文字列で設定
+    type_name: Optional[str]
+    content_summary: Optional[str]
+    created_user_name: Optional[str]
+    created: Optional[str]
     favorite_id: int
+    fetch_failed: bool = False
 
     class Config:
         orm_mode = True
@@ -53,3 +65,11 @@ class ActivityDetail(BaseModel):
 class FavoriteCreate(BaseModel):
     activity_id: str
     activity_title: str
+
+# お気に入り一括登録モデル
+class FavoriteBulkCreate(BaseModel):
+    favorites: List[FavoriteCreate] = Field(..., min_length=1, max_length=FAVORITES_BULK_MAX_ITEMS)
+
+# お気に入り一括削除モデル
+class FavoriteBulkDelete(BaseModel):
+    favorite_ids: List[int] = Field(..., min_length=1, max_length=FAVORITES_BULK_MAX_ITEMS)
@@ -0,0 +1,181 @@
+# search_query.py
+# 更新情報検索の検索構文
+#
+#   project:FOO type:2 user:tanaka after:2024-09-01 "login bug"
+#
+# を解析し、Backlog APIで絞り込める条件(プロジェクト・更新種別)はAPIのパラメータに、
+# それ以外の条件はPythonでの絞り込みに振り分ける(QueryPlanを参照)。
+import re, pytz
+from datetime import date, datetime
+from typing import List, Optional
+from utils import get_timezone, get_default_timezone_name
+
+# 検索構文の項目
+#   project: プロジェクトキー(またはプロジェクトID)
+#   type:    更新種別ID(activity_types.jsonを参照)
+#   user:    登録者のユーザID(またはユーザ名)
+#   after:   この日(環境変数TZのタイムゾーン)以降に登録された更新情報
+#   before:  この日(環境変数TZのタイムゾーン)より前に登録された更新情報
+# いずれの項目もカンマ区切りまたは複数回の指定でOR条件になる(after・beforeを除く)
+# 上記以外の「項目:値」は、通常のキーワードとして扱う
+QUERY_FIELDS = ("project", "type", "user", "after", "before")
+
+_TOKEN_PATTERN = re.compile(r'(\w+):"([^"]*)"|(\w+):(\S+)|"([^"]*)"|(\S+)')
+
+# プロジェクトキー(英数字・アンダースコア)またはプロジェクトID(数字)
+# Backlog APIのパス(/projects/{key}/activities)に使用するため、それ以外の文字は受け付けない
+_PROJECT_PATTERN = re.compile(r"[A-Za-z0-9_]+")
+
+class SearchQuery:
+    """
+    検索構文の解析結果
+    """
+
+    def __init__(self):
+        self.keywords: List[str] = []   # キーワード(引用符で囲んだフレーズは1つのキーワード)
+        self.projects: List[str] = []
+        self.types: List[int] = []
+        self.users: List[str] = []
+        self.after: Optional[date] = None
+        self.before: Optional[date] = None
+
+    def __eq__(self, other):
+        return isinstance(other, SearchQuery) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return f"SearchQuery({vars(self)})"
+
+def _parse_date(field: str, value: str):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError as e:
+        raise ValueError(f"invalid {field}: {value}") from e
+
+def parse_query(text: Optional[str]):
+    """
+    検索構文を解析する
+
+    :param text: 検索構文
+    :return: SearchQuery
+    :raises ValueError: 項目の値が不正な場合(type:abc、after:2024-13-01、project:../usersなど)
+    """
+    query = SearchQuery()
+    for match in _TOKEN_PATTERN.finditer(text or ""):
+        field = match.group(1) or match.group(3)
+        value = match.group(2) if match.group(1) else match.group(4)
+        if field is not None and field.lower() in QUERY_FIELDS:
+            field = field.lower()
+            values = [item for item in value.split(",") if item] if field not in ("after", "before") else [value]
+            if not values:
+                raise ValueError(f"empty {field}")
+            if field == "project":
+                invalid = [item for item in values if not _PROJECT_PATTERN.fullmatch(item)]
+                if invalid:
+                    raise ValueError(f"invalid project: {invalid[0]}")
+                query.projects.extend(values)
+            elif field == "type":
+                try:
+                    query.types.extend(int(item) for item in values)
+                except ValueError as e:
+                    raise ValueError(f"invalid type: {value}") from e
+            elif field == "user":
+                query.users.extend(values)
+            elif field == "after":
+                query.after = _parse_date(field, value)
+            else:
+                query.before = _parse_date(field, value)
+        elif match.group(5) is not None:
+            if match.group(5):
+                query.keywords.append(match.group(5))
+        else:
+            query.keywords.append(match.group(0))
+    return query
+
+def start_of_day(day: date, tz_name: Optional[str] = None):
+    """
+    日付の0時の日時を返す
+
+    :param day: 日付
+    :param tz_name: タイムゾーン(ユーザの設定) 未指定の場合は環境変数TZのタイムゾーン
+    :return: タイムゾーン付きの日時
+    """
+    tz = get_timezone(tz_name or get_default_timezone_name())
+    return tz.localize(datetime(day.year, day.month, day.day))
+
+def _to_utc(day: date, tz_name: Optional[str] = None):
+    """日付(ユーザのタイムゾーンの0時)を、Backlog APIの日時形式(UTC)の文字列に変換する"""
+    return start_of_day(day, tz_name).astimezone(pytz.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class QueryPlan:
+    """
+    検索構文の実行計画
+
+    - path・params: Backlog APIに渡す条件
+        プロジェクトが1つの場合はプロジェクトの最近の更新(/projects/{key}/activities)、
+        更新種別はactivityTypeId[]で絞り込む
+    - matches: Backlog APIで絞り込めない条件(複数プロジェクト・登録者・登録日)の判定
+    - is_exhausted: 更新情報は新しい順に取得するため、afterより前の更新情報が現れた時点で以降は一致しない
+    """
+
+    def __init__(self, query: SearchQuery, tz_name: Optional[str] = None):
+        """
+        :param query: SearchQuery
+        :param tz_name: 登録日(after・before)の日付のタイムゾーン(ユーザの設定) 未指定の場合は環境変数TZのタイムゾーン
+        """
+        self.query = query
+        self.path = "/space/activities"
+        self.params = {}
+
+        projects = list(dict.fromkeys(query.projects))
+        if len(projects) == 1:
+            self.path = f"/projects/{projects[0]}/activities"
+            projects = []
+        if query.types:
+            self.params["activityTypeId[]"] = sorted(set(query.types))
+
+        self._projects = {project.upper() for project in projects}
+        self._users = set(query.users)
+        self._after = _to_utc(query.after, tz_name) if query.after else None
+        self._before = _to_utc(query.before, tz_name) if query.before else None
+        self.has_residual = bool(self._projects or self._users or self._after or self._before)
+
+    def matches(self, activity: dict):
+        """
+        Backlog APIで絞り込めない条件に一致するかを判定する(キーワードは含まない)
+
+        :param activity: 更新情報(Backlog APIの形式)
+        :return: 一致する場合はTrue
+        """
+        if self._projects:
+            project = activity.get("project") or {}
+            if str(project.get("projectKey", "")).upper() not in self._projects and str(project.get("id")) not in self._projects:
+                return False
+        if self._users:
+            user = activity.get("createdUser") or {}
+            if user.get("userId") not in self._users and user.get("name") not in self._users:
+                return False
+        created = activity.get("created", "")
+        if self._after and created < self._after:
+            return False
+        if self._before and created >= self._before:
+            return False
+        return True
+
+    def is_exhausted(self, activity: dict):
+        """
+        新しい順に取得している場合に、この更新情報以降は条件に一致しないかを判定する
+
+        :param activity: 更新情報(Backlog APIの形式)
+        :return: 以降の更新情報を取得する必要がない場合はTrue
+        """
+        return self._after is not None and activity.get("created", "") < self._after
+
+def plan_query(query: Optional[SearchQuery], tz_name: Optional[str] = None):
+    """
+    検索構文の実行計画を作成する
+
+    :param query: SearchQuery Noneの場合は条件なし
+    :param tz_name: 登録日の日付のタイムゾーン(ユーザの設定) 未指定の場合は環境変数TZのタイムゾーン
+    :return: QueryPlan
+    """
+    return QueryPlan(query or SearchQuery(), tz_name)
@@ -0,0 +1,52 @@
+# singleflight.py
+import asyncio
+import metrics
+
+class SingleFlight:
+    """
+    同一キーの処理が実行中の場合、新たに実行せずに実行中の処理の結果を共有する
+
+    先に呼び出した側(リーダー)がキャンセルされても、処理自体は継続して後続の呼び出し側に結果を返す。
+    """
+
+    def __init__(self, name: str):
+        """
+        :param name: メトリクス名のプレフィックス
+        """
+        self.name = name
+        self._calls = {}
+
+    async def do(self, key, func):
+        """
+        キーに対応する処理を実行する(実行中の場合は結果を待つ)
+
+        :param key: 同一処理を判定するキー(ハッシュ可能な値)
+        :param func: 処理(引数なしのコルーチン関数)
+        :return: 処理結果
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            metrics.increment(f"{self.name}.coalesced")
+            return await asyncio.shield(task)
+
+        metrics.increment(f"{self.name}.executed")
+        task = asyncio.ensure_future(func())
+        self._calls[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        """処理完了時に実行中の一覧から削除する"""
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 待機側が全てキャンセルされた場合に例外が未取得の警告が出ないようにする
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self):
+        """
+        実行中の処理数を取得
+
+        :return: 実行中の処理数
+        """
+        return len(self._calls)
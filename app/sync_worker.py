@@ -0,0 +1,172 @@
+# sync_worker.py
+import asyncio, logging, random
+from urllib.parse import urlparse
+from database import SessionLocal
+from env_config import Configs
+from scheduler import PRIORITY_BACKGROUND
+import backlog, crud, metrics
+
+logger = logging.getLogger(__name__)
+
+def get_space_key():
+    """
+    接続先のBacklogスペースを識別するキーを取得
+
+    :return: スペースのホスト名(例: "example.backlog.com")
+    """
+    return urlparse(Configs.BACKLOG_BASE_URL or "").hostname or ""
+
+async def poll_space_activities(space_key: str, last_activity_id: int = None):
+    """
+    スペースの新しい更新情報を取得(保存はしない 同期処理が無効な場合の配信用)
+
+    :param space_key: スペース
+    :param last_activity_id: 取得済みの最新の更新情報ID Noneの場合は最新の1件のみ取得する
+    :return: Backlog APIの更新情報リスト(古い順)
+    """
+    async with SessionLocal() as db:
+        user = await crud.get_backlog_connected_user(db)
+    if user is None:
+        return []
+
+    params = {"count": 1} if last_activity_id is None else {"count": 100, "minId": last_activity_id, "order": "asc"}
+    activities = await backlog.get_backlog_json("/space/activities", params, user, PRIORITY_BACKGROUND)
+    return sorted(
+        (activity for activity in activities if last_activity_id is None or activity["id"] > last_activity_id),
+        key=lambda activity: activity["id"],
+    )
+
+class ActivitySyncWorker:
+    """
+    Backlogの最近の更新を定期的に取得し、更新情報テーブルへ保存するバックグラウンド処理
+
+    スペースごとに同期済みの最新の更新情報ID(m_sync_state)を保持し、minIdを指定して差分のみ取得する。
+    再起動した場合も、保存済みの位置から同期を再開する。
+    """
+
+    def __init__(self, interval: float, max_backoff: float, page_size: int = 100):
+        """
+        :param interval: 同期の間隔(秒)
+        :param max_backoff: 失敗時の待機時間の上限(秒)
+        :param page_size: 1回のBacklog API呼び出しで取得する件数(最大100)
+        """
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.page_size = page_size
+        self._task = None
+        self._failures = 0
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """
+        新しい更新情報を保存した際に呼び出す処理を追加
+
+        :param listener: (スペース, Backlog APIの更新情報リスト(古い順)) を受け取る関数
+        """
+        self._listeners.append(listener)
+
+    def start(self):
+        """
+        同期処理を開始する(FastAPIのlifespan開始時に呼び出す)
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """
+        同期処理を停止する(FastAPIのlifespan終了時に呼び出す)
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def next_delay(self):
+        """
+        次の同期までの待機時間を取得(失敗が続いた場合は指数的に延ばし、ジッターを加える)
+
+        :return: 待機時間(秒)
+        """
+        if self._failures:
+            delay = min(self.interval * (2 ** self._failures), self.max_backoff)
+            return delay * random.uniform(0.5, 1.0)
+        return self.interval * random.uniform(0.9, 1.1)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync_space(get_space_key())
+                self._failures = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._failures += 1
+                metrics.increment("sync.failures")
+                logger.warning("更新情報の同期に失敗しました(%s回目): %r", self._failures, e)
+            await asyncio.sleep(self.next_delay())
+
+    async def sync_space(self, space_key: str):
+        """
+        スペースの新しい更新情報を取得して保存する
+
+        初回(同期済みの位置がない場合)は最新の1ページのみ取得し、それ以降は差分を古い順に取得する。
+
+        :param space_key: スペース
+        :return: 保存した更新情報の件数
+        """
+        # Backlog APIの呼び出し中(スケジューラの待機・レート制限の待機を含む)に接続を保持しないよう、
+        # データベースセッションは読み込み・ページごとの保存の間のみ使用する
+        async with SessionLocal() as db:
+            user = await crud.get_backlog_connected_user(db)
+            if user is None:
+                return 0
+            last_activity_id = await crud.get_sync_state(db, space_key)
+
+        saved = 0
+        while True:
+            params = {"count": self.page_size}
+            if last_activity_id is not None:
+                params["minId"] = last_activity_id
+                params["order"] = "asc"
+            response = await backlog.call_backlog_api(
+                "/space/activities", params, user, PRIORITY_BACKGROUND
+            )
+            page = response.json()
+            new_activities = sorted(
+                (activity for activity in page if last_activity_id is None or activity["id"] > last_activity_id),
+                key=lambda activity: activity["id"],
+            )
+            if new_activities:
+                last_activity_id = new_activities[-1]["id"]
+                async with SessionLocal() as db:
+                    await crud.save_synced_activities(
+                        db,
+                        space_key,
+                        backlog.get_disp_activities(new_activities),
+                        new_activities,
+                        last_activity_id,
+                    )
+                saved += len(new_activities)
+                metrics.increment("sync.activities", len(new_activities))
+                for listener in self._listeners:
+                    # 配信処理などの失敗で、同期(次のページの取得)を中断しない
+                    try:
+                        listener(space_key, new_activities)
+                    except Exception as e:
+                        metrics.increment("sync.listener_failures")
+                        logger.warning("新しい更新情報の通知に失敗しました listener=%r: %r", listener, e)
+
+            # 初回、または取得件数がページサイズ未満の場合は終了
+            if "minId" not in params or len(page) < self.page_size:
+                break
+        metrics.set_gauge("sync.last_activity_id", last_activity_id)
+        return saved
+
+# 更新情報の同期処理
+sync_worker = ActivitySyncWorker(
+    interval=Configs.ACTIVITY_SYNC_INTERVAL,
+    max_backoff=Configs.ACTIVITY_SYNC_MAX_BACKOFF,
+)
@@ -0,0 +1,229 @@
+# fake_backlog.py
+# Backlog APIのローカル代替サーバ(テスト・負荷試験用)
+#
+# 以下のエンドポイントを実装する
+#   GET  /api/v2/space/activities   (minId・maxId・count・order・activityTypeId[])
+#   GET  /api/v2/activities/{id}
+#   POST /api/v2/oauth2/token       (authorization_code・refresh_token)
+#
+# レイテンシ・エラー率・アクセストークンの有効期限(期限切れの場合は401)・レート制限(X-RateLimit-*ヘッダ・429)を設定できる。
+# mode="record"の場合は実際のBacklogへ中継してレスポンスをfixtureに保存し、mode="replay"の場合はfixtureから返す。
+import asyncio, json, os, random, secrets, time
+from dataclasses import dataclass, field
+from typing import List, Optional
+import httpx
+from fastapi import FastAPI, Form, Query, Request
+from fastapi.responses import JSONResponse
+
+@dataclass
+class FakeBacklogConfig:
+    latency: float = 0.0            # 1リクエストあたりの平均レイテンシ(秒)
+    latency_jitter: float = 0.0     # レイテンシのばらつき(秒 ±)
+    error_rate: float = 0.0         # 500を返す割合(0〜1)
+    token_ttl: float = 3600         # アクセストークンの有効期限(秒)
+    rate_limit: int = 0             # 1ウィンドウあたりの呼び出し数の上限(0の場合は無制限)
+    rate_limit_window: float = 60   # レート制限のウィンドウ(秒)
+    activity_count: int = 1000      # 生成する更新情報の件数
+    mode: str = "synthetic"         # synthetic / record / replay
+    fixture_path: Optional[str] = None
+    upstream_url: Optional[str] = None  # recordモードの中継先(例: https://example.backlog.com)
+    seed: int = 0
+
+@dataclass
+class FakeBacklogState:
+    tokens: dict = field(default_factory=dict)          # アクセストークン → 有効期限
+    refresh_tokens: set = field(default_factory=set)
+    calls: dict = field(default_factory=dict)           # ユーザ(アクセストークン) → (ウィンドウ開始時刻, 呼び出し数)
+    activities: List[dict] = field(default_factory=list)
+    fixtures: dict = field(default_factory=dict)
+    request_count: int = 0
+
+SUMMARIES = ["ログイン画面の不具合", "検索結果の表示修正", "API連携の追加", "お気に入り機能の改善", "性能改善", "ドキュメント更新"]
+USERS = ["tanaka", "suzuki", "sato", "takahashi", "ito"]
+
+def generate_activities(count: int, seed: int = 0):
+    """
+    更新情報(Backlog APIの形式)を新しい順に生成する
+
+    :param count: 件数
+    :param seed: 乱数のシード
+    :return: 更新情報リスト
+    """
+    rng = random.Random(seed)
+    activities = []
+    for activity_id in range(count, 0, -1):
+        user = rng.choice(USERS)
+        activities.append({
+            "id": activity_id,
+            "project": {"id": 1 + activity_id % 3, "projectKey": f"PRJ{1 + activity_id % 3}", "name": f"テストプロジェクト{1 + activity_id % 3}"},
+            "type": rng.choice([1, 2, 3, 14]),
+            "content": {
+                "id": activity_id,
+                "key_id": activity_id,
+                "summary": f"{rng.choice(SUMMARIES)} #{activity_id}",
+                "description": "詳細は課題を参照してください",
+                "comment": {"id": activity_id, "content": f"{user}さん 確認お願いします"},
+                "changes": [{"field": "status", "new_value": "2", "old_value": "1", "type": "standard"}],
+            },
+            "notifications": [],
+            "createdUser": {
+                "id": USERS.index(user) + 1,
+                "userId": user,
+                "name": user,
+                "roleType": 1,
+                "lang": "ja",
+                "mailAddress": f"{user}@example.com",
+                "nulabAccount": None,
+            },
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1725667686 + activity_id * 60)),
+        })
+    return activities
+
+def create_fake_backlog_app(config: FakeBacklogConfig = None):
+    """
+    Backlog APIの代替サーバ(ASGIアプリ)を作成する
+
+    :param config: FakeBacklogConfig
+    :return: FastAPI(state.fake_backlogにFakeBacklogState、state.configにFakeBacklogConfigを保持)
+    """
+    config = config or FakeBacklogConfig()
+    state = FakeBacklogState(activities=generate_activities(config.activity_count, config.seed))
+    if config.mode == "replay" and config.fixture_path and os.path.exists(config.fixture_path):
+        with open(config.fixture_path, "r", encoding="utf-8") as file:
+            state.fixtures = json.load(file)
+    rng = random.Random(config.seed)
+
+    app = FastAPI()
+    app.state.fake_backlog = state
+    app.state.config = config
+
+    def issue_tokens():
+        access_token = secrets.token_urlsafe(24)
+        refresh_token = secrets.token_urlsafe(24)
+        state.tokens[access_token] = time.monotonic() + config.token_ttl
+        state.refresh_tokens.add(refresh_token)
+        return {
+            "access_token": access_token,
+            "token_type": "Bearer",
+            "expires_in": int(config.token_ttl),
+            "refresh_token": refresh_token,
+        }
+    app.state.issue_tokens = issue_tokens
+
+    @app.middleware("http")
+    async def simulate(request: Request, call_next):
+        state.request_count += 1
+        delay = config.latency + rng.uniform(-config.latency_jitter, config.latency_jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if config.error_rate and rng.random() < config.error_rate:
+            return JSONResponse({"errors": [{"message": "Internal Server Error"}]}, status_code=500)
+
+        if request.url.path.endswith("/oauth2/token") or config.mode != "synthetic":
+            return await call_next(request)
+
+        # アクセストークンの検証
+        access_token = request.headers.get("authorization", "").removeprefix("Bearer ")
+        expires_at = state.tokens.get(access_token)
+        if expires_at is None or expires_at < time.monotonic():
+            return JSONResponse({"errors": [{"message": "Authentication failure", "code": 11}]}, status_code=401)
+
+        # レート制限
+        headers = {}
+        if config.rate_limit:
+            now = time.time()
+            window_start, count = state.calls.get(access_token, (now, 0))
+            if now - window_start >= config.rate_limit_window:
+                window_start, count = now, 0
+            count += 1
+            state.calls[access_token] = (window_start, count)
+            reset_at = int(window_start + config.rate_limit_window)
+            headers = {
+                "X-RateLimit-Limit": str(config.rate_limit),
+                "X-RateLimit-Remaining": str(max(config.rate_limit - count, 0)),
+                "X-RateLimit-Reset": str(reset_at),
+            }
+            if count > config.rate_limit:
+                return JSONResponse(
+                    {"errors": [{"message": "Rate limit exceeded", "code": 429}]},
+                    status_code=429,
+                    headers={**headers, "Retry-After": str(max(reset_at - int(now), 1))},
+                )
+
+        response = await call_next(request)
+        response.headers.update(headers)
+        return response
+
+    @app.post("/api/v2/oauth2/token")
+    async def token(grant_type: str = Form(...), refresh_token: Optional[str] = Form(None), code: Optional[str] = Form(None)):
+        if grant_type == "refresh_token":
+            if refresh_token not in state.refresh_tokens:
+                return JSONResponse({"error": "invalid_grant"}, status_code=400)
+            state.refresh_tokens.discard(refresh_token)
+        return issue_tokens()
+
+    if config.mode == "synthetic":
+        @app.get("/api/v2/space/activities")
+        async def space_activities(
+                minId: Optional[int] = None,
+                maxId: Optional[int] = None,
+                count: int = Query(20, ge=1, le=100),
+                order: str = "desc",
+                activityTypeId: Optional[List[int]] = Query(None, alias="activityTypeId[]")):
+            activities = [
+                activity for activity in state.activities
+                if (minId is None or activity["id"] > minId)
+                and (maxId is None or activity["id"] < maxId)
+                and (not activityTypeId or activity["type"] in activityTypeId)
+            ]
+            if order == "asc":
+                activities = list(reversed(activities))
+            return activities[:count]
+
+        @app.get("/api/v2/projects/{project_id_or_key}/activities")
+        async def project_activities(
+                project_id_or_key: str,
+                minId: Optional[int] = None,
+                maxId: Optional[int] = None,
+                count: int = Query(20, ge=1, le=100),
+                order: str = "desc",
+                activityTypeId: Optional[List[int]] = Query(None, alias="activityTypeId[]")):
+            activities = [
+                activity for activity in state.activities
+                if project_id_or_key in (str(activity["project"]["id"]), activity["project"]["projectKey"])
+                and (minId is None or activity["id"] > minId)
+                and (maxId is None or activity["id"] < maxId)
+                and (not activityTypeId or activity["type"] in activityTypeId)
+            ]
+            if order == "asc":
+                activities = list(reversed(activities))
+            return activities[:count]
+
+        @app.get("/api/v2/activities/{activity_id}")
+        async def activity(activity_id: int):
+            for item in state.activities:
+                if item["id"] == activity_id:
+                    return item
+            return JSONResponse({"errors": [{"message": "No activity."}]}, status_code=404)
+    else:
+        # record / replay: 実際のBacklogのレスポンスを保存・再生する
+        @app.api_route("/api/v2/{path:path}", methods=["GET"])
+        async def recorded(path: str, request: Request):
+            key = f"GET /api/v2/{path}?{'&'.join(sorted(str(request.query_params).split('&')))}"
+            if config.mode == "record":
+                async with httpx.AsyncClient() as client:
+                    upstream = await client.get(
+                        f"{config.upstream_url}/api/v2/{path}",
+                        params=request.query_params,
+                        headers={"Authorization": request.headers.get("authorization", "")},
+                    )
+                state.fixtures[key] = {"status_code": upstream.status_code, "body": upstream.json()}
+                if config.fixture_path:
+                    with open(config.fixture_path, "w", encoding="utf-8") as file:
+                        json.dump(state.fixtures, file, ensure_ascii=False, indent=2)
+            fixture = state.fixtures.get(key)
+            if fixture is None:
+                return JSONResponse({"errors": [{"message": f"No fixture for {key}"}]}, status_code=404)
+            return JSONResponse(fixture["body"], status_code=fixture["status_code"])
+
+    return app
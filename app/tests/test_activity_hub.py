@@ -0,0 +1,104 @@
+# test_activity_hub.py
+import pytest, sys, os, asyncio
+from unittest.mock import AsyncMock
+
+# /appディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from activity_hub import ActivityHub
+
+@pytest.mark.asyncio
+async def test_subscribers_share_one_poll():
+    """
+    正常系: 同じスペースの購読者がポーリングを共有するテスト
+
+    GIVEN: 同じスペースの購読者が2件(キーワード指定あり・なし)
+    WHEN: ポーリングで新しい更新情報を取得
+    THEN: ポーリングはスペースごとに1回のみ実行され、キーワードに一致する購読者にのみ配信される
+    """
+    poller = AsyncMock(side_effect=[
+        [{"id": 10, "summary": "既存"}],
+        [{"id": 11, "summary": "ログイン不具合"}, {"id": 12, "summary": "その他"}],
+    ] + [[]] * 100)
+    hub = ActivityHub(poller=poller, interval=0.01)
+
+    all_subscription = hub.subscribe("example.backlog.com")
+    keyword_subscription = hub.subscribe("example.backlog.com", keyword="ログイン")
+
+    first = await asyncio.wait_for(all_subscription.queue.get(), timeout=1)
+    second = await asyncio.wait_for(all_subscription.queue.get(), timeout=1)
+    keyword_only = await asyncio.wait_for(keyword_subscription.queue.get(), timeout=1)
+
+    assert [first["id"], second["id"]] == [11, 12]
+    assert keyword_only["id"] == 11
+    assert keyword_subscription.queue.empty()
+    # 2回目のポーリングは取得済みの位置から行われる
+    assert poller.await_args_list[1].args == ("example.backlog.com", 10)
+
+    hub.unsubscribe(all_subscription)
+    hub.unsubscribe(keyword_subscription)
+    assert hub._pollers == {}
+
+@pytest.mark.asyncio
+async def test_publish_from_external_source():
+    """
+    正常系: 同期処理から配信するテスト
+
+    GIVEN: ポーリングを行わない設定の購読
+    WHEN: 同期処理が取得した更新情報を配信
+    THEN: 購読者に配信され、ポーリングは実行されない
+    """
+    poller = AsyncMock(return_value=[])
+    hub = ActivityHub(poller=poller, interval=0.01)
+    hub.use_external_source()
+
+    subscription = hub.subscribe("example.backlog.com")
+    hub.publish("example.backlog.com", [{"id": 1}])
+
+    assert subscription.queue.get_nowait() == {"id": 1}
+    poller.assert_not_awaited()
+    hub.unsubscribe(subscription)
+
+@pytest.mark.asyncio
+async def test_publish_only_visible_projects():
+    """
+    正常系: 参照できるプロジェクトの更新情報のみ配信するテスト
+
+    GIVEN: 参照できるプロジェクトを指定した購読と、指定しない購読
+    WHEN: 複数のプロジェクトの更新情報を配信
+    THEN: 指定した購読には参照できるプロジェクトの更新情報のみ配信される
+    """
+    hub = ActivityHub(poller=None)
+    visible = hub.subscribe("example.backlog.com", project_ids=frozenset({1}))
+    unfiltered = hub.subscribe("example.backlog.com")
+
+    hub.publish("example.backlog.com", [{"id": 1, "project": {"id": 1}}, {"id": 2, "project": {"id": 2}}, {"id": 3}])
+
+    assert visible.queue.get_nowait()["id"] == 1
+    assert visible.queue.empty()
+    assert unfiltered.queue.qsize() == 3
+    hub.unsubscribe(visible)
+    hub.unsubscribe(unfiltered)
+
+@pytest.mark.asyncio
+async def test_unsubscribe_resets_last_id():
+    """
+    正常系: 購読者がいなくなった場合に取得済みの位置を破棄するテスト
+
+    GIVEN: 取得済みの位置が記録されたスペースの購読
+    WHEN: 最後の購読者が購読を終了し、再度購読を開始
+    THEN: 取得済みの位置が破棄され、再度のポーリングは位置を指定せずに行われる(購読者がいない間の更新情報は配信されない)
+    """
+    poller = AsyncMock(return_value=[{"id": 10}])
+    hub = ActivityHub(poller=poller, interval=0.01)
+
+    subscription = hub.subscribe("example.backlog.com")
+    hub.publish("example.backlog.com", [{"id": 20}])
+    assert hub._last_ids == {"example.backlog.com": 20}
+    hub.unsubscribe(subscription)
+    assert hub._last_ids == {}
+
+    subscription = hub.subscribe("example.backlog.com")
+    await asyncio.sleep(0)
+    assert poller.await_args.args == ("example.backlog.com", None)
+    hub.unsubscribe(subscription)
@@ -0,0 +1,53 @@
+# test_activity_types.py
+import pytest, sys, os, json
+
+# /appディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from activity_types import ActivityTypeTable, ACTIVITY_TYPES_PATH
+
+def test_load_relative_to_module(tmp_path, monkeypatch):
+    """
+    正常系: カレントディレクトリによらず定義ファイルを読み込むテスト
+
+    GIVEN: カレントディレクトリが/app以外
+    WHEN: 更新種別の表を取得
+    THEN: 数値・文字列のどちらの更新種別でも表示名を引ける
+    """
+    monkeypatch.chdir(tmp_path)
+    table = ActivityTypeTable(ACTIVITY_TYPES_PATH).get()
+
+    assert table[1] == ("1", "課題の追加")
+    assert table["1"] == ("1", "課題の追加")
+
+def test_hot_reload(tmp_path):
+    """
+    正常系: 定義ファイルが更新された場合に読み込み直すテスト
+
+    GIVEN: 読み込み済みの定義ファイル
+    WHEN: 定義ファイルを更新・不正な内容に更新
+    THEN: 更新後の定義が返り、不正な内容の場合は読み込み済みの定義が返る
+    """
+    path = tmp_path / "activity_types.json"
+    path.write_text(json.dumps({"1": "追加"}), encoding="utf-8")
+    types = ActivityTypeTable(str(path), check_interval=0)
+    first = types.get()
+    assert types.get() is first
+
+    path.write_text(json.dumps({"1": "課題の追加"}), encoding="utf-8")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    assert types.get()[1] == ("1", "課題の追加")
+
+    path.write_text("{", encoding="utf-8")
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    assert types.get()[1] == ("1", "課題の追加")
+
+def test_load_missing_file(tmp_path):
+    """
+    異常系: 定義ファイルが存在しない場合
+
+    GIVEN: 存在しないパス
+    WHEN: 更新種別の表を取得
+    THEN: FileNotFoundErrorが発生する
+    """
+    with pytest.raises(FileNotFoundError):
+        ActivityTypeTable(str(tmp_path / "missing.json")).get()
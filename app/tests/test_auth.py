@@ -7,9 +7,10 @@ from fastapi import HTTPException, status
 # /appディレクトリをパスに追加
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from auth import create_access_token, get_current_user, user_login
+from auth import create_access_token, get_current_user, user_login, create_sse_ticket, get_current_user_from_header_or_ticket
 from models import User
 from env_config import Configs
+from user_cache import user_cache
 
 # モック用の設定
 class MockConfigs:
@@ -89,3 +90,87 @@ async def test_get_current_user_invalid_token(mock_db, mock_configs):
 #             user_login(form_data=form_data, db=mock_db)
 #         assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
 #         assert exc_info.value.detail == "username、またはpasswordが間違っています"
+
+@pytest.fixture
+def clear_user_cache():
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+@pytest.mark.asyncio
+async def test_get_current_user_cached(mock_user, mock_configs, clear_user_cache):
+    """
+    正常系: ユーザーID(uid)を含むトークンのユーザーをキャッシュするテスト
+
+    GIVEN: ユーザーIDを含むトークン
+    WHEN: 同じトークンで2回ユーザーを取得し、キャッシュを削除して再度取得
+    THEN: 2回目はデータベースを検索せず、キャッシュの削除後は主キーで検索する
+    """
+    token = create_access_token({"sub": "testuser", "uid": 1})
+
+    with patch('auth.get_user', return_value=mock_user) as get_user, \
+         patch('auth.get_user_by_username') as get_user_by_username:
+        assert (await get_current_user(token=token, db=None)).id == 1
+        cached = await get_current_user(token=token, db=None)
+        assert cached.user_nm == "testuser"
+        assert cached is not mock_user
+        assert get_user.call_count == 1
+
+        user_cache.invalidate(1)
+        await get_current_user(token=token, db=None)
+        assert get_user.call_count == 2
+        get_user_by_username.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_get_current_user_without_uid(mock_user, mock_configs, clear_user_cache):
+    """
+    正常系: ユーザーIDを含まない(以前に発行した)トークンのテスト
+
+    GIVEN: ユーザー名(sub)のみを含むトークン
+    WHEN: 同じトークンで2回ユーザーを取得
+    THEN: 1回目はユーザー名で検索し、2回目はキャッシュを使用する
+    """
+    token = create_access_token({"sub": "testuser"})
+
+    with patch('auth.get_user_by_username', return_value=mock_user) as get_user_by_username, \
+         patch('auth.get_user') as get_user:
+        await get_current_user(token=token, db=None)
+        assert (await get_current_user(token=token, db=None)).id == 1
+        assert get_user_by_username.call_count == 1
+        get_user.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_get_current_user_subject_mismatch(mock_user, mock_configs, clear_user_cache):
+    """
+    異常系: トークンのユーザー名とユーザーIDが一致しない場合のテスト
+
+    GIVEN: 別のユーザーのユーザーIDを含むトークン
+    WHEN: ユーザーを取得
+    THEN: 401エラーが返る
+    """
+    token = create_access_token({"sub": "otheruser", "uid": 1})
+
+    with patch('auth.get_user', return_value=mock_user):
+        with pytest.raises(HTTPException) as exc_info:
+            await get_current_user(token=token, db=None)
+    assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+@pytest.mark.asyncio
+async def test_get_current_user_from_ticket(mock_user, mock_db, clear_user_cache):
+    """
+    正常系・異常系: 新しい更新情報の配信(SSE)のチケットのテスト
+
+    GIVEN: ユーザーのチケット
+    WHEN: チケットでユーザーを2回取得し、存在しないチケット・トークン(JWT)をチケットとして取得
+    THEN: 1回目のみユーザーを取得でき、2回目(使用済み)・存在しないチケット・トークンは401エラーが返る
+    """
+    ticket = create_sse_ticket(1)
+    token = create_access_token({"sub": "testuser", "uid": 1})
+
+    with patch('auth.get_user', return_value=mock_user):
+        assert (await get_current_user_from_header_or_ticket(token=None, ticket=ticket, db=mock_db)).id == 1
+        mock_db.close.assert_awaited_once()
+        for invalid in (ticket, "unknown", token, None):
+            with pytest.raises(HTTPException) as exc_info:
+                await get_current_user_from_header_or_ticket(token=None, ticket=invalid, db=mock_db)
+            assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
@@ -1,6 +1,6 @@
 # test_backlog.py
-import pytest, sys, os, json, pytz
-from unittest.mock import patch, AsyncMock, mock_open
+import pytest, sys, os, json, pytz, asyncio
+from unittest.mock import patch, AsyncMock, MagicMock, mock_open
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
@@ -12,12 +12,24 @@ from backlog import (
     get_backlog_tokens, 
     refresh_access_token, 
     call_backlog_api, 
-    get_disp_activity
+    get_disp_activity,
+    get_disp_activities,
+    get_fetched_disp_activities,
+    get_http_client,
+    startup_http_client,
+    shutdown_http_client,
+    fetch_activities,
+    get_backlog_json,
+    search_space_activities,
+    get_visible_project_ids,
+    _visible_projects,
 )
 from models import User
+from env_config import Configs
+import metrics
 
-# テスト用のモックデータ
-class MockConfigs:
+# テスト用のモックデータ(未指定の設定値はConfigsの値を使用)
+class MockConfigs(Configs):
     BACKLOG_CLIENT_ID = "test_client_id"
     BACKLOG_REDIRECT_URI = "https://example.com/callback"
     BACKLOG_AUTHORIZE_URL = "https://example.com/oauth2/authorize"
@@ -94,12 +106,12 @@ async def test_refresh_access_token_failure(mock_user, mock_db, mock_configs):
         mock_post.assert_called_once()
 
 @pytest.mark.asyncio
-async def test_call_backlog_api_success(mock_user, mock_db, mock_configs):
+async def test_call_backlog_api_success(mock_user, mock_configs):
     # 正常系: Backlog API呼び出しが成功するテスト
     mock_response = AsyncMock(status_code=200, json=AsyncMock(return_value={"key": "value"}))
 
     with patch("httpx.AsyncClient.get", return_value=mock_response) as mock_get:
-        response = await call_backlog_api(url="/test", params={}, current_user=mock_user, db=mock_db)
+        response = await call_backlog_api(url="/test", params={}, current_user=mock_user)
         assert response.status_code == 200
         assert await response.json() == {"key": "value"}
         mock_get.assert_called_once()
@@ -112,22 +124,214 @@ async def test_call_backlog_api_success(mock_user, mock_db, mock_configs):
 
 #     with patch("httpx.AsyncClient.get", side_effect=[mock_response_401, mock_response_200]) as mock_get, \
 #          patch("backlog.refresh_access_token", return_value=AsyncMock(status_code=200, json=AsyncMock(return_value={"access_token": "new_access_token"}))) as mock_refresh:
-#         response = await call_backlog_api(url="/test", params={}, current_user=mock_user, db=mock_db)
+#         response = await call_backlog_api(url="/test", params={}, current_user=mock_user)
 #         assert response.status_code == 200
 #         assert await response.json() == {"key": "value"}
 #         assert mock_get.call_count == 2
 #         mock_refresh.assert_called_once()
 
 @pytest.mark.asyncio
-async def test_call_backlog_api_failure(mock_user, mock_db, mock_configs):
+async def test_call_backlog_api_failure(mock_user, mock_configs):
     # 異常系: Backlog API呼び出しが失敗するテスト
     with patch("httpx.AsyncClient.get", return_value=AsyncMock(status_code=500)) as mock_get:
         with pytest.raises(HTTPException) as exc_info:
-            await call_backlog_api(url="/test", params={}, current_user=mock_user, db=mock_db)
+            await call_backlog_api(url="/test", params={}, current_user=mock_user)
         assert exc_info.value.status_code == 500
         assert exc_info.value.detail == "Backlog API呼び出しに失敗しました"
         mock_get.assert_called_once()
 
+@pytest.mark.asyncio
+async def test_fetch_activities_keeps_order_and_isolates_failures(mock_user, mock_configs):
+    # 正常系: 並行取得しても順序が維持され、失敗した更新情報のみNoneになるテスト
+    async def fake_get_backlog_json(url, params, current_user, priority):
+        if url == "/activities/2":
+            raise HTTPException(status_code=500, detail="Backlog API呼び出しに失敗しました")
+        return {"id": int(url.rsplit("/", 1)[1])}
+
+    with patch("backlog.get_backlog_json", side_effect=fake_get_backlog_json) as mock_call:
+        activities = await fetch_activities(["3", "2", "1"], mock_user)
+        assert activities == [{"id": 3}, None, {"id": 1}]
+        assert mock_call.call_count == 3
+
+@pytest.mark.asyncio
+async def test_get_visible_project_ids_cached_per_user(mock_user, mock_configs):
+    # 正常系: ユーザが参照できるプロジェクトIDを取得し、ユーザ単位でキャッシュするテスト
+    other_user = User(id=2, backlog_access_token="other_access_token")
+
+    async def fake_get_backlog_json(url, params, current_user, priority):
+        assert url == "/projects"
+        return [{"id": 10}, {"id": 20}] if current_user.id == mock_user.id else [{"id": 30}]
+
+    _visible_projects.clear()
+    with patch("backlog.get_backlog_json", side_effect=fake_get_backlog_json):
+        assert await get_visible_project_ids(mock_user) == {10, 20}
+        assert await get_visible_project_ids(other_user) == {30}
+
+    with patch("backlog.get_backlog_json", side_effect=fake_get_backlog_json) as mock_get:
+        assert await get_visible_project_ids(mock_user) == {10, 20}
+        mock_get.assert_not_called()
+    _visible_projects.clear()
+
+def test_get_fetched_disp_activities_skips_malformed(monkeypatch):
+    # 異常系: 形式が想定と異なる更新情報のみ除外され、他の更新情報は整形されるテスト
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    activity = {"id": 1, "project": {"name": "Test Project"}, "type": 1, "content": {"summary": "Test Summary"},
+                "createdUser": {"name": "Test User"}, "created": "2024-09-07T11:08:06Z"}
+    malformed = {"id": 2, "type": 1, "created": "2024-09-07T11:08:06Z"}
+
+    disp_activities = get_fetched_disp_activities([malformed, None, activity])
+
+    assert [disp_activity["id"] for disp_activity in disp_activities] == [1]
+
+@pytest.mark.asyncio
+async def test_get_backlog_json_coalesces_identical_calls(mock_user, mock_configs):
+    # 正常系: 同時に実行された同一のBacklog API呼び出しが1回にまとめられるテスト
+    release = asyncio.Event()
+
+    async def slow_get(*args, **kwargs):
+        await release.wait()
+        return MagicMock(status_code=200, json=MagicMock(return_value=[{"id": 1}]))
+
+    metrics.reset()
+    with patch("httpx.AsyncClient.get", side_effect=slow_get) as mock_get:
+        tasks = [asyncio.ensure_future(get_backlog_json("/space/activities", {}, mock_user)) for _ in range(5)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+    assert results == [[{"id": 1}]] * 5
+    mock_get.assert_called_once()
+    assert metrics.snapshot()["counters"]["backlog.singleflight.coalesced"] == 4
+
+@pytest.mark.asyncio
+async def test_call_backlog_api_retries_full_url_after_refresh(mock_user, mock_configs):
+    # 正常系: 401の場合にトークンを更新し、APIのフルURLで再度呼び出すテスト
+    mock_response_401 = MagicMock(status_code=401)
+    mock_response_200 = MagicMock(status_code=200)
+
+    with patch("httpx.AsyncClient.get", side_effect=[mock_response_401, mock_response_200]) as mock_get, \
+         patch("backlog.token_manager.refresh", AsyncMock(return_value="new_access_token")) as mock_refresh:
+        response = await call_backlog_api(url="/test", params={}, current_user=mock_user)
+        assert response.status_code == 200
+        mock_refresh.assert_awaited_once_with(mock_user.id, "test_access_token")
+        retry_args, retry_kwargs = mock_get.call_args
+        assert retry_args[0] == f"{MockConfigs.BACKLOG_API_URL}/test"
+        assert retry_kwargs["headers"]["Authorization"] == "Bearer new_access_token"
+
+@pytest.mark.asyncio
+async def test_call_backlog_api_with_fake_backlog_expired_token(mock_configs, monkeypatch):
+    # 正常系: 代替サーバでアクセストークンが期限切れ(401)の場合に、更新したトークンで再度呼び出すテスト
+    import httpx, backlog
+    from tests.fake_backlog import FakeBacklogConfig, create_fake_backlog_app
+
+    fake = create_fake_backlog_app(FakeBacklogConfig(activity_count=10, rate_limit=100))
+    expired = fake.state.issue_tokens()
+    fake.state.fake_backlog.tokens[expired["access_token"]] = 0
+    fresh = fake.state.issue_tokens()
+    client = backlog.create_http_client(transport=httpx.ASGITransport(app=fake))
+    monkeypatch.setattr("backlog._http_client", client)
+    user = User(id=101, backlog_access_token=expired["access_token"], backlog_refresh_token=expired["refresh_token"])
+
+    try:
+        with patch("backlog.token_manager.refresh", AsyncMock(return_value=fresh["access_token"])) as mock_refresh:
+            response = await call_backlog_api(url="/activities/3", params={}, current_user=user)
+        assert response.status_code == 200
+        assert response.json()["id"] == 3
+        assert response.headers["X-RateLimit-Limit"] == "100"
+        mock_refresh.assert_awaited_once_with(user.id, expired["access_token"])
+    finally:
+        backlog.token_manager.forget(user.id)
+        await client.aclose()
+
+@pytest.mark.asyncio
+async def test_search_space_activities_pages_until_limit(mock_user, mock_configs, monkeypatch):
+    # 正常系: キーワードに一致する件数に達するまでmaxIdでページングするテスト
+    monkeypatch.setattr(MockConfigs, "ACTIVITY_SEARCH_PAGE_SIZE", 3, raising=False)
+    pages = {
+        None: [{"id": 9, "text": "hit"}, {"id": 8, "text": "miss"}, {"id": 7, "text": "miss"}],
+        7: [{"id": 6, "text": "miss"}, {"id": 5, "text": "hit"}, {"id": 4, "text": "hit"}],
+    }
+
+    async def fake_get_backlog_json(url, params, current_user):
+        assert params["count"] == 3
+        return pages[params.get("maxId")]
+
+    with patch("backlog.get_backlog_json", side_effect=fake_get_backlog_json) as mock_get:
+        activities, next_max_id = await search_space_activities(mock_user, "hit", limit=2)
+
+    assert [activity["id"] for activity in activities] == [9, 5]
+    assert next_max_id == 5
+    assert mock_get.call_count == 2
+
+@pytest.mark.asyncio
+async def test_search_space_activities_pushes_down_query(mock_user, mock_configs, monkeypatch):
+    # 正常系: 検索構文の条件をBacklog APIのパラメータで絞り込み、afterより前の更新情報が現れたらページングを終えるテスト
+    from search_query import parse_query
+    monkeypatch.setattr(MockConfigs, "ACTIVITY_SEARCH_PAGE_SIZE", 3, raising=False)
+    monkeypatch.setenv("TZ", "UTC")
+    page = [
+        {"id": 9, "createdUser": {"userId": "tanaka"}, "created": "2024-09-02T00:00:00Z", "text": "hit"},
+        {"id": 8, "createdUser": {"userId": "sato"}, "created": "2024-09-01T12:00:00Z", "text": "hit"},
+        {"id": 7, "createdUser": {"userId": "tanaka"}, "created": "2024-08-31T23:59:59Z", "text": "hit"},
+    ]
+
+    async def fake_get_backlog_json(url, params, current_user):
+        assert url == "/projects/FOO/activities"
+        assert params["activityTypeId[]"] == [2]
+        return page
+
+    query = parse_query("project:FOO type:2 user:tanaka after:2024-09-01 hit")
+    with patch("backlog.get_backlog_json", side_effect=fake_get_backlog_json) as mock_get:
+        activities, next_max_id = await search_space_activities(mock_user, None, limit=10, query=query)
+
+    assert [activity["id"] for activity in activities] == [9]
+    assert next_max_id is None
+    assert mock_get.call_count == 1
+
+@pytest.mark.asyncio
+async def test_search_space_activities_stops_at_max_pages(mock_user, mock_configs, monkeypatch):
+    # 正常系: ページ数の上限に達した場合は、続きの位置を返して終了するテスト
+    monkeypatch.setattr(MockConfigs, "ACTIVITY_SEARCH_PAGE_SIZE", 2, raising=False)
+    monkeypatch.setattr(MockConfigs, "ACTIVITY_SEARCH_MAX_PAGES", 2, raising=False)
+
+    async def fake_get_backlog_json(url, params, current_user):
+        max_id = params.get("maxId", 101)
+        return [{"id": max_id - 1, "text": "miss"}, {"id": max_id - 2, "text": "miss"}]
+
+    with patch("backlog.get_backlog_json", side_effect=fake_get_backlog_json) as mock_get:
+        activities, next_max_id = await search_space_activities(mock_user, "hit", limit=20)
+
+    assert activities == []
+    assert next_max_id == 97
+    assert mock_get.call_count == 2
+
+
+def test_get_disp_activities(tmp_path, monkeypatch):
+    # 正常系: カレントディレクトリによらず、更新情報のリストをまとめてUI表示形式に整形するテスト
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    activities = [
+        {"id": activity_id, "project": {"name": "Test Project"}, "type": activity_type, "content": content,
+         "createdUser": {"name": "Test User"}, "created": "2024-09-07T11:08:06Z"}
+        for activity_id, activity_type, content in [(1, 1, {"summary": "Test Summary"}), (2, 999, {})]
+    ]
+
+    disp_activities = get_disp_activities(activities)
+
+    assert disp_activities[0] == {
+        "id": 1,
+        "project_name": "Test Project",
+        "type": "1",
+        "type_name": "課題の追加",
+        "content_summary": "Test Summary",
+        "created_user_name": "Test User",
+        "created": "2024-09-07 20:08:06",
+    }
+    # 定義にない更新種別は更新種別をそのまま表示名とする
+    assert (disp_activities[1]["type"], disp_activities[1]["type_name"], disp_activities[1]["content_summary"]) == ("999", "999", " - ")
+    assert get_disp_activity(activities[0]) == disp_activities[0]
+
+
 # def test_get_disp_activity(monkeypatch):
 #     # 正常系: 更新情報をUI表示用に整形するテスト
 #     mock_activity = {
@@ -159,4 +363,14 @@ async def test_call_backlog_api_failure(mock_user, mock_db, mock_configs):
 #                 "content_summary": "Test Summary",
 #                 "created_user_name": "Test User",
 #                 "created": "2024-09-07 20:08:06"
-#             }
\ No newline at end of file
+#             }
+
+@pytest.mark.asyncio
+async def test_get_http_client_shared():
+    # 正常系: 共有HTTPクライアントが使い回され、lifespan終了時にクローズされるテスト
+    await startup_http_client()
+    client = get_http_client()
+    assert get_http_client() is client
+
+    await shutdown_http_client()
+    assert client.is_closed
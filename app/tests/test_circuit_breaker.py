@@ -0,0 +1,57 @@
+# test_circuit_breaker.py
+import pytest, sys, os, time
+
+# /appディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN
+
+def test_opens_after_consecutive_failures():
+    """
+    異常系: 連続して失敗した場合のテスト
+
+    GIVEN: 連続失敗回数の閾値が2のサーキットブレーカー
+    WHEN: 2回続けて失敗
+    THEN: 開いた状態となり、呼び出しが即時に失敗する
+    """
+    breaker = CircuitBreaker("example.com", failure_threshold=2, recovery_timeout=30)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    assert not breaker.is_available()
+
+    with pytest.raises(CircuitOpenError) as exc_info:
+        breaker.before_call()
+    assert 0 < exc_info.value.retry_after <= 30
+
+def test_half_open_trial_closes_or_reopens(monkeypatch):
+    """
+    正常系: 回復確認のテスト
+
+    GIVEN: 開いた状態のサーキットブレーカー
+    WHEN: 回復確認までの時間が経過した後に試行の呼び出しを実行
+    THEN: 試行は1件のみ許可され、成功した場合は閉じ、失敗した場合は再度開く
+    """
+    breaker = CircuitBreaker("example.com", failure_threshold=1, recovery_timeout=30)
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+
+    now = time.monotonic()
+    monkeypatch.setattr("circuit_breaker.time.monotonic", lambda: now + 31)
+    breaker.before_call()
+    assert breaker.state == STATE_HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+
+    monkeypatch.setattr("circuit_breaker.time.monotonic", lambda: now + 62)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED
+    assert breaker.is_available()
@@ -1,9 +1,7 @@
 # test_crud.py
-import pytest, sys, os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import Session
+import pytest, pytest_asyncio, sys, os
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy import event
 from sqlalchemy.pool import StaticPool
 from fastapi import HTTPException
 
@@ -13,36 +11,51 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from models import Base
 from crud import (
     get_user_by_username,
+    validate_new_user,
     create_user,
     update_user_tokens,
     add_favorite,
     get_favorites_all,
     delete_favorite,
+    get_activity_snapshots,
+    save_activity_snapshots,
+    save_synced_activities,
+    search_stored_activities,
+    update_user_timezone,
+    get_user,
+    add_favorites,
+    delete_favorites,
 )
-from schemas import UserCreate
+from schemas import UserCreate, FavoriteCreate
+from search_query import parse_query
+from user_cache import user_cache
+from keyword_matcher import compile_keyword
+from env_config import Configs
+
+# ハッシュ化済みのパスワード(bcryptのハッシュ処理はpassword_hasherで行うため、テストでは固定値を使用する)
+HASHED_PASSWORD = "hashedpassword"
 
 # テスト用のDBセッションをセットアップ
-@pytest.fixture(scope="function")
-def db():
-    Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
-    try:
+@pytest_asyncio.fixture
+async def db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with TestingSessionLocal() as db:
         yield db
-    finally:
-        db.close()
-        Base.metadata.drop_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
 
 # テスト用のインメモリデータベースを作成
-DATABASE_URL = "sqlite:///:memory:"
+DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
-engine = create_engine(
+engine = create_async_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False},
     poolclass=StaticPool
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+TestingSessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
 
-def test_create_user(db: Session):
+@pytest.mark.asyncio
+async def test_create_user(db: AsyncSession):
     """
     正常系: 新規ユーザーを作成するテスト
 
@@ -51,31 +64,79 @@ def test_create_user(db: Session):
     THEN: ユーザーが正しく作成される
     """
     user_data = UserCreate(username="testuser", password="password123")
-    user = create_user(db, user=user_data)
+    user = await create_user(db, user=user_data, hashed_password=HASHED_PASSWORD)
 
     # ユーザーが正しく作成されたかチェック
     assert user.user_nm == "testuser"
+    assert user.pw_hash == HASHED_PASSWORD
+
+@pytest.mark.asyncio
+async def test_create_user_timezone(db: AsyncSession):
+    """
+    正常系・異常系: タイムゾーンを指定してユーザーを作成・更新するテスト
+
+    GIVEN: 有効なタイムゾーン・不明なタイムゾーン
+    WHEN: ユーザーを作成・タイムゾーンを更新
+    THEN: 有効なタイムゾーンは保存され、不明なタイムゾーンは400が返る
+    """
+    user = await create_user(db, user=UserCreate(username="tzuser", password="password123", timezone="Europe/London"), hashed_password=HASHED_PASSWORD)
+    assert user.timezone == "Europe/London"
+
+    assert (await update_user_timezone(db, user.id, "UTC")).timezone == "UTC"
+
+    with pytest.raises(HTTPException) as exc_info:
+        await update_user_timezone(db, user.id, "Mars/Olympus")
+    assert exc_info.value.status_code == 400
 
-def test_create_user_existing_username(db: Session):
+@pytest.mark.asyncio
+async def test_update_user_invalidates_cache(db: AsyncSession):
+    """
+    正常系: ユーザー情報の更新時にキャッシュを削除するテスト
+
+    GIVEN: キャッシュ済みのユーザー
+    WHEN: タイムゾーン・Backlogのトークンを更新
+    THEN: キャッシュが削除され、主キーで最新のユーザーを取得できる
+    """
+    user = await create_user(db, user=UserCreate(username="cacheuser", password="password123"), hashed_password=HASHED_PASSWORD)
+    user_cache.set_user(user)
+
+    await update_user_timezone(db, user.id, "UTC")
+    assert user_cache.get_user(user.id) is None
+    assert (await get_user(db, user.id)).timezone == "UTC"
+
+    user_cache.set_user(await get_user(db, user.id))
+    await update_user_tokens(db, user.id, "new_access", "new_refresh")
+    assert user_cache.get_user(user.id) is None
+
+@pytest.mark.asyncio
+async def test_create_user_existing_username(db: AsyncSession):
     """
     異常系: 既に存在するユーザー名で作成するテスト
 
     GIVEN: ユーザー名が既に存在
-    WHEN: 新規ユーザーを作成
+    WHEN: 入力チェック・新規ユーザーの作成(入力チェックの後に同じユーザー名が登録された場合)
     THEN: HTTPExceptionが発生し、400ステータスと
     "Username already registered"という詳細メッセージが返る
     """
     
     user_data = UserCreate(username="testuser", password="password123")
-    create_user(db, user=user_data)
+    await create_user(db, user=user_data, hashed_password=HASHED_PASSWORD)
     
     # 同じユーザー名で再作成しようとした場合のチェック
     with pytest.raises(HTTPException) as exc_info:
-        create_user(db, user=user_data)
+        await validate_new_user(db, user_data)
     assert exc_info.value.status_code == 400
     assert exc_info.value.detail == "Username already registered"
 
-def test_get_user_by_username(db: Session):
+    # 一意制約の違反も同じエラーになり、セッションは引き続き使用できる
+    with pytest.raises(HTTPException) as exc_info:
+        await create_user(db, user=user_data, hashed_password=HASHED_PASSWORD)
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.detail == "Username already registered"
+    assert (await get_user_by_username(db, username="testuser")) is not None
+
+@pytest.mark.asyncio
+async def test_get_user_by_username(db: AsyncSession):
     """
     正常系: ユーザーが正しく取得できるかチェック
 
@@ -85,13 +146,14 @@ def test_get_user_by_username(db: Session):
     """
     
     user_data = UserCreate(username="testuser", password="password123")
-    create_user(db, user=user_data)
-    user = get_user_by_username(db, username="testuser")
+    await create_user(db, user=user_data, hashed_password=HASHED_PASSWORD)
+    user = await get_user_by_username(db, username="testuser")
 
     assert user is not None
     assert user.user_nm == "testuser"
 
-def test_get_user_by_username_not_found(db: Session):
+@pytest.mark.asyncio
+async def test_get_user_by_username_not_found(db: AsyncSession):
     """
     異常系: 存在しないユーザーを取得しようとするテスト
 
@@ -99,10 +161,11 @@ def test_get_user_by_username_not_found(db: Session):
     WHEN: ユーザーを取得
     THEN: Noneが返る
     """
-    user = get_user_by_username(db, username="nonexistentuser")
+    user = await get_user_by_username(db, username="nonexistentuser")
     assert user is None
 
-def test_update_user_tokens(db: Session):
+@pytest.mark.asyncio
+async def test_update_user_tokens(db: AsyncSession):
     # 正常系: トークン更新のテスト
     """
     正常系: トークン更新のテスト
@@ -112,15 +175,16 @@ def test_update_user_tokens(db: Session):
     THEN: トークンが更新される
     """
     user_data = UserCreate(username="testuser", password="password123")
-    user = create_user(db, user=user_data)
+    user = await create_user(db, user=user_data, hashed_password=HASHED_PASSWORD)
 
-    update_user_tokens(db, user_id=user.id, access_token="new_access", refresh_token="new_refresh")
+    await update_user_tokens(db, user_id=user.id, access_token="new_access", refresh_token="new_refresh")
 
-    updated_user = get_user_by_username(db, username="testuser")
+    updated_user = await get_user_by_username(db, username="testuser")
     assert updated_user.backlog_access_token == "new_access"
     assert updated_user.backlog_refresh_token == "new_refresh"
 
-def test_update_user_tokens_user_not_found(db: Session):
+@pytest.mark.asyncio
+async def test_update_user_tokens_user_not_found(db: AsyncSession):
     """
     異常系: 存在しないユーザーIDでトークン更新しようとするテスト
 
@@ -130,11 +194,12 @@ def test_update_user_tokens_user_not_found(db: Session):
     "ユーザーが存在しないため、トークンを更新できません"という詳細メッセージが返る
     """
     with pytest.raises(HTTPException) as exc_info:
-        update_user_tokens(db, user_id=9999, access_token="new_access", refresh_token="new_refresh")
+        await update_user_tokens(db, user_id=9999, access_token="new_access", refresh_token="new_refresh")
     assert exc_info.value.status_code == 404
     assert exc_info.value.detail == "ユーザが存在しないため、トークンを更新できません"
 
-def test_add_favorite(db: Session):
+@pytest.mark.asyncio
+async def test_add_favorite(db: AsyncSession):
     """
     正常系: お気に入り追加のテスト
     
@@ -143,16 +208,83 @@ def test_add_favorite(db: Session):
     THEN: お気に入りテーブルに1件追加される
     """
     user_data = UserCreate(username="testuser", password="password123")
-    user = create_user(db, user=user_data)
+    user = await create_user(db, user=user_data, hashed_password=HASHED_PASSWORD)
 
-    favorite_id = add_favorite(db, user_id=user.id, activity_id="activity_1", activity_title="Test Activity")
+    favorite_id = await add_favorite(db, user_id=user.id, activity_id="activity_1", activity_title="Test Activity")
 
-    favorites = get_favorites_all(db, user_id=user.id)
+    favorites = await get_favorites_all(db, user_id=user.id)
     assert len(favorites) == 1
     assert favorites[0].id == favorite_id
     assert favorites[0].activity_title == "Test Activity"
 
-def test_add_favorite_user_not_found(db: Session):
+@pytest.mark.asyncio
+async def test_add_favorite_upsert(db: AsyncSession):
+    """
+    正常系: 登録済みの更新情報をお気に入りに追加するテスト
+
+    GIVEN: お気に入りに登録済みの更新情報
+    WHEN: 同じ更新情報をお気に入りに追加
+    THEN: 1回のSQLで実行され、既存のお気に入りIDが返り、タイトルが更新される
+    """
+    user = await create_user(db, user=UserCreate(username="testuser", password="password123"), hashed_password=HASHED_PASSWORD)
+    favorite_id = await add_favorite(db, user_id=user.id, activity_id="activity_1", activity_title="Test Activity")
+
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        assert await add_favorite(db, user_id=user.id, activity_id="activity_1", activity_title="Renamed") == favorite_id
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    assert len(statements) == 1
+
+    favorites = await get_favorites_all(db, user_id=user.id)
+    assert [(favorite.id, favorite.activity_title) for favorite in favorites] == [(favorite_id, "Renamed")]
+
+@pytest.mark.asyncio
+async def test_add_and_delete_favorites_bulk(db: AsyncSession):
+    """
+    正常系: お気に入りの一括登録・一括削除のテスト
+
+    GIVEN: お気に入りに1件登録済みのユーザー
+    WHEN: 登録済み・未登録・重複を含む更新情報を一括登録し、他のユーザーのIDを含めて一括削除
+    THEN: それぞれ1回のSQLで実行され、指定された順序のIDが返り、自分のお気に入りのみ削除される
+    """
+    user = await create_user(db, user=UserCreate(username="testuser", password="password123"), hashed_password=HASHED_PASSWORD)
+    other = await create_user(db, user=UserCreate(username="otheruser", password="password123"), hashed_password=HASHED_PASSWORD)
+    existing_id = await add_favorite(db, user_id=user.id, activity_id="2", activity_title="Old")
+    other_id = await add_favorite(db, user_id=other.id, activity_id="1", activity_title="Other")
+
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        favorite_ids = await add_favorites(db, user.id, [
+            FavoriteCreate(activity_id="1", activity_title="First"),
+            FavoriteCreate(activity_id="2", activity_title="Second"),
+            FavoriteCreate(activity_id="1", activity_title="First (renamed)"),
+        ])
+        assert len(statements) == 1
+
+        assert favorite_ids[1] == existing_id
+        assert favorite_ids[0] == favorite_ids[2]
+        favorites = await get_favorites_all(db, user_id=user.id)
+        assert {favorite.activity_id: favorite.activity_title for favorite in favorites} == {"1": "First (renamed)", "2": "Second"}
+
+        statements.clear()
+        deleted_ids = await delete_favorites(db, [favorite_ids[0], other_id, 9999], user.id)
+        assert len(statements) == 1
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    assert deleted_ids == [favorite_ids[0]]
+    assert [favorite.id for favorite in await get_favorites_all(db, user_id=user.id)] == [existing_id]
+    assert [favorite.id for favorite in await get_favorites_all(db, user_id=other.id)] == [other_id]
+
+@pytest.mark.asyncio
+async def test_add_favorite_user_not_found(db: AsyncSession):
     """
     異常系: 存在しないユーザーIDでお気に入りを追加しようとするテスト
 
@@ -162,11 +294,27 @@ def test_add_favorite_user_not_found(db: Session):
     "ユーザーが存在しないため、お気に入り登録できません"という詳細メッセージが返る
     """
     with pytest.raises(HTTPException) as exc_info:
-        add_favorite(db, user_id=9999, activity_id="activity_1", activity_title="Test Activity")
+        await add_favorite(db, user_id=9999, activity_id="activity_1", activity_title="Test Activity")
     assert exc_info.value.status_code == 404
     assert exc_info.value.detail == "ユーザーが存在しないため、お気に入り登録できません"
 
-def test_get_favorites_all(db: Session):
+@pytest.mark.asyncio
+async def test_add_favorites_user_not_found(db: AsyncSession):
+    """
+    異常系: 存在しないユーザーIDでお気に入りを一括登録しようとするテスト
+
+    GIVEN: 存在しないユーザーID(外部キー制約に依存しない)
+    WHEN: お気に入りを一括登録
+    THEN: 404となり、お気に入りは登録されない
+    """
+    with pytest.raises(HTTPException) as exc_info:
+        await add_favorites(db, 9999, [FavoriteCreate(activity_id="1", activity_title="First")])
+    assert exc_info.value.status_code == 404
+    assert exc_info.value.detail == "ユーザーが存在しないため、お気に入り登録できません"
+    assert await get_favorites_all(db, user_id=9999) == []
+
+@pytest.mark.asyncio
+async def test_get_favorites_all(db: AsyncSession):
     """
     正常系: お気に入りの取得テスト
 
@@ -175,13 +323,14 @@ def test_get_favorites_all(db: Session):
     THEN: お気に入り1件が取得される
     """
     user_data = UserCreate(username="testuser", password="password123")
-    user = create_user(db, user=user_data)
-    add_favorite(db, user_id=user.id, activity_id="activity_1", activity_title="Test Activity")
+    user = await create_user(db, user=user_data, hashed_password=HASHED_PASSWORD)
+    await add_favorite(db, user_id=user.id, activity_id="activity_1", activity_title="Test Activity")
 
-    favorites = get_favorites_all(db, user_id=user.id)
+    favorites = await get_favorites_all(db, user_id=user.id)
     assert len(favorites) == 1
 
-def test_get_favorites_all_no_favorites(db: Session):
+@pytest.mark.asyncio
+async def test_get_favorites_all_no_favorites(db: AsyncSession):
     """
     異常系: お気に入りが存在しないユーザーの取得テスト
 
@@ -190,12 +339,13 @@ def test_get_favorites_all_no_favorites(db: Session):
     THEN:空のリストを返す
     """
     user_data = UserCreate(username="testuser", password="password123")
-    user = create_user(db, user=user_data)
+    user = await create_user(db, user=user_data, hashed_password=HASHED_PASSWORD)
 
-    favorites = get_favorites_all(db, user_id=user.id)
+    favorites = await get_favorites_all(db, user_id=user.id)
     assert len(favorites) == 0
 
-def test_delete_favorite(db: Session):
+@pytest.mark.asyncio
+async def test_delete_favorite(db: AsyncSession):
     """
     正常系: お気に入り削除のテスト
 
@@ -205,15 +355,16 @@ def test_delete_favorite(db: Session):
     4. お気に入りの取得テスト
     """
     user_data = UserCreate(username="testuser", password="password123")
-    user = create_user(db, user=user_data)
-    favorite_id = add_favorite(db, user_id=user.id, activity_id="activity_1", activity_title="Test Activity")
+    user = await create_user(db, user=user_data, hashed_password=HASHED_PASSWORD)
+    favorite_id = await add_favorite(db, user_id=user.id, activity_id="activity_1", activity_title="Test Activity")
 
-    delete_favorite(db, favorite_id=favorite_id, user_id=user.id)
+    await delete_favorite(db, favorite_id=favorite_id, user_id=user.id)
 
-    favorites = get_favorites_all(db, user_id=user.id)
+    favorites = await get_favorites_all(db, user_id=user.id)
     assert len(favorites) == 0
 
-def test_delete_favorite_not_found(db: Session):
+@pytest.mark.asyncio
+async def test_delete_favorite_not_found(db: AsyncSession):
     """
     異常系: 存在しないお気に入りIDで削除しようとするテスト
 
@@ -223,9 +374,250 @@ def test_delete_favorite_not_found(db: Session):
     "お気に入りデータが見つかりませんでした"という詳細メッセージが返る
     """
     user_data = UserCreate(username="testuser", password="password123")
-    user = create_user(db, user=user_data)
+    user = await create_user(db, user=user_data, hashed_password=HASHED_PASSWORD)
 
     with pytest.raises(HTTPException) as exc_info:
-        delete_favorite(db, favorite_id=9999, user_id=user.id)
+        await delete_favorite(db, favorite_id=9999, user_id=user.id)
     assert exc_info.value.status_code == 404
-    assert exc_info.value.detail == "お気に入りデータが見つかりませんでした"
\ No newline at end of file
+    assert exc_info.value.detail == "お気に入りデータが見つかりませんでした"
+
+@pytest.mark.asyncio
+async def test_save_and_get_activity_snapshots(db: AsyncSession):
+    """
+    正常系: 更新情報テーブルへの保存と取得のテスト
+
+    GIVEN: UI表示形式の更新情報
+    WHEN: 保存後に、保存済み・未保存の更新情報IDで取得を実行
+    THEN: 保存済みの更新情報のみ取得され、再保存時は上書きされる
+    """
+    activity = {
+        "id": 100,
+        "project_name": "Test Project",
+        "type": "1",
+        "type_name": "課題の追加",
+        "content_summary": "Test Summary",
+        "created_user_name": "Test User",
+        "created": "2024-09-07 20:08:06",
+    }
+    await save_activity_snapshots(db, [activity])
+
+    snapshots = await get_activity_snapshots(db, ["100", "200", "activity_1"])
+    assert snapshots == {100: activity}
+
+    await save_activity_snapshots(db, [{**activity, "content_summary": "Updated"}])
+    assert (await get_activity_snapshots(db, ["100"]))[100]["content_summary"] == "Updated"
+
+@pytest.mark.asyncio
+async def test_save_activity_snapshots_keeps_synced_raw(db: AsyncSession):
+    """
+    正常系: 同期済みの更新情報を上書き保存しても検索用の項目が保持されるテスト
+
+    GIVEN: 同期処理で保存された更新情報
+    WHEN: 別のセッションから同じ更新情報IDをUI表示形式で保存
+    THEN: 主キーが重複せずに上書きされ、同期処理で保存した検索用の項目は保持される
+    """
+    raw = {"id": 100, "content": {"summary": "ログイン不具合"}}
+    activity = {
+        "id": 100,
+        "project_name": "Test Project",
+        "type": "1",
+        "type_name": "課題の追加",
+        "content_summary": "ログイン不具合",
+        "created_user_name": "Test User",
+        "created": "2024-09-07 20:08:06",
+    }
+    await save_synced_activities(db, "example.backlog.com", [activity], [raw], last_activity_id=100)
+
+    async with TestingSessionLocal() as other:
+        await save_activity_snapshots(other, [{**activity, "content_summary": "Updated"}, activity])
+
+    assert (await get_activity_snapshots(db, ["100"]))[100]["content_summary"] == "ログイン不具合"
+    matched, _ = await search_stored_activities(db, "example.backlog.com", "ログイン", limit=10)
+    assert [activity["id"] for activity in matched] == [100]
+
+@pytest.mark.asyncio
+async def test_add_favorite_with_activity(db: AsyncSession):
+    """
+    正常系: 更新情報を指定したお気に入り追加のテスト
+
+    GIVEN: ユーザーが存在する
+    WHEN: UI表示形式の更新情報を指定してお気に入りを追加
+    THEN: 更新情報テーブルにも保存される
+    """
+    user_data = UserCreate(username="testuser", password="password123")
+    user = await create_user(db, user=user_data, hashed_password=HASHED_PASSWORD)
+    activity = {
+        "id": 100,
+        "project_name": "Test Project",
+        "type": "1",
+        "type_name": "課題の追加",
+        "content_summary": "Test Summary",
+        "created_user_name": "Test User",
+        "created": "2024-09-07 20:08:06",
+    }
+
+    await add_favorite(db, user_id=user.id, activity_id="100", activity_title="Test Activity", activity=activity)
+
+    assert await get_activity_snapshots(db, ["100"]) == {100: activity}
+
+@pytest.mark.asyncio
+async def test_search_stored_activities(db: AsyncSession):
+    """
+    正常系: 同期済みの更新情報の検索テスト
+
+    GIVEN: 同期済みの更新情報が3件(うち2件がキーワードに一致)
+    WHEN: 1件ずつキーワード検索を実行
+    THEN: 新しい順に取得され、続きがある場合は次ページのmax_idが返る
+    """
+    raws = [
+        {"id": activity_id, "content": {"summary": summary}}
+        for activity_id, summary in [(1, "ログイン不具合"), (2, "その他"), (3, "ログイン画面")]
+    ]
+    activities = [
+        {
+            "id": raw["id"],
+            "project_name": "Test Project",
+            "type": "1",
+            "type_name": "課題の追加",
+            "content_summary": raw["content"]["summary"],
+            "created_user_name": "Test User",
+            "created": "2024-09-07 20:08:06",
+        }
+        for raw in raws
+    ]
+    await save_synced_activities(db, "example.backlog.com", activities, raws, last_activity_id=3)
+
+    first_page, next_max_id = await search_stored_activities(db, "example.backlog.com", "ログイン", limit=1)
+    assert [activity["id"] for activity in first_page] == [3]
+    assert next_max_id == 3
+
+    second_page, next_max_id = await search_stored_activities(db, "example.backlog.com", "ログイン", limit=1, max_id=next_max_id)
+    assert [activity["id"] for activity in second_page] == [1]
+    assert next_max_id is None
+
+@pytest.mark.asyncio
+async def test_search_stored_activities_line_break(db: AsyncSession):
+    """
+    異常系: 改行を含むキーワードでの同期済みの更新情報の検索テスト
+
+    GIVEN: 改行(項目区切り文字)を含むキーワード
+    WHEN: 検索を実行
+    THEN: 複数の項目にまたがって一致しないよう、ValueErrorとなる
+    """
+    with pytest.raises(ValueError):
+        await search_stored_activities(db, "example.backlog.com", ["ログイン", "不具合\nその他"], limit=10)
+
+@pytest.mark.asyncio
+async def test_search_stored_activities_visible_projects(db: AsyncSession):
+    """
+    正常系: 参照できるプロジェクトで絞り込む同期済みの更新情報の検索テスト
+
+    GIVEN: 2つのプロジェクトの同期済みの更新情報
+    WHEN: 参照できるプロジェクトIDを指定して検索を実行
+    THEN: 参照できるプロジェクトの更新情報のみ返り、参照できるプロジェクトがない場合は空になる
+    """
+    raws = [
+        {"id": activity_id, "project": {"id": project_id}, "content": {"summary": "ログイン不具合"}}
+        for activity_id, project_id in [(1, 10), (2, 20), (3, 10)]
+    ]
+    activities = [
+        {
+            "id": raw["id"],
+            "project_name": "Test Project",
+            "type": "1",
+            "type_name": "課題の追加",
+            "content_summary": raw["content"]["summary"],
+            "created_user_name": "Test User",
+            "created": "2024-09-07 20:08:06",
+        }
+        for raw in raws
+    ]
+    await save_synced_activities(db, "example.backlog.com", activities, raws, last_activity_id=3)
+
+    matched, _ = await search_stored_activities(db, "example.backlog.com", "ログイン", limit=10, project_ids={10})
+    assert [activity["id"] for activity in matched] == [3, 1]
+
+    matched, _ = await search_stored_activities(db, "example.backlog.com", None, limit=10, project_ids=frozenset())
+    assert matched == []
+
+@pytest.mark.asyncio
+async def test_search_stored_activities_normalize_and_fields(db: AsyncSession, monkeypatch):
+    """
+    正常系: キーワードの正規化方法・検索対象の項目を指定した同期済みの更新情報の検索テスト
+
+    GIVEN: ACTIVITY_SEARCH_NORMALIZE=nfkc、ACTIVITY_SEARCH_FIELDS=content.summaryで同期した更新情報
+    WHEN: 大文字・全角のキーワード、検索対象外の項目のキーワードで検索を実行
+    THEN: Backlog APIから検索する場合と同じく、正規化して検索対象の項目のみ一致する
+    """
+    monkeypatch.setattr(Configs, "ACTIVITY_SEARCH_NORMALIZE", "nfkc")
+    monkeypatch.setattr(Configs, "ACTIVITY_SEARCH_FIELDS", ["content.summary"])
+    raw = {"id": 1, "content": {"summary": "Login画面"}, "createdUser": {"name": "Tanaka"}}
+    activity = {
+        "id": 1,
+        "project_name": "Test Project",
+        "type": "1",
+        "type_name": "課題の追加",
+        "content_summary": "Login画面",
+        "created_user_name": "Tanaka",
+        "created": "2024-09-07 20:08:06",
+    }
+    await save_synced_activities(db, "example.backlog.com", [activity], [raw], last_activity_id=1)
+
+    matched, _ = await search_stored_activities(db, "example.backlog.com", "ＬＯＧＩＮ", limit=10)
+    assert [activity["id"] for activity in matched] == [1]
+    assert compile_keyword("ＬＯＧＩＮ", normalize="nfkc", fields=["content.summary"]).match(raw)
+
+    matched, _ = await search_stored_activities(db, "example.backlog.com", "Tanaka", limit=10)
+    assert matched == []
+    assert not compile_keyword("Tanaka", normalize="nfkc", fields=["content.summary"]).match(raw)
+
+@pytest.mark.asyncio
+async def test_search_stored_activities_multiple_keywords(db: AsyncSession, monkeypatch):
+    """
+    正常系: 同期済みの更新情報の複数キーワード検索テスト
+
+    GIVEN: 同期済みの更新情報が3件
+    WHEN: 複数キーワードでAND・OR検索を実行
+    THEN: ANDはすべてのキーワード、ORはいずれかのキーワードを含む更新情報が返る
+    """
+    raws = [
+        {"id": activity_id, "content": {"summary": summary}, "createdUser": {"name": name}}
+        for activity_id, summary, name in [(1, "ログイン不具合", "田中"), (2, "その他", "佐藤"), (3, "ログイン画面", "佐藤")]
+    ]
+    activities = [
+        {
+            "id": raw["id"],
+            "project_name": "Test Project",
+            "type": "1",
+            "type_name": "課題の追加",
+            "content_summary": raw["content"]["summary"],
+            "created_user_name": raw["createdUser"]["name"],
+            "created": "2024-09-07 20:08:06",
+        }
+        for raw in raws
+    ]
+    await save_synced_activities(db, "example.backlog.com", activities, raws, last_activity_id=3)
+
+    matched, _ = await search_stored_activities(db, "example.backlog.com", ["ログイン", "佐藤"], limit=10)
+    assert [activity["id"] for activity in matched] == [3]
+
+    matched, _ = await search_stored_activities(db, "example.backlog.com", ["不具合", "その他"], limit=10, match="any")
+    assert [activity["id"] for activity in matched] == [2, 1]
+
+    # 検索構文のキーワード以外の条件はSQLで絞り込む
+    matched, _ = await search_stored_activities(
+        db, "example.backlog.com", None, limit=10,
+        search_query=parse_query('user:佐藤 after:2024-09-07 "ログイン"'),
+    )
+    assert [activity["id"] for activity in matched] == [3]
+    matched, _ = await search_stored_activities(db, "example.backlog.com", None, limit=10, search_query=parse_query("type:2"))
+    assert matched == []
+
+    # 登録日の日付はユーザのタイムゾーンの0時(2024-09-08 0時(UTC+14) = 2024-09-07 19時(Asia/Tokyo))
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    matched, _ = await search_stored_activities(db, "example.backlog.com", None, limit=10, search_query=parse_query("before:2024-09-08"))
+    assert [activity["id"] for activity in matched] == [3, 2, 1]
+    matched, _ = await search_stored_activities(
+        db, "example.backlog.com", None, limit=10, search_query=parse_query("before:2024-09-08"), tz_name="Pacific/Kiritimati",
+    )
+    assert matched == []
@@ -0,0 +1,149 @@
+# test_keyword_matcher.py
+import pytest, sys, os
+from collections import OrderedDict
+
+# /appディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from keyword_matcher import compile_keyword, AhoCorasick, MultiKeywordMatcher, MATCH_ALL, MATCH_ANY
+
+ACTIVITY = {
+    "id": 1,
+    "project": {"name": "テストプロジェクト", "projectKey": "TEST"},
+    "content": {
+        "summary": "ログイン画面の不具合",
+        "comment": {"content": "ＡＢＣ対応をお願いします"},
+        "changes": [{"field": "status", "new_value": "2"}],
+    },
+    "createdUser": {"name": "Tanaka", "nulabAccount": {"iconUrl": "https://example.com/login.png"}},
+}
+
+def test_match_all_fields():
+    """
+    正常系: 項目を指定しない場合はすべてのテキスト項目を検索する
+
+    GIVEN: ネストされた更新情報
+    WHEN: キーワードの判定を実行
+    THEN: どの階層のテキスト項目に一致してもTrue、数値やNoneは対象外
+    """
+    assert compile_keyword("ログイン").match(ACTIVITY)
+    assert compile_keyword("status").match(ACTIVITY)
+    assert not compile_keyword("notfound").match(ACTIVITY)
+    assert not compile_keyword("1").match({"id": 1, "value": None})
+    assert compile_keyword(None).match(ACTIVITY)
+
+def test_match_fields_allow_list():
+    """
+    正常系: 検索対象の項目を指定した場合は、その項目のみを検索する
+
+    GIVEN: content.summaryとproject(配下すべて)を指定
+    WHEN: キーワードの判定を実行
+    THEN: アイコンのURLやchangesの値には一致しない
+    """
+    matcher = compile_keyword("login", fields=["content.summary", "project"])
+    assert not matcher.match(ACTIVITY)
+    assert compile_keyword("TEST", fields=["content.summary", "project"]).match(ACTIVITY)
+    assert not compile_keyword("status", fields=["content.summary", "content.changes.new_value"]).match(ACTIVITY)
+    assert compile_keyword("2", fields=["content.changes.new_value"]).match(ACTIVITY)
+
+def test_match_normalize():
+    """
+    正常系: 正規化を指定した場合は、大文字・小文字や全角・半角を区別しない
+
+    GIVEN: 正規化方法(casefold・nfkc)
+    WHEN: キーワードの判定を実行
+    THEN: casefoldは大文字・小文字のみ、nfkcは全角・半角も同一視する
+    """
+    assert not compile_keyword("tanaka").match(ACTIVITY)
+    assert compile_keyword("tanaka", normalize="casefold").match(ACTIVITY)
+    assert not compile_keyword("abc", normalize="casefold").match(ACTIVITY)
+    assert compile_keyword("abc", normalize="nfkc").match(ACTIVITY)
+
+    with pytest.raises(ValueError):
+        compile_keyword("abc", normalize="unknown")
+
+def test_filter_keeps_order():
+    """
+    正常系: 更新情報リストをまとめて判定する
+
+    GIVEN: 更新情報リスト
+    WHEN: filterを実行
+    THEN: 一致した更新情報のみが元の順序で返る
+    """
+    activities = [{"id": i, "content": {"summary": summary}} for i, summary in enumerate(["不具合A", "仕様", "不具合B"])]
+    assert [a["id"] for a in compile_keyword("不具合").filter(activities)] == [0, 2]
+    assert compile_keyword(None).filter(activities) == activities
+
+def test_aho_corasick_scan():
+    """
+    正常系: Aho–Corasick法による複数キーワードの同時検索
+
+    GIVEN: 重なり合うキーワード(he, she, his, hers)
+    WHEN: テキストを走査
+    THEN: テキストに含まれるキーワードのビット集合が返る
+    """
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    assert automaton.scan("ushers") == 0b1011
+    assert automaton.scan("this") == 0b0100
+    assert automaton.contains_any("ahis")
+    assert not automaton.contains_any("xyz")
+
+def test_match_multiple_keywords():
+    """
+    正常系: 複数キーワードのAND・OR検索
+
+    GIVEN: 別々の項目に含まれるキーワード
+    WHEN: AND(既定)・ORでキーワードの判定を実行
+    THEN: ANDはすべてのキーワード、ORはいずれかのキーワードを含む場合にTrue
+    """
+    matcher = compile_keyword(["ログイン", "Tanaka"])
+    assert isinstance(matcher, MultiKeywordMatcher)
+    assert matcher.match(ACTIVITY)
+    assert not compile_keyword(["ログイン", "Sato"]).match(ACTIVITY)
+    assert compile_keyword(["ログイン", "Sato"], match=MATCH_ANY).match(ACTIVITY)
+    assert not compile_keyword(["Suzuki", "Sato"], match=MATCH_ANY).match(ACTIVITY)
+    assert compile_keyword(["tanaka", "ａｂｃ"], normalize="nfkc").match(ACTIVITY)
+    assert not compile_keyword(["ログイン", "login"], fields=["content.summary"]).match(ACTIVITY)
+
+    # キーワードが1つの場合は、単一キーワードの判定と同じ結果になる
+    assert compile_keyword(["ログイン"]).match(ACTIVITY) == compile_keyword("ログイン").match(ACTIVITY)
+
+@pytest.mark.parametrize("keywords, normalize", [
+    (["zzz", "zzz"], None),
+    (["ZZZ", "zzz"], "casefold"),
+])
+@pytest.mark.parametrize("match", [MATCH_ALL, MATCH_ANY])
+def test_match_duplicate_keywords(keywords, normalize, match):
+    """
+    異常系: 重複したキーワード(正規化後に同じになるものを含む)の判定
+
+    GIVEN: 更新情報に含まれない、重複したキーワード
+    WHEN: AND・ORでキーワードの判定を実行
+    THEN: 空文字のキーワードとして扱われず、一致しない(含まれるキーワードの重複は一致する)
+    """
+    assert not compile_keyword(keywords, match=match, normalize=normalize).match(ACTIVITY)
+    assert compile_keyword(["TANAKA", "tanaka"], match=match, normalize="casefold").match(ACTIVITY)
+
+def test_match_json_subclasses():
+    """
+    正常系: str・dict・listのサブクラスも検索対象とする
+
+    GIVEN: OrderedDict・listのサブクラス・strのサブクラスを含む更新情報
+    WHEN: 単一・複数キーワードの判定を実行
+    THEN: 組み込み型の場合と同じ結果になる
+    """
+    class Text(str):
+        pass
+
+    class Items(list):
+        pass
+
+    activity = OrderedDict(
+        project=OrderedDict(name=Text("テストプロジェクト")),
+        content={"summary": Text("ログイン画面の不具合"), "changes": Items([{"new_value": Text("2")}])},
+    )
+    assert compile_keyword("ログイン").match(activity)
+    assert compile_keyword("ログイン", fields=["content.summary"]).match(activity)
+    assert compile_keyword("2", fields=["content.changes.new_value"]).match(activity)
+    assert compile_keyword(["テスト", "ログイン"]).match(activity)
+    assert compile_keyword(["テスト", "ログイン"], fields=["project", "content.summary"]).match(activity)
+    assert not compile_keyword(["テスト", "notfound"]).match(activity)
@@ -0,0 +1,287 @@
+# test_main.py
+import pytest, sys, os, json
+from unittest.mock import patch, AsyncMock
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+# /appディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from main import app, get_db
+from models import User
+import auth, utils
+
+@pytest.fixture
+def db():
+    return AsyncMock(AsyncSession)
+
+@pytest.fixture
+def client(db):
+    app.dependency_overrides[auth.get_current_user] = lambda: User(id=1, user_nm="testuser", backlog_access_token="access")
+    app.dependency_overrides[get_db] = lambda: db
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+def make_activity(activity_id, summary):
+    return {
+        "id": activity_id,
+        "project": {"name": "Test Project"},
+        "type": 1,
+        "content": {"summary": summary},
+        "createdUser": {"name": "Test User"},
+        "created": "2024-09-07T11:08:06Z",
+    }
+
+def test_search_activities_ndjson(client):
+    """
+    正常系: NDJSON形式の更新情報検索のテスト
+
+    GIVEN: Acceptヘッダにapplication/x-ndjsonを指定
+    WHEN: 更新情報検索を実行
+    THEN: キーワードに一致した更新情報が1行ずつ返る
+    """
+    page = [make_activity(3, "ログイン不具合"), make_activity(2, "その他"), make_activity(1, "ログイン画面")]
+
+    with patch("backlog.get_backlog_json", return_value=page):
+        response = client.get(
+            "/activities/search",
+            params={"keyword": "ログイン"},
+            headers={"Accept": "application/x-ndjson"},
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [3, 1]
+    assert lines[0]["content_summary"] == "ログイン不具合"
+
+def test_search_activities_sse(client):
+    """
+    正常系: SSE形式の更新情報検索のテスト
+
+    GIVEN: Acceptヘッダにtext/event-streamを指定
+    WHEN: 更新情報検索を実行
+    THEN: activityイベントで更新情報が返り、最後にendイベントが返る
+    """
+    page = [make_activity(3, "ログイン不具合")]
+
+    with patch("backlog.get_backlog_json", return_value=page):
+        response = client.get("/activities/search", headers={"Accept": "text/event-stream"})
+
+    assert response.status_code == 200
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [event[0] for event in events] == ["event: activity", "event: end"]
+    assert json.loads(events[0][1][len("data: "):])["id"] == 3
+    assert json.loads(events[1][1][len("data: "):]) == {"next_cursor": None}
+
+def test_search_activities_multiple_keywords(client):
+    """
+    正常系: 複数キーワードの更新情報検索のテスト
+
+    GIVEN: keywordを複数指定
+    WHEN: match=all(既定)・match=anyで更新情報検索を実行
+    THEN: allはすべてのキーワード、anyはいずれかのキーワードを含む更新情報が返る
+    """
+    page = [make_activity(3, "ログイン不具合"), make_activity(2, "検索の不具合"), make_activity(1, "ログイン画面")]
+
+    with patch("backlog.get_backlog_json", return_value=page):
+        matched_all = client.get("/activities/search", params=[("keyword", "ログイン"), ("keyword", "不具合")])
+        matched_any = client.get("/activities/search", params=[("keyword", "検索"), ("keyword", "画面"), ("match", "any")])
+        invalid = client.get("/activities/search", params=[("keyword", "検索"), ("match", "xor")])
+
+    assert [activity["id"] for activity in matched_all.json()] == [3]
+    assert [activity["id"] for activity in matched_any.json()] == [2, 1]
+    assert invalid.status_code == 422
+
+def test_search_activities_query_syntax(client):
+    """
+    正常系・異常系: 検索構文(q)による更新情報検索のテスト
+
+    GIVEN: プロジェクト・更新種別・フレーズを含む検索構文
+    WHEN: 更新情報検索を実行
+    THEN: プロジェクトの最近の更新をactivityTypeId[]付きで取得し、フレーズに一致する更新情報が返る
+          検索構文が不正な場合は400が返る
+    """
+    page = [make_activity(3, "login bug fixed"), make_activity(2, "login page")]
+
+    with patch("backlog.get_backlog_json", return_value=page) as mock_get:
+        response = client.get("/activities/search", params={"q": 'project:FOO type:1 "login bug"'})
+    invalid = client.get("/activities/search", params={"q": "type:abc"})
+
+    assert [activity["id"] for activity in response.json()] == [3]
+    url, params, _ = mock_get.call_args.args
+    assert url == "/projects/FOO/activities"
+    assert params["activityTypeId[]"] == [1]
+    assert invalid.status_code == 400
+
+def test_search_activities_user_timezone(client):
+    """
+    正常系: ユーザのタイムゾーンで日時を返すテスト
+
+    GIVEN: タイムゾーン(UTC)を設定したユーザ
+    WHEN: 更新情報検索を実行
+    THEN: 環境変数のタイムゾーンではなく、ユーザのタイムゾーンの日時が返る
+    """
+    app.dependency_overrides[auth.get_current_user] = lambda: User(id=2, user_nm="utcuser", backlog_access_token="access", timezone="UTC")
+    page = [make_activity(3, "ログイン不具合")]
+
+    with patch("backlog.get_backlog_json", return_value=page):
+        response = client.get("/activities/search")
+
+    assert response.json()[0]["created"] == "2024-09-07 11:08:06"
+
+def test_search_activities_serves_stale_when_backlog_down(client):
+    """
+    異常系: Backlog APIの障害時のテスト
+
+    GIVEN: 正常に検索できた後にBacklog APIが503を返す
+    WHEN: 同じ条件で更新情報検索を実行
+    THEN: 直近の正常なレスポンスがX-Cache-Status: staleヘッダ付きで返る
+    """
+    page = [make_activity(3, "ログイン不具合")]
+
+    with patch("backlog.get_backlog_json", return_value=page):
+        fresh = client.get("/activities/search", params={"keyword": "ログイン"})
+    assert fresh.status_code == 200
+    assert "X-Cache-Status" not in fresh.headers
+
+    error = HTTPException(status_code=503, detail="Backlog APIが利用できません")
+    with patch("backlog.get_backlog_json", side_effect=error), \
+         patch("main.stale_cache.revalidate") as mock_revalidate:
+        stale = client.get("/activities/search", params={"keyword": "ログイン"})
+
+    assert stale.status_code == 200
+    assert stale.headers["X-Cache-Status"] == "stale"
+    assert stale.json() == fresh.json()
+    mock_revalidate.assert_called_once()
+
+def test_token_busy_returns_503(client):
+    """
+    異常系: パスワードハッシュの処理待ちが上限に達した場合のログインのテスト
+
+    GIVEN: パスワードハッシュの処理待ちが上限に達している
+    WHEN: トークンを取得
+    THEN: 503とRetry-Afterが返る
+    """
+    from password_hasher import PasswordHasherBusy
+    user = User(id=1, user_nm="testuser", pw_hash="hash")
+    with patch("auth.get_user_by_username", return_value=user), \
+         patch("auth.password_hasher.verify_and_update", side_effect=PasswordHasherBusy(3)):
+        response = client.post("/token", data={"username": "testuser", "password": "password123"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+
+def test_token_rehashes_on_cost_change(client, db):
+    """
+    正常系: ハッシュのコストが設定と異なる場合のログインのテスト
+
+    GIVEN: 設定と異なるコストでハッシュ化されたパスワード
+    WHEN: トークンを取得
+    THEN: トークンが返り、新しいハッシュが保存される
+    """
+    user = User(id=1, user_nm="testuser", pw_hash="old")
+    with patch("auth.get_user_by_username", return_value=user), \
+         patch("auth.password_hasher.verify_and_update", return_value=(True, "new")), \
+         patch("auth.update_user_password_hash") as update_hash:
+        response = client.post("/token", data={"username": "testuser", "password": "password123"})
+
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+    update_hash.assert_called_once_with(db, 1, "new")
+
+def test_favorites_bulk(client, db):
+    """
+    正常系・異常系: お気に入りの一括登録・一括削除のテスト
+
+    GIVEN: 登録・削除するお気に入りのリスト
+    WHEN: POST・DELETE /favorites/bulkを実行
+    THEN: お気に入りIDのリストが返り(DELETEは/favorites/{favorite_id}と解釈されない)、上限を超える場合は422が返る
+    """
+    with patch("crud.add_favorites", return_value=[10, 11]) as add_favorites, \
+         patch("backlog.cache_activity_snapshots") as cache_snapshots:
+        response = client.post("/favorites/bulk", json={"favorites": [
+            {"activity_id": "1", "activity_title": "First"},
+            {"activity_id": "2", "activity_title": "Second"},
+        ]})
+    assert response.status_code == 200
+    assert response.json()["favorite_ids"] == [10, 11]
+    assert [favorite.activity_id for favorite in add_favorites.call_args.args[2]] == ["1", "2"]
+    assert cache_snapshots.call_args.args[0] == ["1", "2"]
+
+    with patch("crud.delete_favorites", return_value=[10]) as delete_favorites:
+        response = client.request("DELETE", "/favorites/bulk", json={"favorite_ids": [10, 12]})
+    assert response.status_code == 200
+    assert response.json()["favorite_ids"] == [10]
+    delete_favorites.assert_called_once_with(db, [10, 12], 1)
+
+    response = client.request("DELETE", "/favorites/bulk", json={"favorite_ids": list(range(501))})
+    assert response.status_code == 422
+
+def test_metrics_requires_login(client):
+    """
+    異常系: メトリクス取得の認証のテスト
+
+    GIVEN: 認証トークンを指定しない
+    WHEN: メトリクス取得を実行
+    THEN: 401が返り、ログイン済みの場合のみ取得できる
+    """
+    app.dependency_overrides.pop(auth.get_current_user)
+    response = client.get("/metrics")
+    assert response.status_code == 401
+
+    app.dependency_overrides[auth.get_current_user] = lambda: User(id=1, user_nm="testuser")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+
+@pytest.mark.parametrize("position", [{"maxId": "abc"}, {"maxId": 10, "minId": "1 OR 1=1"}, {"maxId": 10, "minId": 1.5}, {"maxId": None}])
+def test_search_activities_invalid_cursor(client, position):
+    """
+    異常系: 取得位置が整数でないカーソルのテスト
+
+    GIVEN: maxId・minIdが整数でないカーソル
+    WHEN: 更新情報検索を実行
+    THEN: 400 Invalid cursorが返り、Backlog APIは呼び出されない
+    """
+    with patch("backlog.get_backlog_json") as mock_get:
+        response = client.get("/activities/search", params={"keyword": "ログイン", "cursor": utils.encode_cursor(position)})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+    mock_get.assert_not_called()
+
+@pytest.mark.parametrize("sync_enabled", [False, True])
+def test_search_activities_rejects_line_breaks(client, monkeypatch, sync_enabled):
+    """
+    異常系: 改行を含むキーワードのテスト
+
+    GIVEN: 改行を含むキーワード(同期処理の有効・無効)
+    WHEN: 更新情報検索を実行
+    THEN: どちらの検索でも400が返る
+    """
+    monkeypatch.setattr("main.Configs.ACTIVITY_SYNC_ENABLED", sync_enabled)
+    with patch("backlog.get_backlog_json") as mock_get:
+        response = client.get("/activities/search", params={"keyword": "ログイン\n不具合"})
+
+    assert response.status_code == 400
+    mock_get.assert_not_called()
+
+def test_search_activities_stored_only_visible_projects(client, db, monkeypatch):
+    """
+    正常系: 同期済みの更新情報の検索で、ログインユーザが参照できるプロジェクトのみ検索するテスト
+
+    GIVEN: 同期処理が有効
+    WHEN: 更新情報検索を実行
+    THEN: ログインユーザのトークンで取得した参照できるプロジェクトIDで絞り込んで検索する
+    """
+    monkeypatch.setattr("main.Configs.ACTIVITY_SYNC_ENABLED", True)
+    with patch("backlog.get_visible_project_ids", return_value=frozenset({10})) as get_project_ids, \
+         patch("crud.search_stored_activities", return_value=([], None)) as search_stored:
+        response = client.get("/activities/search", params={"keyword": "ログイン"})
+
+    assert response.status_code == 200
+    assert get_project_ids.call_args.args[0].id == 1
+    assert search_stored.call_args.kwargs["project_ids"] == frozenset({10})
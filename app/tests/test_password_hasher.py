@@ -0,0 +1,78 @@
+# test_password_hasher.py
+import pytest, sys, os, asyncio
+from passlib.hash import bcrypt
+
+# /appディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from password_hasher import PasswordHasher, PasswordHasherBusy
+from utils import verify_password
+import metrics
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(max_workers=1, max_queue=0)
+    yield hasher
+    hasher.shutdown()
+
+@pytest.mark.asyncio
+async def test_hash_and_verify(hasher):
+    """
+    正常系: プロセスプールでハッシュ化・検証するテスト
+
+    GIVEN: パスワードハッシュ用のプロセスプール
+    WHEN: パスワードをハッシュ化して検証
+    THEN: 正しいパスワードのみ検証に成功し、ハッシュ処理時間が記録される
+    """
+    metrics.reset()
+    hashed_password = await hasher.hash("password123")
+
+    assert verify_password("password123", hashed_password)
+    assert await hasher.verify_and_update("password123", hashed_password) == (True, None)
+    assert await hasher.verify_and_update("wrongpassword", hashed_password) == (False, None)
+    assert "password.hash" in metrics.snapshot()["timings"]
+
+@pytest.mark.asyncio
+async def test_rehash_on_cost_change(hasher):
+    """
+    正常系: ハッシュのコストが設定と異なる場合に再ハッシュするテスト
+
+    GIVEN: 設定と異なるコストでハッシュ化されたパスワード
+    WHEN: verify_and_updateを実行
+    THEN: 検証に成功し、設定のコストでハッシュし直した値が返る
+    """
+    hashed_password = bcrypt.using(rounds=4).hash("password123")
+
+    verified, new_hash = await hasher.verify_and_update("password123", hashed_password)
+
+    assert verified
+    assert new_hash and new_hash != hashed_password
+    assert verify_password("password123", new_hash)
+
+@pytest.mark.asyncio
+async def test_reject_when_saturated(hasher):
+    """
+    異常系: 処理待ちが上限に達した場合に待たずに拒否するテスト
+
+    GIVEN: プロセス数1・処理待ち0のプロセスプール
+    WHEN: 同時に2件ハッシュ化
+    THEN: 1件は成功し、もう1件はPasswordHasherBusy(Retry-Afterの秒数付き)となる
+    """
+    results = await asyncio.gather(hasher.hash("password123"), hasher.hash("password456"), return_exceptions=True)
+
+    busy = [result for result in results if isinstance(result, PasswordHasherBusy)]
+    assert len(busy) == 1
+    assert busy[0].retry_after >= 1
+    assert hasher._inflight == 0
+
+def test_start_uses_forkserver_and_warms_up(hasher):
+    """
+    正常系: プロセスプールの起動方法と起動直後の準備のテスト
+
+    GIVEN: パスワードハッシュ用のプロセスプール
+    WHEN: startを実行
+    THEN: forkではなくforkserver(またはspawn)でワーカープロセスが起動される
+    """
+    hasher.start()
+
+    assert hasher._executor._mp_context.get_start_method() in ("forkserver", "spawn")
+    assert hasher._executor.submit(os.getpid).result(timeout=30) != os.getpid()
@@ -0,0 +1,91 @@
+# test_scheduler.py
+import pytest, sys, os, asyncio, time
+from unittest.mock import MagicMock
+
+# /appディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from scheduler import BacklogScheduler, QuotaExhausted, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+def make_response(status_code=200, headers=None):
+    return MagicMock(status_code=status_code, headers=headers or {})
+
+@pytest.mark.asyncio
+async def test_run_records_rate_limit_and_defers_background():
+    """
+    正常系: レート制限の残数が少ない場合のテスト
+
+    GIVEN: X-RateLimit-Remainingが予約数以下のレスポンス
+    WHEN: バックグラウンド・ユーザ操作のリクエストを実行
+    THEN: バックグラウンドは拒否され、ユーザ操作のリクエストは実行される
+    """
+    scheduler = BacklogScheduler(background_reserve=5, max_wait=1)
+    reset_at = time.time() + 60
+    response = make_response(headers={"X-RateLimit-Limit": "600", "X-RateLimit-Remaining": "3", "X-RateLimit-Reset": str(reset_at)})
+
+    async def request():
+        return response
+
+    await scheduler.run(request, user_key=1, scope="user:1")
+
+    with pytest.raises(QuotaExhausted) as exc_info:
+        await scheduler.run(request, user_key=1, scope="user:1", priority=PRIORITY_BACKGROUND)
+    assert exc_info.value.retry_after > 1
+
+    assert await scheduler.run(request, user_key=1, scope="user:1", priority=PRIORITY_INTERACTIVE) is response
+
+@pytest.mark.asyncio
+async def test_run_backs_off_on_429():
+    """
+    異常系: 429を受けた場合のテスト
+
+    GIVEN: Retry-Afterを含む429レスポンス
+    WHEN: リクエストを実行
+    THEN: 同時実行数が半減し、Retry-Afterの間は同じスコープのリクエストが拒否される
+    """
+    scheduler = BacklogScheduler(max_concurrency=8, max_wait=1)
+
+    async def throttled():
+        return make_response(429, {"Retry-After": "30"})
+
+    await scheduler.run(throttled, user_key=1, scope="user:1")
+    assert scheduler.concurrency == 4
+
+    with pytest.raises(QuotaExhausted):
+        await scheduler.run(throttled, user_key=1, scope="user:1")
+
+    # 別のスコープには影響しない
+    async def ok():
+        return make_response()
+    assert (await scheduler.run(ok, user_key=2, scope="user:2")).status_code == 200
+
+@pytest.mark.asyncio
+async def test_run_prefers_interactive_and_limits_per_user():
+    """
+    正常系: 優先度・ユーザ単位の同時実行数のテスト
+
+    GIVEN: 全体の同時実行数が1のスケジューラ
+    WHEN: 実行中にバックグラウンド→ユーザ操作の順でリクエストを追加
+    THEN: ユーザ操作のリクエストが先に実行される
+    """
+    scheduler = BacklogScheduler(max_concurrency=1, user_concurrency=1)
+    release = asyncio.Event()
+    order = []
+
+    def make_request(name, wait=False):
+        async def request():
+            order.append(name)
+            if wait:
+                await release.wait()
+            return make_response()
+        return request
+
+    first = asyncio.ensure_future(scheduler.run(make_request("first", wait=True), user_key=1))
+    await asyncio.sleep(0)
+    background = asyncio.ensure_future(scheduler.run(make_request("background"), user_key=2, priority=PRIORITY_BACKGROUND))
+    interactive = asyncio.ensure_future(scheduler.run(make_request("interactive"), user_key=3))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(first, background, interactive)
+
+    assert order == ["first", "interactive", "background"]
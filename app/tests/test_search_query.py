@@ -0,0 +1,96 @@
+# test_search_query.py
+import pytest, sys, os
+from datetime import date
+
+# /appディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from search_query import parse_query, plan_query
+
+def test_parse_query():
+    """
+    正常系: 検索構文の解析テスト
+
+    GIVEN: 項目指定・引用符で囲んだフレーズ・通常のキーワードを含む検索構文
+    WHEN: parse_queryを実行
+    THEN: 項目ごとの条件とキーワードに分かれる(未知の項目は通常のキーワード)
+    """
+    query = parse_query('project:FOO type:2,3 user:tanaka after:2024-09-01 "login bug" 不具合 http://example.com')
+
+    assert query.projects == ["FOO"]
+    assert query.types == [2, 3]
+    assert query.users == ["tanaka"]
+    assert query.after == date(2024, 9, 1)
+    assert query.before is None
+    assert query.keywords == ["login bug", "不具合", "http://example.com"]
+    assert parse_query('user:"tanaka taro"').users == ["tanaka taro"]
+
+@pytest.mark.parametrize("text", [
+    "type:abc", "after:2024-13-01", "before:yesterday",
+    "project:../../users/myself?x=1", 'project:"FOO/activities"', "project:FOO,%2e%2e",
+])
+def test_parse_query_invalid(text):
+    """
+    異常系: 項目の値が不正な検索構文
+
+    GIVEN: 数値でない更新種別・日付でない登録日・プロジェクトキーとして不正な文字を含むプロジェクト
+    WHEN: parse_queryを実行
+    THEN: ValueErrorが発生する
+    """
+    with pytest.raises(ValueError):
+        parse_query(text)
+
+def test_plan_query_push_down():
+    """
+    正常系: Backlog APIで絞り込める条件の振り分けテスト
+
+    GIVEN: プロジェクト1つと更新種別を指定
+    WHEN: plan_queryを実行
+    THEN: プロジェクトの最近の更新のエンドポイントとactivityTypeId[]で絞り込み、Pythonで絞り込む条件はない
+    """
+    plan = plan_query(parse_query("project:FOO type:3 type:2"))
+
+    assert plan.path == "/projects/FOO/activities"
+    assert plan.params == {"activityTypeId[]": [2, 3]}
+    assert not plan.has_residual
+
+def test_plan_query_residual(monkeypatch):
+    """
+    正常系: Backlog APIで絞り込めない条件の判定テスト
+
+    GIVEN: 複数プロジェクト・登録者・登録日を指定(TZ=Asia/Tokyo)
+    WHEN: 更新情報を判定
+    THEN: すべての条件に一致する場合のみTrue、afterより前の更新情報以降は取得不要と判定される
+    """
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    plan = plan_query(parse_query("project:foo,BAR user:tanaka after:2024-09-01"))
+    activity = {
+        "project": {"id": 1, "projectKey": "FOO"},
+        "createdUser": {"userId": "tanaka", "name": "田中"},
+        "created": "2024-08-31T15:00:00Z",
+    }
+
+    assert plan.path == "/space/activities"
+    assert plan.has_residual
+    assert plan.matches(activity)
+    assert not plan.matches({**activity, "project": {"id": 2, "projectKey": "BAZ"}})
+    assert not plan.matches({**activity, "createdUser": {"userId": "sato", "name": "佐藤"}})
+    assert not plan.matches({**activity, "created": "2024-08-31T14:59:59Z"})
+    assert plan.is_exhausted({**activity, "created": "2024-08-31T14:59:59Z"})
+    assert not plan.is_exhausted(activity)
+
+def test_plan_query_user_timezone(monkeypatch):
+    """
+    正常系: 登録日の日付をユーザのタイムゾーンで判定するテスト
+
+    GIVEN: 登録日(after・before)を指定(TZ=Asia/Tokyo)
+    WHEN: ユーザのタイムゾーンを指定して実行計画を作成
+    THEN: 日付はユーザのタイムゾーンの0時として判定され、未指定の場合は環境変数TZのタイムゾーンで判定される
+    """
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    query = parse_query("after:2024-09-01 before:2024-09-02")
+    activity = {"created": "2024-08-31T20:00:00Z"}
+
+    assert plan_query(query).matches(activity)
+    assert not plan_query(query, "UTC").matches(activity)
+    assert plan_query(query, "UTC").matches({"created": "2024-09-01T00:00:00Z"})
+    assert not plan_query(query, "UTC").matches({"created": "2024-09-02T00:00:00Z"})
@@ -0,0 +1,156 @@
+# test_sync_worker.py
+import pytest, pytest_asyncio, sys, os
+from contextlib import asynccontextmanager
+from unittest.mock import patch, MagicMock
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# /appディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from models import Base, User
+from sync_worker import ActivitySyncWorker
+from crud import get_sync_state, search_stored_activities, save_synced_activities
+
+# テスト用のインメモリデータベースを作成
+engine = create_async_engine(
+    "sqlite+aiosqlite:///:memory:",
+    poolclass=StaticPool
+)
+TestingSessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+@pytest_asyncio.fixture
+async def sessions():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with TestingSessionLocal() as db:
+        db.add(User(id=1, user_nm="testuser", pw_hash="hashedpassword", backlog_access_token="access", backlog_refresh_token="refresh"))
+        await db.commit()
+    try:
+        with patch("sync_worker.SessionLocal", TestingSessionLocal):
+            yield TestingSessionLocal
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+
+def make_activity(activity_id, summary="summary"):
+    return {
+        "id": activity_id,
+        "project": {"name": "Test Project"},
+        "type": 1,
+        "content": {"summary": summary},
+        "createdUser": {"name": "Test User"},
+        "created": "2024-09-07T11:08:06Z",
+    }
+
+@pytest.mark.asyncio
+async def test_sync_space_resumes_from_high_water_mark(sessions):
+    """
+    正常系: 同期処理のテスト
+
+    GIVEN: 未同期のスペース
+    WHEN: 同期処理を2回実行
+    THEN: 初回は最新のページ、2回目は保存済みの位置より新しい更新情報のみ取得して保存される
+    """
+    worker = ActivitySyncWorker(interval=1, max_backoff=10, page_size=100)
+    responses = [
+        MagicMock(json=MagicMock(return_value=[make_activity(12), make_activity(11, "keyword")])),
+        MagicMock(json=MagicMock(return_value=[make_activity(13, "keyword")])),
+    ]
+
+    with patch("backlog.call_backlog_api", side_effect=responses) as mock_call:
+        assert await worker.sync_space("example.backlog.com") == 2
+        async with sessions() as session:
+            assert await get_sync_state(session, "example.backlog.com") == 12
+
+        assert await worker.sync_space("example.backlog.com") == 1
+        async with sessions() as session:
+            assert await get_sync_state(session, "example.backlog.com") == 13
+        assert mock_call.call_args.args[1] == {"count": 100, "minId": 12, "order": "asc"}
+
+    async with sessions() as session:
+        activities, next_max_id = await search_stored_activities(session, "example.backlog.com", "keyword", limit=20)
+    assert [activity["id"] for activity in activities] == [13, 11]
+    assert next_max_id is None
+
+@pytest.mark.asyncio
+async def test_sync_space_continues_when_listener_fails(sessions):
+    """
+    異常系: 新しい更新情報の通知に失敗した場合のテスト
+
+    GIVEN: 例外を送出する通知先と正常な通知先、2ページ分の未同期の更新情報
+    WHEN: 同期処理を実行
+    THEN: 次の通知先・次のページの取得が継続され、すべて保存される
+    """
+    worker = ActivitySyncWorker(interval=1, max_backoff=10, page_size=2)
+    received = []
+    worker.add_listener(MagicMock(side_effect=RuntimeError("listener failed")))
+    worker.add_listener(lambda space_key, activities: received.extend(activity["id"] for activity in activities))
+    async with sessions() as session:
+        await save_synced_activities(session, "example.backlog.com", [], [], last_activity_id=10)
+    responses = [
+        MagicMock(json=MagicMock(return_value=[make_activity(11), make_activity(12)])),
+        MagicMock(json=MagicMock(return_value=[make_activity(13)])),
+    ]
+
+    with patch("backlog.call_backlog_api", side_effect=responses):
+        assert await worker.sync_space("example.backlog.com") == 3
+
+    assert received == [11, 12, 13]
+    async with sessions() as session:
+        assert await get_sync_state(session, "example.backlog.com") == 13
+
+@pytest.mark.asyncio
+async def test_sync_space_releases_session_during_api_call(sessions):
+    """
+    正常系: Backlog APIの呼び出し中にデータベースセッションを保持しないテスト
+
+    GIVEN: 2ページ分の未同期の更新情報
+    WHEN: 同期処理を実行
+    THEN: Backlog APIの呼び出し中は、データベースセッションがすべて閉じられている
+    """
+    worker = ActivitySyncWorker(interval=1, max_backoff=10, page_size=2)
+    async with sessions() as session:
+        await save_synced_activities(session, "example.backlog.com", [], [], last_activity_id=10)
+    open_sessions = []
+    in_use = []
+
+    @asynccontextmanager
+    async def tracking_session():
+        async with sessions() as session:
+            open_sessions.append(session)
+            try:
+                yield session
+            finally:
+                open_sessions.remove(session)
+
+    pages = iter([[make_activity(11), make_activity(12)], [make_activity(13)]])
+
+    async def call_backlog_api(*args):
+        in_use.append(len(open_sessions))
+        return MagicMock(json=MagicMock(return_value=next(pages)))
+
+    with patch("sync_worker.SessionLocal", tracking_session), \
+         patch("backlog.call_backlog_api", side_effect=call_backlog_api):
+        assert await worker.sync_space("example.backlog.com") == 3
+
+    assert in_use == [0, 0]
+    async with sessions() as session:
+        assert await get_sync_state(session, "example.backlog.com") == 13
+
+def test_next_delay_backs_off_with_jitter():
+    """
+    正常系: 失敗時の待機時間のテスト
+
+    GIVEN: 同期処理の失敗が続いている
+    WHEN: 次の同期までの待機時間を取得
+    THEN: 失敗回数に応じて延び、上限を超えない
+    """
+    worker = ActivitySyncWorker(interval=10, max_backoff=60)
+    assert 9 <= worker.next_delay() <= 11
+
+    worker._failures = 1
+    assert 10 <= worker.next_delay() <= 20
+
+    worker._failures = 10
+    assert worker.next_delay() <= 60
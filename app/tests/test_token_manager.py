@@ -0,0 +1,95 @@
+# test_token_manager.py
+import pytest, sys, os, asyncio
+from unittest.mock import AsyncMock
+
+# /appディレクトリをパスに追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from token_manager import TokenManager
+from models import User
+
+@pytest.fixture
+def mock_user():
+    return User(id=1, backlog_access_token="old_access_token", backlog_refresh_token="old_refresh_token")
+
+@pytest.mark.asyncio
+async def test_refresh_concurrent_calls_refresh_once(mock_user):
+    """
+    正常系: 同じユーザのトークン更新が同時に発生した場合のテスト
+
+    GIVEN: 同じユーザの複数のリクエストが401となった
+    WHEN: 同時にトークン更新を実行
+    THEN: 更新処理は1回のみ実行され、全てのリクエストに新しいアクセストークンが返る
+    """
+    async def refresher(user_id, stale_access_token):
+        await asyncio.sleep(0.01)
+        return {"access_token": "new_access_token", "refresh_token": "new_refresh_token", "expires_in": 3600}
+
+    mock_refresher = AsyncMock(side_effect=refresher)
+    manager = TokenManager(mock_refresher)
+    access_token = await manager.get_access_token(mock_user)
+
+    results = await asyncio.gather(*(manager.refresh(mock_user.id, access_token) for _ in range(5)))
+
+    assert results == ["new_access_token"] * 5
+    mock_refresher.assert_awaited_once_with(mock_user.id, "old_access_token")
+    manager.close()
+
+@pytest.mark.asyncio
+async def test_get_access_token_renews_before_expiry(mock_user):
+    """
+    正常系: 有効期限が近いトークンの事前更新のテスト
+
+    GIVEN: 有効期限までの時間が更新マージンより短いトークン
+    WHEN: アクセストークンを取得
+    THEN: APIの呼び出し前にトークンが更新される
+    """
+    mock_refresher = AsyncMock(return_value={"access_token": "new_access_token", "refresh_token": "new_refresh_token", "expires_in": 3600})
+    manager = TokenManager(mock_refresher, renew_margin=300)
+    manager.set_tokens(mock_user.id, "old_access_token", "old_refresh_token", expires_in=60)
+
+    assert await manager.get_access_token(mock_user) == "new_access_token"
+    mock_refresher.assert_awaited_once()
+
+    # 更新後は有効期限まで十分な時間があるため、再度更新されない
+    assert await manager.get_access_token(mock_user) == "new_access_token"
+    mock_refresher.assert_awaited_once()
+    manager.close()
+
+@pytest.mark.asyncio
+async def test_refresh_releases_user_lock(mock_user):
+    """
+    正常系: トークン更新後にユーザ単位のロックが破棄されるテスト
+
+    GIVEN: 同じユーザの複数のリクエストが401となった
+    WHEN: 同時にトークン更新を実行
+    THEN: 更新中はロックを共有し、更新完了後はロックが残らない
+    """
+    async def refresher(user_id, stale_access_token):
+        await asyncio.sleep(0.01)
+        assert len(manager._locks) == 1
+        return {"access_token": "new_access_token", "refresh_token": "new_refresh_token"}
+
+    manager = TokenManager(AsyncMock(side_effect=refresher))
+    await asyncio.gather(*(manager.refresh(mock_user.id, "old_access_token") for _ in range(3)))
+
+    assert manager._locks == {}
+    manager.close()
+
+@pytest.mark.asyncio
+async def test_set_tokens_from_thread_schedules_renewal(mock_user):
+    """
+    正常系: イベントループ外(スレッドプール)からトークンを設定した場合のテスト
+
+    GIVEN: 起動時にイベントループを取得したトークン管理
+    WHEN: スレッドから有効期限付きのトークンを設定
+    THEN: 起動時のイベントループでバックグラウンド更新がスケジュールされる
+    """
+    manager = TokenManager(AsyncMock())
+    manager.start()
+
+    await asyncio.to_thread(manager.set_tokens, mock_user.id, "access_token", "refresh_token", 3600)
+    await asyncio.sleep(0)
+
+    assert mock_user.id in manager._renewals
+    manager.close()
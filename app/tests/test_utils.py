@@ -3,7 +3,7 @@ import pytest, sys, os
 
 # /appディレクトリをパスに追加
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from utils import verify_password, get_password_hash, contains_keyword, convert_to_tz
+from utils import verify_password, get_password_hash, contains_keyword, convert_to_tz, convert_many_to_tz, change_tz, encode_cursor, decode_cursor, build_search_text
 
 def test_verify_password():
     """
@@ -158,6 +158,50 @@ def test_convert_to_tz_other_timezone():
     
     assert convert_to_tz(date_time_str) == expected_time
 
+def test_convert_to_tz_specified_timezone():
+    """
+    正常系: タイムゾーンを指定して変換するテスト(ユーザごとのタイムゾーン)
+
+    GIVEN: UTC形式の日時文字列と、環境変数と異なるタイムゾーン
+    WHEN: convert_to_tzを実行
+    THEN: 指定したタイムゾーンに変換された日時文字列が返る
+    """
+    os.environ['TZ'] = 'Asia/Tokyo'
+
+    assert convert_to_tz("2024-09-07T11:08:06Z", "America/New_York") == "2024-09-07 07:08:06"
+
+def test_convert_many_to_tz_dst():
+    """
+    正常系: 日時のリストをまとめて変換するテスト(夏時間の切り替えを含む)
+
+    GIVEN: 夏時間の切り替え前後のUTC日時文字列のリスト
+    WHEN: convert_many_to_tzを実行
+    THEN: 1件ずつ変換した場合と同じ日時文字列が元の順序で返る
+    """
+    date_time_strs = ["2024-03-10T06:59:59Z", "2024-03-10T07:00:00Z", "2024-11-03T05:30:00Z", "2024-11-03T06:30:00Z"]
+
+    assert convert_many_to_tz(date_time_strs, "America/New_York") == [
+        "2024-03-10 01:59:59",
+        "2024-03-10 03:00:00",
+        "2024-11-03 01:30:00",
+        "2024-11-03 01:30:00",
+    ]
+    assert convert_many_to_tz(date_time_strs, "America/New_York") == [convert_to_tz(value, "America/New_York") for value in date_time_strs]
+
+def test_change_tz():
+    """
+    正常系: 表示形式に変換済みの日時を、別のタイムゾーンに変換するテスト
+
+    GIVEN: 環境変数のタイムゾーン(Asia/Tokyo)の表示形式の日時文字列
+    WHEN: change_tzを実行
+    THEN: 指定したタイムゾーンの日時文字列が返る(未指定・同じタイムゾーンの場合はそのまま)
+    """
+    os.environ['TZ'] = 'Asia/Tokyo'
+
+    assert change_tz("2024-09-07 20:08:06", "UTC") == "2024-09-07 11:08:06"
+    assert change_tz("2024-09-07 20:08:06", None) == "2024-09-07 20:08:06"
+    assert change_tz("2024-09-07 20:08:06", "Asia/Tokyo") == "2024-09-07 20:08:06"
+
 def test_convert_to_tz_invalid_format():
     """
     異常系: convert_to_tzに無効な日時フォーマットを渡すテスト
@@ -187,3 +231,53 @@ def test_convert_to_tz_no_timezone_env():
     
     expected_time = "2024-09-07 20:08:06"  # JSTの変換結果
     assert convert_to_tz(date_time_str) == expected_time
+
+def test_encode_decode_cursor():
+    """
+    正常系: カーソルの変換テスト
+
+    GIVEN: ページングの位置情報
+    WHEN: encode_cursor・decode_cursorを実行
+    THEN: 元の位置情報に戻る
+    """
+    position = {"maxId": 12345, "minId": 100}
+    assert decode_cursor(encode_cursor(position)) == position
+
+def test_decode_cursor_invalid():
+    """
+    異常系: 不正なカーソルの変換テスト
+
+    GIVEN: 不正なカーソル文字列
+    WHEN: decode_cursorを実行
+    THEN: ValueErrorが発生
+    """
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+def test_build_search_text():
+    """
+    正常系: 検索用テキスト作成のテスト
+
+    GIVEN: ネストされた構造(日本語・数値を含む)
+    WHEN: build_search_textを実行
+    THEN: テキスト項目のみが連結され、部分一致の結果がcontains_keywordと同じになる
+    """
+    data = {"key1": ["ログイン不具合", {"key2": "value2"}], "key3": 3, "key4": None}
+    search_text = build_search_text(data)
+
+    assert search_text.split("\n") == ["ログイン不具合", "value2"]
+    for keyword in ["ログイン", "不具合", "value2", "3", "合v"]:
+        assert (keyword in search_text) == contains_keyword(data, keyword)
+
+def test_build_search_text_normalize_and_fields():
+    """
+    正常系: 正規化方法・検索対象の項目を指定した検索用テキスト作成のテスト
+
+    GIVEN: ネストされた構造と、正規化方法(casefold)・検索対象の項目
+    WHEN: build_search_textを実行
+    THEN: 検索対象の項目のテキストのみが正規化して連結される
+    """
+    data = {"content": {"summary": "Login", "comments": [{"content": "ＡＢＣ"}]}, "createdUser": {"name": "Tanaka"}}
+
+    assert build_search_text(data, "casefold", ["content.summary"]) == "login"
+    assert build_search_text(data, "nfkc", ["content"]).split("\n") == ["login", "abc"]
@@ -0,0 +1,178 @@
+# token_manager.py
+import asyncio, logging, time
+import metrics
+
+logger = logging.getLogger(__name__)
+
+class BacklogTokens:
+    """
+    ユーザのBacklogトークン(メモリ上で保持)
+    """
+
+    def __init__(self, access_token: str, refresh_token: str, expires_at: float = None):
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self.expires_at = expires_at    # 有効期限(time.monotonic基準) 不明な場合はNone
+        self.last_used = time.monotonic()
+
+class UserLock:
+    """
+    ユーザ単位のトークン更新のロック(待機中を含む利用数が0になった時点で破棄する)
+    """
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class TokenManager:
+    """
+    ユーザごとのBacklogトークンを管理する
+
+    - トークンの更新はユーザ単位でロックし、同時に401となった場合でも更新は1回のみ行う
+    - 有効期限の少し前にトークンを更新し、APIの呼び出しが401になることを防ぐ
+      (直近で利用されたユーザは、バックグラウンドで更新する)
+    - イベントループ外(スレッドプールなど)からトークンを設定した場合は、start()で取得したイベントループで更新をスケジュールする
+    """
+
+    def __init__(self, refresher, renew_margin: float = 300, active_window: float = 1800):
+        """
+        :param refresher: トークン更新処理 (user_id, 更新前のアクセストークン) を受け取り、
+                          access_token・refresh_token・expires_inを含む辞書を返すコルーチン関数
+        :param renew_margin: 有効期限の何秒前に更新するか
+        :param active_window: 最終利用から何秒以内のユーザをバックグラウンドで更新するか
+        """
+        self._refresher = refresher
+        self.renew_margin = renew_margin
+        self.active_window = active_window
+        self._tokens = {}
+        self._locks = {}
+        self._renewals = {}
+        self._loop = None
+
+    def start(self):
+        """
+        バックグラウンド更新に使用するイベントループを取得する(アプリケーションの起動時に呼び出す)
+        """
+        self._loop = asyncio.get_running_loop()
+
+    def set_tokens(self, user_id: int, access_token: str, refresh_token: str, expires_in: float = None):
+        """
+        トークンを設定する
+
+        :param user_id: ユーザID
+        :param access_token: アクセストークン
+        :param refresh_token: リフレッシュトークン
+        :param expires_in: 有効期限までの秒数 不明な場合はNone
+        """
+        expires_at = time.monotonic() + float(expires_in) if expires_in else None
+        tokens = BacklogTokens(access_token, refresh_token, expires_at)
+        current = self._tokens.get(user_id)
+        if current is not None:
+            tokens.last_used = current.last_used
+        self._tokens[user_id] = tokens
+        self._schedule_renewal(user_id, expires_at)
+
+    def forget(self, user_id: int):
+        """
+        ユーザのトークンをメモリ上から削除する
+
+        :param user_id: ユーザID
+        """
+        self._tokens.pop(user_id, None)
+        renewal = self._renewals.pop(user_id, None)
+        if renewal is not None:
+            renewal.cancel()
+
+    async def get_access_token(self, user):
+        """
+        APIの呼び出しに使用するアクセストークンを取得
+
+        メモリ上にない場合はユーザ情報(DB)のトークンを使用する。
+        有効期限が近い場合は、呼び出し前にトークンを更新する。
+
+        :param user: ユーザ
+        :return: アクセストークン
+        """
+        tokens = self._tokens.get(user.id)
+        if tokens is None:
+            tokens = BacklogTokens(user.backlog_access_token, user.backlog_refresh_token)
+            self._tokens[user.id] = tokens
+        tokens.last_used = time.monotonic()
+
+        if tokens.expires_at is not None and time.monotonic() >= tokens.expires_at - self.renew_margin:
+            return await self.refresh(user.id, tokens.access_token)
+        return tokens.access_token
+
+    async def refresh(self, user_id: int, stale_access_token: str):
+        """
+        アクセストークンを更新する
+
+        ロック待ちの間に他の呼び出しで更新済みの場合は、更新せずに新しいアクセストークンを返す。
+
+        :param user_id: ユーザID
+        :param stale_access_token: 無効(または期限切れ間近)のアクセストークン
+        :return: 新しいアクセストークン
+        """
+        user_lock = self._locks.get(user_id)
+        if user_lock is None:
+            user_lock = self._locks[user_id] = UserLock()
+        user_lock.users += 1
+        try:
+            async with user_lock.lock:
+                tokens = self._tokens.get(user_id)
+                if tokens is not None and tokens.access_token != stale_access_token:
+                    metrics.increment("backlog.token.refresh_shared")
+                    return tokens.access_token
+
+                metrics.increment("backlog.token.refresh")
+                new_tokens = await self._refresher(user_id, stale_access_token)
+                self.set_tokens(
+                    user_id,
+                    new_tokens.get("access_token"),
+                    new_tokens.get("refresh_token"),
+                    new_tokens.get("expires_in"),
+                )
+                return self._tokens[user_id].access_token
+        finally:
+            # 更新中・待機中の呼び出しがなくなったロックは破棄する(ユーザ数に比例してロックが残らないようにする)
+            user_lock.users -= 1
+            if user_lock.users == 0 and self._locks.get(user_id) is user_lock:
+                del self._locks[user_id]
+
+    def _schedule_renewal(self, user_id: int, expires_at: float):
+        """有効期限の少し前にバックグラウンドでトークンを更新するようにスケジュールする"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # イベントループ外から呼び出された場合は、起動時に取得したイベントループでスケジュールする
+            if self._loop is None or self._loop.is_closed():
+                logger.warning("イベントループがないため、Backlogのアクセストークンの事前更新をスケジュールできません user_id=%s", user_id)
+                return
+            self._loop.call_soon_threadsafe(self._schedule_renewal, user_id, expires_at)
+            return
+        renewal = self._renewals.pop(user_id, None)
+        if renewal is not None:
+            renewal.cancel()
+        if expires_at is None:
+            return
+        delay = max(expires_at - self.renew_margin - time.monotonic(), 0)
+        self._renewals[user_id] = loop.call_later(delay, lambda: asyncio.ensure_future(self._renew(user_id)))
+
+    async def _renew(self, user_id: int):
+        """バックグラウンドでのトークン更新(直近で利用されていないユーザは次回利用時に更新する)"""
+        self._renewals.pop(user_id, None)
+        tokens = self._tokens.get(user_id)
+        if tokens is None or time.monotonic() - tokens.last_used > self.active_window:
+            return
+        try:
+            await self.refresh(user_id, tokens.access_token)
+        except Exception as e:
+            logger.warning("Backlogのアクセストークンの事前更新に失敗しました user_id=%s: %r", user_id, e)
+
+    def close(self):
+        """
+        スケジュール済みのバックグラウンド更新を全て取り消す
+        """
+        for renewal in self._renewals.values():
+            renewal.cancel()
+        self._renewals.clear()
@@ -0,0 +1,155 @@
+# user_cache.py
+import threading, time
+from collections import OrderedDict
+from sqlalchemy import inspect
+import metrics
+from env_config import Configs
+from models import User
+
+class TTLCache:
+    """
+    有効期限付きのキャッシュ(プロセス内・LRU)
+
+    同期のエンドポイント(スレッドプール)から呼び出されるため、ロックで保護する。
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        """
+        :param ttl: 有効期限(秒) 0以下の場合はキャッシュしない
+        :param max_entries: 保持する件数の上限
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        キャッシュした値を取得
+
+        :param key: キー
+        :return: 値 キャッシュしていない・有効期限切れの場合はNone
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        """
+        値をキャッシュする
+
+        :param key: キー
+        :param value: 値
+        :param ttl: 有効期限(秒) 未指定の場合はインスタンスの有効期限 インスタンスの有効期限より長い場合はインスタンスの有効期限
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        """
+        キャッシュした値を削除
+
+        :param key: キー
+        :return: 削除した値 キャッシュしていない・有効期限切れの場合はNone
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        return value if time.monotonic() < expires_at else None
+
+    def clear(self):
+        """キャッシュをすべて削除"""
+        with self._lock:
+            self._entries.clear()
+
+class UserCache:
+    """
+    認証済みのトークン(デコード結果)とユーザーのキャッシュ
+
+    リクエストごとのJWTのデコード・ユーザーの検索(DB)を省略するために使用する。
+    ユーザーはカラムの値のみを保持し、取得のたびにセッションに紐づかない新しいインスタンスを返す。
+    ユーザー情報を更新した場合はinvalidateを呼び出す(他のプロセスのキャッシュは有効期限まで残る)。
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        """
+        :param ttl: 有効期限(秒) 0以下の場合はキャッシュしない
+        :param max_entries: トークン・ユーザーそれぞれの件数の上限
+        """
+        self._tokens = TTLCache(ttl, max_entries)
+        self._users = TTLCache(ttl, max_entries)
+
+    def get_token(self, token: str):
+        """
+        デコード済みのトークンのユーザーIDを取得
+
+        :param token: トークン
+        :return: ユーザーID キャッシュしていない場合はNone
+        """
+        user_id = self._tokens.get(token)
+        metrics.increment("auth.token_cache.hit" if user_id is not None else "auth.token_cache.miss")
+        return user_id
+
+    def set_token(self, token: str, user_id: int, expires_at: float = None):
+        """
+        デコードしたトークンのユーザーIDをキャッシュする
+
+        :param token: トークン
+        :param user_id: ユーザーID
+        :param expires_at: トークンの有効期限(UNIX時間) 有効期限を超えてキャッシュしない
+        """
+        ttl = None if expires_at is None else expires_at - time.time()
+        self._tokens.set(token, user_id, ttl)
+
+    def get_user(self, user_id: int):
+        """
+        キャッシュしたユーザーを取得
+
+        :param user_id: ユーザーID
+        :return: ユーザー(セッションに紐づかないインスタンス) キャッシュしていない場合はNone
+        """
+        values = self._users.get(user_id)
+        metrics.increment("auth.user_cache.hit" if values is not None else "auth.user_cache.miss")
+        return User(**values) if values is not None else None
+
+    def set_user(self, user: User):
+        """
+        ユーザーをキャッシュする
+
+        :param user: ユーザー
+        """
+        # 読み込み済みの値のみ保持する(未読み込み・期限切れの値を読み込むためのSQLを実行しない)
+        loaded = inspect(user).dict
+        values = {attr.key: loaded[attr.key] for attr in inspect(User).column_attrs if attr.key in loaded}
+        self._users.set(user.id, values)
+
+    def invalidate(self, user_id: int):
+        """
+        ユーザーのキャッシュを削除する(ユーザー情報を更新した場合に呼び出す)
+
+        :param user_id: ユーザーID
+        """
+        self._users.pop(user_id)
+
+    def clear(self):
+        """キャッシュをすべて削除"""
+        self._tokens.clear()
+        self._users.clear()
+
+# アプリケーション全体で共有するインスタンス
+user_cache = UserCache(Configs.USER_CACHE_TTL, Configs.USER_CACHE_MAX_ENTRIES)
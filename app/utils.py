@@ -1,11 +1,21 @@
 # utils.py
 from passlib.context import CryptContext
+from env_config import Configs
 import pytz
-from datetime import datetime
-import os
+from datetime import datetime, timedelta
+from bisect import bisect_right
+import base64, json, os
+from functools import lru_cache
+from keyword_matcher import compile_keyword, collect_texts, get_normalizer
 
-# パスワードハッシュ化用の設定
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# パスワードハッシュ化用の設定(コストがPASSWORD_BCRYPT_ROUNDSと異なるハッシュは、再ハッシュが必要と判定する)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=Configs.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=Configs.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=Configs.PASSWORD_BCRYPT_ROUNDS,
+)
 
 def verify_password(plain_password, hashed_password):
     """
@@ -17,6 +27,16 @@ def verify_password(plain_password, hashed_password):
     """
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password, hashed_password):
+    """
+    パスワードを検証し、ハッシュのコストが現在の設定と異なる場合は新しいハッシュを返す関数。
+
+    :param plain_password: 検証するパスワード
+    :param hashed_password: ハッシュ化されたパスワード
+    :return: (検証結果, 新しいハッシュ 再ハッシュが不要な場合はNone)
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
 def get_password_hash(password):
     """
     パスワードをハッシュ化して返す関数。
@@ -29,56 +49,174 @@ def get_password_hash(password):
 def contains_keyword(data, keyword):
     """
     指定されたキーワードに部分一致するテキスト項目が存在するかを確認する関数。
+
+    複数の更新情報を判定する場合は、keyword_matcher.compile_keywordで作成した判定を使い回すこと。
     
     :param data: APIレスポンスのデータ（辞書またはリスト）
     :param keyword: 検索するキーワード（部分一致）
     :return: テキスト項目が存在すればTrue、存在しなければFalse
     """
-    # キーワードが指定されていなければ、Trueを返す
-    if keyword is None:
-        return True
-    
-    # 辞書の場合、キーと値を再帰的にチェック
-    if isinstance(data, dict):
-        for key, value in data.items():
-            if contains_keyword(value, keyword):
-                return True
+    return compile_keyword(keyword).match(data)
+
+# 検索用テキストの項目区切り文字
+SEARCH_TEXT_SEPARATOR = "\n"
+
+def build_search_text(data, normalize: str = None, fields: list = None):
+    """
+    APIレスポンスのデータに含まれるテキスト項目を連結し、検索用テキストを作成する関数。
 
-    # リストの場合、各要素を再帰的にチェック
-    elif isinstance(data, list):
-        for item in data:
-            if contains_keyword(item, keyword):
-                return True
+    キーワードの判定(keyword_matcher)が確認するテキスト項目と同じ項目を、項目区切り文字で連結する。
+    区切り文字を含まないキーワードの部分一致結果は、同じ正規化方法・検索対象の項目のキーワードの判定と同じになる
+    (キーワードも同じ正規化方法で正規化して検索すること)。
 
-    # テキスト項目の場合、キーワードに部分一致するかをチェック
-    elif isinstance(data, str):
-        if keyword in data:
-            return True
+    :param data: APIレスポンスのデータ（辞書またはリスト）
+    :param normalize: 正規化方法(keyword_matcher.NORMALIZE_MODESを参照)
+    :param fields: 検索対象の項目(ドット区切りのパス) 未指定の場合はすべてのテキスト項目
+    :return: 検索用テキスト
+    """
+    normalizer = get_normalizer(normalize)
+    search_text = SEARCH_TEXT_SEPARATOR.join(collect_texts(data, fields))
+    return normalizer(search_text) if normalizer else search_text
 
-    # 一致する項目が見つからなければFalse
-    return False
+# 既定のタイムゾーン(環境変数TZ 未設定の場合は日本標準時)
+DEFAULT_TIMEZONE = "Asia/Tokyo"
 
-def convert_to_tz(date_time_str):
+# Backlog APIの日時形式(UTC)と、UIに表示する日時形式
+BACKLOG_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+DISP_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def get_default_timezone_name():
+    """
+    既定のタイムゾーン名(環境変数TZ)を返す関数
+    """
+    return os.environ.get('TZ', DEFAULT_TIMEZONE)
+
+@lru_cache(maxsize=None)
+def get_timezone(name: str):
+    """
+    タイムゾーン名に対応するタイムゾーンを返す関数(タイムゾーン名ごとに1回だけ作成する)
+
+    :param name: タイムゾーン名(例: "Asia/Tokyo")
+    :return: pytzのタイムゾーン
+    :raises pytz.UnknownTimeZoneError: 不明なタイムゾーン名の場合
+    """
+    return pytz.timezone(name)
+
+def is_valid_timezone(name: str):
+    """
+    タイムゾーン名が有効かを確認する関数
+    """
+    try:
+        get_timezone(name)
+    except pytz.UnknownTimeZoneError:
+        return False
+    return True
+
+def _exact_utc_offset(name: str, utc_time: datetime):
+    """
+    UTC日時(tzinfoなし)におけるタイムゾーンのUTCオフセットを返す
     """
-    UTC形式の日時を環境変数のタイムゾーンに変換する関数
+    tz = get_timezone(name)
+    return tz.fromutc(utc_time.replace(tzinfo=tz)).utcoffset()
+
+@lru_cache(maxsize=8192)
+def _hourly_utc_offset(name: str, hour: str):
+    """
+    UTCの1時間(例: "2024-09-07T11")におけるタイムゾーンのUTCオフセットを返す
+
+    1時間の途中で切り替え(夏時間など)がある場合は、日時ごとに求める必要があるためNoneを返す。
+    """
+    start = datetime.fromisoformat(hour + ":00")
+    transitions = getattr(get_timezone(name), "_utc_transition_times", None)
+    if transitions:
+        index = bisect_right(transitions, start)
+        if index < len(transitions) and transitions[index] < start + timedelta(hours=1):
+            return None
+    return _exact_utc_offset(name, start)
+
+def parse_backlog_datetime(date_time_str: str):
+    """
+    Backlog APIの日時文字列(例: "2024-09-07T11:08:06Z")を、タイムゾーンなしのUTC日時に変換する関数
+
+    固定形式のため、strptimeではなくdatetime.fromisoformat(C実装)で変換する。
+
+    :param date_time_str: UTC形式の日時文字列
+    :return: datetime(tzinfoなし)
+    :raises ValueError: 形式が異なる場合
+    """
+    if len(date_time_str) == 20 and date_time_str[10] == "T" and date_time_str[19] == "Z":
+        return datetime.fromisoformat(date_time_str[:19])
+    return datetime.strptime(date_time_str, BACKLOG_DATETIME_FORMAT)
+
+def convert_to_tz(date_time_str, tz_name: str = None):
+    """
+    UTC形式の日時を指定したタイムゾーンに変換する関数
 
     :param created: UTC形式の日時文字列（例: "2024-09-07T11:08:06Z"）
-    :return: 環境変数のタイムゾーンまたは日本標準時（JST）に変換された日時文字列
+    :param tz_name: 変換先のタイムゾーン名 未指定の場合は環境変数のタイムゾーン
+    :return: 指定したタイムゾーン・環境変数のタイムゾーンまたは日本標準時（JST）に変換された日時文字列
+    """
+    return convert_many_to_tz([date_time_str], tz_name)[0]
+
+def convert_many_to_tz(date_time_strs, tz_name: str = None):
+    """
+    UTC形式の日時のリストをまとめて指定したタイムゾーンに変換する関数
+
+    タイムゾーンの取得は1回のみ行い、UTCオフセットは1時間単位でキャッシュして使い回す。
+
+    :param date_time_strs: UTC形式の日時文字列のリスト
+    :param tz_name: 変換先のタイムゾーン名 未指定の場合は環境変数のタイムゾーン
+    :return: 変換された日時文字列のリスト(元の順序)
+    """
+    name = tz_name or get_default_timezone_name()
+    converted = []
+    for date_time_str in date_time_strs:
+        utc_time = parse_backlog_datetime(date_time_str)
+        offset = _hourly_utc_offset(name, utc_time.isoformat()[:13])
+        if offset is None:
+            offset = _exact_utc_offset(name, utc_time)
+        converted.append((utc_time + offset).isoformat(" ", "seconds"))
+    return converted
+
+def change_tz(disp_date_time_str, tz_name: str = None):
     """
-    # UTCのタイムゾーンを定義
-    utc = pytz.utc
+    環境変数のタイムゾーンで表示形式に変換済みの日時を、指定したタイムゾーンに変換する関数
 
-    # 環境変数のタイムゾーンを定義
-    tz = pytz.timezone(os.environ.get('TZ', 'Asia/Tokyo'))
+    (更新情報テーブルに保存済みの日時を、ユーザのタイムゾーンで返す場合に使用する)
 
-    # UTC形式の日時文字列をdatetimeオブジェクトに変換
-    utc_time = datetime.strptime(date_time_str, "%Y-%m-%dT%H:%M:%SZ")
+    :param disp_date_time_str: 表示形式の日時文字列（例: "2024-09-07 20:08:06"）
+    :param tz_name: 変換先のタイムゾーン名 未指定または環境変数のタイムゾーンと同じ場合は変換しない
+    :return: 変換された日時文字列
+    """
+    default_name = get_default_timezone_name()
+    if disp_date_time_str is None or not tz_name or tz_name == default_name:
+        return disp_date_time_str
+    local_time = get_timezone(default_name).localize(datetime.strptime(disp_date_time_str, DISP_DATETIME_FORMAT))
+    return local_time.astimezone(get_timezone(tz_name)).strftime(DISP_DATETIME_FORMAT)
+
+def encode_cursor(position: dict):
+    """
+    ページングの位置情報を、クライアントに返すカーソル文字列に変換する関数
 
-    # UTCのタイムゾーンを設定
-    utc_time = utc.localize(utc_time)
+    :param position: 位置情報(例: {"maxId": 123})
+    :return: カーソル文字列(URLセーフなBase64)
+    """
+    raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
 
-    # 変換
-    jst_time = utc_time.astimezone(tz)
+def decode_cursor(cursor: str):
+    """
+    カーソル文字列を、ページングの位置情報に変換する関数
 
-    # 変換後の日時文字列を返す
-    return jst_time.strftime("%Y-%m-%d %H:%M:%S")
\ No newline at end of file
+    :param cursor: encode_cursorで作成したカーソル文字列
+    :return: 位置情報
+    :raises ValueError: カーソルが不正な場合
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("invalid cursor") from e
+    if not isinstance(position, dict):
+        raise ValueError("invalid cursor")
+    return position